@@ -1,15 +1,261 @@
 import json
 import regex as re
-import grapheme
+import heapq
 import os
 import pickle
 import unicodedata
 import time
 from tqdm.auto import tqdm
-from sandhi import sandhi_split
-from datasets import load_dataset
+from array import array
+from batching import encode_padded, encode_result
+from collections import Counter, OrderedDict
+from itertools import accumulate
+from sandhi import BOUND, marked_offsets, marks_runs_independently, sandhi_marked, sandhi_split
+from tamil_graphemes import boundaries, chunk_cluster_re, graphemes, is_fast
+from telemetry import TrainingTelemetry, rss_mb
+from flat_corpus import FlatCorpus
+from external_corpus import ShardedCorpus
+from frozen_tables import FrozenTables, write_frozen
+from normalize import normalize, normalize_with_offsets
+from profiling import count, profiled, stage
+
+# -------------------------------------------------------------------
+# Training helpers
+# -------------------------------------------------------------------
+def calculate_elapsed_time(start_time):
+    end_time = time.time()
+    time_difference = end_time - start_time
+    days, remainder = divmod(time_difference, 86400)
+    hours, remainder = divmod(remainder, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return int(days), int(hours), int(minutes), int(seconds)
+
+def get_stats(ids, counts=None):
+    counts = {} if counts is None else counts
+    for pair in zip(ids, ids[1:]):  # consecutive elements
+        counts[pair] = counts.get(pair, 0) + 1
+    return counts
+
+def merge(ids, pair, idx):
+    newids = []
+    i = 0
+    while i < len(ids):
+        if ids[i] == pair[0] and i < len(ids) - 1 and ids[i+1] == pair[1]:
+            newids.append(idx)
+            i += 2
+        else:
+            newids.append(ids[i])
+            i += 1
+    return newids
+
+def merge_many(ids, pair_to_idx):
+    """
+    Apply several merges in one left-to-right pass.
+    Only valid for pairs that share no symbol: such pairs can never overlap,
+    so the result equals applying `merge` once per pair.
+    """
+    if len(pair_to_idx) == 1:
+        (pair, idx), = pair_to_idx.items()
+        return merge(ids, pair, idx)
+    newids = []
+    i = 0
+    n = len(ids)
+    while i < n:
+        if i < n - 1:
+            idx = pair_to_idx.get((ids[i], ids[i+1]))
+            if idx is not None:
+                newids.append(idx)
+                i += 2
+                continue
+        newids.append(ids[i])
+        i += 1
+    return newids
+
+def select_merge_batch(stats, tolerance=None, max_pairs=1, min_frequency=1):
+    """
+    Pick the pairs to merge in one training iteration.
+
+    The top pair is always `max(stats, key=stats.get)` (same tie-breaking as
+    exact training). With a tolerance, further pairs are taken in rank order
+    while their count is within `tolerance` (relative) of the top count and
+    they share no symbol with any pair already picked.
+    Returns [] when the top pair falls below `min_frequency`.
+    """
+    if not stats:
+        return []
+    if not tolerance or max_pairs <= 1:
+        pair = max(stats, key=stats.get)
+        return [pair] if stats[pair] >= min_frequency else []
+
+    # nlargest is stable, so equal counts keep first-seen order like max()
+    candidates = heapq.nlargest(max_pairs * 4, stats, key=stats.get)
+    top_count = stats[candidates[0]]
+    if top_count < min_frequency:
+        return []
+    floor = max(min_frequency, top_count * (1.0 - tolerance))
+
+    picked, used = [], set()
+    for pair in candidates:
+        if stats[pair] < floor:
+            break
+        if pair[0] in used or pair[1] in used:
+            continue
+        picked.append(pair)
+        used.update(pair)
+        if len(picked) >= max_pairs:
+            break
+    return picked
+
+def save_dict_to_pickle(dictionary, file_path):
+    with open(file_path, 'wb') as file:
+        pickle.dump(dictionary, file)
+
+def build_initial_vocab(texts, lang="mix"):
+    """Grapheme vocab (id -> token, token -> id) of `texts`, any iterable of lines (read once)."""
+    seen = set()
+    progress_bar = tqdm(total=len(texts) if hasattr(texts, "__len__") else None,
+                        desc="Init vocab (graphemes)")
+    for text in texts:
+        # lang="mix" applies Tamil sandhi only to Tamil spans; English is pass-through
+        text_chunks = sandhi_split(normalize(text), lang=lang)  # [(tok,(s,e)),...]
+        # NOTE: grapheme splits English into single letters; Tamil into GCs (with diacritics)
+        for tok, _ in text_chunks:
+            seen.update(graphemes(tok))
+        progress_bar.update()
+
+    intial_gh = list(seen)
+    vocab = {idx: intial_gh[idx] for idx in range(len(intial_gh))}
+    vocab_re = {intial_gh[idx]: idx for idx in range(len(intial_gh))}
+    return vocab, vocab_re
+
+def iter_chunk_ids(texts, vocab_re, lang="mix"):
+    """Yield the grapheme ids of every sandhi chunk of every text (any iterable of lines)."""
+    progress_bar = tqdm(total=len(texts) if hasattr(texts, "__len__") else None,
+                        desc="Encode to ids (train)")
+    for text in texts:
+        text_chunks = sandhi_split(normalize(text), lang=lang)
+        for tok, _ in text_chunks:
+            yield [vocab_re[x] for x in graphemes(tok)]
+        progress_bar.update()
+
+def covert_to_ids_train(texts, vocab_re, lang="mix", flat=False,
+                        external_dir=None, memory_limit_mb=1024):
+    """
+    Chunked training ids: a list of lists, or with `flat=True` a FlatCorpus
+    (one int32 buffer + chunk offsets, built without the list-of-lists peak),
+    or with `external_dir` a ShardedCorpus spilled to disk under that directory.
+    """
+    if external_dir:
+        return ShardedCorpus.from_chunks(iter_chunk_ids(texts, vocab_re, lang),
+                                         external_dir, memory_limit_mb)
+    if flat:
+        return FlatCorpus.from_chunks(iter_chunk_ids(texts, vocab_re, lang))
+    return list(iter_chunk_ids(texts, vocab_re, lang))
+
+def train_merges(ids, vocab, num_merges, vocab_re=None, merges=None, start_iter=0,
+                 checkpoint_path=None, checkpoint_every=100,
+                 batch_tolerance=None, max_batch_pairs=1, min_frequency=1,
+                 telemetry=None):
+    """
+    Learn BPE merges over chunked grapheme ids: a list of lists of ints, a
+    FlatCorpus (same merges, merged in place in one int32 buffer) or a
+    ShardedCorpus (same merges, corpus and pair counts kept on disk).
+
+    Exact mode (default) merges the single most frequent pair per pass.
+    Batched mode (`batch_tolerance` > 0 and `max_batch_pairs` > 1) merges up
+    to `max_batch_pairs` non-conflicting pairs per pass whose counts are within
+    `batch_tolerance` of the top count; fewer corpus passes, slightly different
+    merge order. Training stops early once the top pair occurs fewer than
+    `min_frequency` times.
+    `telemetry` is a TrainingTelemetry receiving one record per merge; by
+    default progress goes to a console-only, rate-limited one.
+    Returns (vocab, merges, ids).
+    """
+    merges = {} if merges is None else merges
+    own_telemetry = telemetry is None
+    if own_telemetry:
+        telemetry = TrainingTelemetry()
+    flat = hasattr(ids, "pair_stats")  # FlatCorpus / ShardedCorpus
+    corpus_symbols = ids.num_symbols if flat else sum(len(chunk_ids) for chunk_ids in ids)
+    i = start_iter
+    n_pass = 0
+    while i < num_merges:
+        t0 = time.perf_counter()
+        if flat:
+            # only the candidates select_merge_batch can look at
+            stats = ids.pair_stats(limit=max(1, max_batch_pairs) * 4)
+        else:
+            stats = {}
+            for chunk_ids in ids:
+                get_stats(chunk_ids, stats)
+        if not stats:
+            print("No more mergeable pairs found.")
+            break
+        batch = select_merge_batch(stats, batch_tolerance,
+                                   min(max_batch_pairs, num_merges - i), min_frequency)
+        if not batch:
+            print(f"Top pair below min_frequency={min_frequency}; stopping.")
+            break
+        t1 = time.perf_counter()
+
+        pair_to_idx = {}
+        prev_i = i
+        for pair in batch:
+            idx = len(vocab) + i
+            pair_to_idx[pair] = idx
+            merges[pair] = idx
+            vocab[idx] = vocab[pair[0]] + vocab[pair[1]]
+            i += 1
+        if flat:
+            chunks_touched = ids.merge_pairs(pair_to_idx)
+            corpus_symbols = ids.num_symbols
+        else:
+            chunks_touched = 0
+            new_ids = []
+            for chunk_ids in ids:
+                merged = merge_many(chunk_ids, pair_to_idx)
+                if len(merged) != len(chunk_ids):
+                    chunks_touched += 1
+                    corpus_symbols -= len(chunk_ids) - len(merged)
+                new_ids.append(merged)
+            ids = new_ids
+        t2 = time.perf_counter()
+        n_pass += 1
+
+        # Save checkpoint every `checkpoint_every` merges
+        checkpoint_s = None
+        if checkpoint_path and i // checkpoint_every > prev_i // checkpoint_every:
+            state = {
+                "vocab": vocab,
+                "vocab_re": vocab_re,
+                "merges": merges,
+                "ids": ids,
+                "iteration": i
+            }
+            with open(checkpoint_path, "wb") as f:
+                pickle.dump(state, f)
+            checkpoint_s = round(time.perf_counter() - t2, 4)
+            print(f"Checkpoint saved at iteration {i}")
+
+        rss = round(rss_mb(), 1)
+        for k, (pair, idx) in enumerate(pair_to_idx.items()):
+            telemetry.record(
+                merge=prev_i + k + 1, num_merges=num_merges, corpus_pass=n_pass,
+                pair=list(pair), new_id=idx, token=vocab[idx], freq=stats[pair],
+                count_s=round(t1 - t0, 4), merge_s=round(t2 - t1, 4),
+                chunks_touched=chunks_touched, corpus_symbols=corpus_symbols,
+                rss_mb=rss, checkpoint_s=checkpoint_s,
+            )
+
+    if n_pass and i - start_iter > n_pass:
+        print(f"Learned {i - start_iter} merges in {n_pass} corpus passes")
+    if own_telemetry:
+        telemetry.close()
+    return vocab, merges, ids
 
 if __name__ == "__main__":
+    from datasets import load_dataset
+
     # -------------------------------------------------------------------
     # CONFIG
     # -------------------------------------------------------------------
@@ -17,108 +263,57 @@ if __name__ == "__main__":
     lang = "mix"
     DUMMY_PREFIX = " "
     checkpoint_path = "C:/Users/HP/Documents/vs code/tokenizers-coling2025-main/checkpoint.pkl"
-
-    # -------------------------------------------------------------------
-    # Helpers
-    # -------------------------------------------------------------------
-    def calculate_elapsed_time(start_time):
-        end_time = time.time()
-        time_difference = end_time - start_time
-        days, remainder = divmod(time_difference, 86400)
-        hours, remainder = divmod(remainder, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        return int(days), int(hours), int(minutes), int(seconds)
-
-    def get_stats(ids, counts=None):
-        counts = {} if counts is None else counts
-        for pair in zip(ids, ids[1:]):  # consecutive elements
-            counts[pair] = counts.get(pair, 0) + 1
-        return counts
-
-    def merge(ids, pair, idx):
-        newids = []
-        i = 0
-        while i < len(ids):
-            if ids[i] == pair[0] and i < len(ids) - 1 and ids[i+1] == pair[1]:
-                newids.append(idx)
-                i += 2
-            else:
-                newids.append(ids[i])
-                i += 1
-        return newids
-
-    def save_dict_to_pickle(dictionary, file_path):
-        with open(file_path, 'wb') as file:
-            pickle.dump(dictionary, file)
+    # One JSON record per merge (timings, chunks touched, corpus size, RSS)
+    telemetry_path = "C:/Users/HP/Documents/vs code/tokenizers-coling2025-main/train_telemetry.jsonl"
+    # Batched merging: set e.g. BATCH_TOLERANCE = 0.05, MAX_BATCH_PAIRS = 8
+    # for fast experiment turnaround. None / 1 reproduces exact training.
+    BATCH_TOLERANCE = None
+    MAX_BATCH_PAIRS = 1
+    MIN_FREQUENCY = 1
+    # Keep the training corpus in one int32 buffer instead of lists of ints
+    FLAT_CORPUS = True
+    # Corpus larger than RAM: stream the dataset, spill shards + pair counts
+    # under EXTERNAL_DIR and keep the trainer under MEMORY_LIMIT_MB (None
+    # loads the corpus and keeps it in memory)
+    EXTERNAL_DIR = None
+    MEMORY_LIMIT_MB = 4096
 
     # -------------------------------------------------------------------
     # Load training corpus (Tamil + English from Samanantar)
     # -------------------------------------------------------------------
     print("Loading Samanantar Tamil-English dataset...")
     # For the "ta" config, 'src' is typically English and 'tgt' is Tamil.
-    ds = load_dataset("ai4bharat/samanantar", "ta")
-    tamil_lines = [ex.get("tgt", "") for ex in ds["train"]]
-    english_lines = [ex.get("src", "") for ex in ds["train"]]
-
-    lines = []
-    for ln in (tamil_lines + english_lines):
-        s = re.sub(r'\s+', ' ', (ln or "").strip())
-        if DUMMY_PREFIX is not None:
-            s = DUMMY_PREFIX + s
-        lines.append(s)
-
-    # You can optionally include validation/test too (commented by default)
-    # for split in ("validation", "test"):
-    #     if split in ds:
-    #         tamil_split = [ex.get("tgt", "") for ex in ds[split]]
-    #         english_split = [ex.get("src", "") for ex in ds[split]]
-    #         for ln in (tamil_split + english_split):
-    #             s = re.sub(r'\s+', ' ', (ln or "").strip())
-    #             if DUMMY_PREFIX is not None:
-    #                 s = DUMMY_PREFIX + s
-    #             lines.append(s)
-
-    lines_limited = lines[:]  # use full set; slice here if you want to debug on a subset
+    # streaming=True reads records on demand instead of materializing the split
+    ds = load_dataset("ai4bharat/samanantar", "ta", streaming=EXTERNAL_DIR is not None)
+
+    def training_lines(splits=("train",)):
+        """Tamil then English lines of `splits`, whitespace-collapsed; a generator."""
+        for field in ("tgt", "src"):
+            for split in splits:
+                for ex in ds[split]:
+                    s = re.sub(r'\s+', ' ', (ex.get(field, "") or "").strip())
+                    if DUMMY_PREFIX is not None:
+                        s = DUMMY_PREFIX + s
+                    yield s
+
+    # You can optionally include validation/test too: training_lines(("train", "validation", "test"))
+    if EXTERNAL_DIR:
+        # read twice (vocab, then shards), never held in memory
+        corpus = training_lines
+    else:
+        lines_limited = list(training_lines())  # slice here if you want to debug on a subset
+        corpus = lambda: lines_limited
 
     # -------------------------------------------------------------------
     # Build initial vocab (Tamil graphemes + English chars via grapheme)
     # -------------------------------------------------------------------
-    intial_gh = []
-    progress_bar = tqdm(range(len(lines_limited)), desc="Init vocab (graphemes)")
-    for text in lines_limited:
-        # lang="mix" applies Tamil sandhi only to Tamil spans; English is pass-through
-        text_chunks = sandhi_split(text, lang=lang)  # [(tok,(s,e)),...]
-        graphemed_ls = [list(grapheme.graphemes(tok)) for tok, _ in text_chunks]
-        # NOTE: grapheme splits English into single letters; Tamil into GCs (with diacritics)
-        flat_list = [x for ls in graphemed_ls for x in ls]
-        intial_gh.extend(list(set(flat_list)))
-        progress_bar.update()
-
-    intial_gh = list(set(intial_gh))
-    vocab = {idx: intial_gh[idx] for idx in range(len(intial_gh))}
-    vocab_re = {intial_gh[idx]: idx for idx in range(len(intial_gh))}
+    vocab, vocab_re = build_initial_vocab(corpus(), lang=lang)
 
     # target total vocab size (incl. initial graphemes)
     target_vocab_size = 6_000
     vocab_size_remaining = max(0, target_vocab_size - len(vocab))
     num_merges = vocab_size_remaining
 
-    def covert_to_ids_train(texts):
-        ids = []
-        progress_bar = tqdm(range(len(texts)), desc="Encode to ids (train)")
-        for text in texts:
-            text_chunks = sandhi_split(text, lang=lang)
-            graphemed_ls = [list(grapheme.graphemes(tok)) for tok, _ in text_chunks]
-            ids_temp = [list(map(lambda x: vocab_re[x], ls)) for ls in graphemed_ls]
-            ids.extend(ids_temp)
-            progress_bar.update()
-        return ids
-
-    def covert_to_ids(text_chunk):
-        graphemed_ls = list(grapheme.graphemes(text_chunk))
-        ids = list(map(lambda x: vocab_re[x], graphemed_ls))
-        return ids
-
     # -------------------------------------------------------------------
     # TRAIN BPE with Checkpointing
     # -------------------------------------------------------------------
@@ -131,40 +326,30 @@ if __name__ == "__main__":
         merges = state["merges"]
         ids = state["ids"]
         start_iter = state["iteration"]
+        if isinstance(ids, ShardedCorpus):
+            # shards may already hold merges made after this checkpoint
+            start_iter = ids.replay(vocab, merges, start_iter)
     else:
         print("Starting fresh training...")
-        ids = covert_to_ids_train(lines_limited)
+        ids = covert_to_ids_train(corpus(), vocab_re, lang=lang, flat=FLAT_CORPUS,
+                                  external_dir=EXTERNAL_DIR, memory_limit_mb=MEMORY_LIMIT_MB)
+        if isinstance(ids, ShardedCorpus):
+            print(f"Sharded corpus: {ids.num_symbols} symbols in {len(ids.shards)} shards "
+                  f"under {EXTERNAL_DIR}")
+        elif FLAT_CORPUS:
+            print(f"Flat corpus: {ids.num_symbols} symbols in {len(ids)} chunks, "
+                  f"{ids.nbytes / 2**20:.1f} MiB")
         merges = {}
         start_iter = 0
 
     startTime = time.time()
-    for i in range(start_iter, num_merges):
-        stats = {}
-        for chunk_ids in ids:
-            get_stats(chunk_ids, stats)
-        if not stats:
-            print("No more mergeable pairs found.")
-            break
-        pair = max(stats, key=stats.get)
-        idx = len(vocab) + i
-        ids = [merge(chunk_ids, pair, idx) for chunk_ids in ids]
-        merges[pair] = idx
-        vocab[idx] = vocab[pair[0]] + vocab[pair[1]]
-
-        print(f"merge {i+1}/{num_merges}: {pair} -> {idx} ({vocab[idx]}) had {stats[pair]} occurrences")
-
-        # Save checkpoint every 100 merges
-        if (i+1) % 100 == 0:
-            state = {
-                "vocab": vocab,
-                "vocab_re": vocab_re,
-                "merges": merges,
-                "ids": ids,
-                "iteration": i+1
-            }
-            with open(checkpoint_path, "wb") as f:
-                pickle.dump(state, f)
-            print(f"Checkpoint saved at iteration {i+1}")
+    with TrainingTelemetry(telemetry_path, console_interval=10.0) as telemetry:
+        vocab, merges, ids = train_merges(
+            ids, vocab, num_merges, vocab_re=vocab_re, merges=merges,
+            start_iter=start_iter, checkpoint_path=checkpoint_path,
+            batch_tolerance=BATCH_TOLERANCE, max_batch_pairs=MAX_BATCH_PAIRS,
+            min_frequency=MIN_FREQUENCY, telemetry=telemetry,
+        )
 
     days, hours, minutes, _ = calculate_elapsed_time(startTime)
     print(f"Time taken for training : {days} days {hours} hrs {minutes} mints")
@@ -179,20 +364,98 @@ if __name__ == "__main__":
 # -------------------------------------------------------------------
 # Tokenizer class
 # -------------------------------------------------------------------
+# One scan over sandhi-marked text: grapheme clusters that never cross BOUND
+# or a whitespace / non-whitespace edge (i.e. the clusters of every chunk of
+# sandhi_split, in order). Only valid when the input passes is_fast.
+_MARKED_CLUSTER_RE = chunk_cluster_re(BOUND)
+_MARKED_CHUNK_RE = re.compile(f"[^\\s{BOUND}]+|\\s+")
+# Whitespace / non-whitespace runs. No merge pair mixes whitespace and
+# non-whitespace ids (training chunks are \S+|\s+), so every run is merged
+# on its own and its ids can be cached.
+_RUN_RE = re.compile(r"\s+|\S+")
+# Cut points for encode_parallel. When marking is local to each run any
+# whitespace run start will do; Tamil rules only reach across whitespace
+# after a Tamil letter/sign or a digit, so in ta mode a whitespace run after
+# punctuation is only ever turned into a single BOUND (rule J).
+_RUN_CUT_RE = re.compile(r"(?<=\S)\s")
+_TA_CUT_RE = re.compile(r"(?<=[^\w\s\u0B80-\u0BFF])\s+(?=\S)")
+
+
 class SandhiBPETokenizer:
-    def __init__(self, vocab, merges, lang="mix"):
+    """
+    normalize: canonicalize input (NFC + Tamil folding, see normalize.py)
+    before lookup, as training does; on by default.
+
+    Guards for serving untrusted input (all off by default):
+        max_input_chars  longer inputs are encoded in pieces of about this
+                         size, cut where the result is unchanged (see
+                         _split_pieces); stretches with no such point are
+                         cut hard, which only changes ids at the cut
+        rule_timeout     seconds each sandhi rule may take on a text; a text
+                         whose marking times out is encoded grapheme-only
+        degraded         skip sandhi marking and merges entirely: every
+                         grapheme is one id (decodes to the same text)
+    encode and count_tokens apply them; every fallback is counted in
+    self.fallbacks ("chunked", "hard_cut", "rule_timeout", "degraded").
+    """
+
+    def __init__(self, vocab, merges, lang="mix", cache_size=50_000, vocab_re=None, normalize=True,
+                 max_input_chars=None, rule_timeout=None, degraded=False):
         self.vocab = vocab                # maps id → token
         self.merges = merges
         self.lang = lang
-        self.vocab_re = {v: k for k, v in vocab.items()}  # token → id
+        if vocab_re is None:
+            # frozen tables (see frozen_tables.py) carry their own inverse
+            vocab_re = vocab.inverse() if hasattr(vocab, "inverse") else {v: k for k, v in vocab.items()}
+        self.vocab_re = vocab_re          # token → id
         self.id_to_token = vocab          # alias for clarity
+        # run -> (marked run, merged ids) LRU cache; 0 disables
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.added_unk = None             # id of a <UNK> added by _unk_id
+        self.normalize = normalize
+        self.max_input_chars = max_input_chars
+        self.rule_timeout = rule_timeout
+        self.degraded = degraded
+        self.fallbacks = Counter()
+
+    def encode_options(self):
+        """Normalization and guard settings, as keyword arguments for another tokenizer."""
+        return {"normalize": self.normalize, "max_input_chars": self.max_input_chars,
+                "rule_timeout": self.rule_timeout, "degraded": self.degraded}
 
-    def encode(self, text):
+    def _unk_id(self):
+        # Handle unseen graphemes (like \n, emojis, rare chars)
+        if "<UNK>" not in self.vocab_re:
+            # Determine numeric max id whether vocab maps id->token or token->id
+            max_id = None
+            # try numeric keys (id -> token)
+            try:
+                max_id = max(int(k) for k in self.vocab.keys())
+            except Exception:
+                pass
+            if max_id is None:
+                # try numeric values (token -> id)
+                try:
+                    max_id = max(int(v) for v in self.vocab.values())
+                except Exception:
+                    max_id = 0
+            unk_id = max_id + 1
+            self.vocab[unk_id] = "<UNK>"
+            self.added_unk = unk_id
+            self.vocab_re["<UNK>"] = unk_id
+        return self.vocab_re["<UNK>"]
+
+    def _grapheme_ids(self, text):
+        """Sandhi split + grapheme lookup, before any merge. Returns (text_chunks, ids)."""
+        if self.normalize:
+            text = normalize(text)
         # Step 1: Apply sandhi split (lang-aware; "mix" is default)
         text_chunks = sandhi_split(text, self.lang)
-        # Step 2: Convert split tokens to graphemes → IDs# Step 2: Convert split tokens to graphemes → IDs
         # Step 2: Convert split tokens to graphemes → IDs
-        graphemes_ls = [list(grapheme.graphemes(tok)) for tok, _ in text_chunks]
+        graphemes_ls = [graphemes(tok) for tok, _ in text_chunks]
 
         ids = []
         for g_list in graphemes_ls:
@@ -200,47 +463,457 @@ class SandhiBPETokenizer:
                 if g in self.vocab_re:
                     ids.append(self.vocab_re[g])
                 else:
-                    # Handle unseen graphemes (like \n, emojis, rare chars)
-                    if "<UNK>" not in self.vocab_re:
-                        # Determine numeric max id whether vocab maps id->token or token->id
-                        max_id = None
-                        # try numeric keys (id -> token)
-                        try:
-                            max_id = max(int(k) for k in self.vocab.keys())
-                        except Exception:
-                            pass
-                        if max_id is None:
-                            # try numeric values (token -> id)
-                            try:
-                                max_id = max(int(v) for v in self.vocab.values())
-                            except Exception:
-                                max_id = 0
-                        unk_id = max_id + 1
-                        self.vocab[unk_id] = "<UNK>"
-                        self.vocab_re["<UNK>"] = unk_id
-                    ids.append(self.vocab_re["<UNK>"])
-
-
-        # Step 3: Apply BPE merges (greedy forward pass until convergence)
+                    ids.append(self._unk_id())
+        return text_chunks, ids
+
+    def pretokenize(self, text):
+        """
+        Fused pre-tokenizer: sandhi marking, then a single regex scan that
+        segments graphemes of every chunk at once, looked up straight into an
+        int32 buffer. Returns (marked text, ids) before any merge; same ids
+        as _grapheme_ids (text outside the tamil_graphemes fast path takes
+        that route). merge_ids(ids) gives what encode() returns, without the
+        run cache and input guards.
+        """
+        if self.normalize:
+            text = normalize(text)
+        marked = sandhi_marked(text, self.lang)
+        return marked, self._marked_ids(marked)
+
+    def merge_ids(self, ids, merges=None):
+        """
+        pretokenize() ids merged with `merges` (default: the tokenizer's own;
+        a prefix of them evaluates a smaller vocab, see vocab_sweep).
+        """
+        return self._apply_merges(ids, merges)
+
+    def _marked_ids(self, marked):
+        with stage("sandhi_gpe.graphemes"):
+            if is_fast(marked.replace(BOUND, "")):
+                clusters = _MARKED_CLUSTER_RE.findall(marked)
+            else:
+                clusters = [g for chunk in _MARKED_CHUNK_RE.findall(marked) for g in graphemes(chunk)]
+        with stage("sandhi_gpe.lookup"):
+            ids = list(map(self.vocab_re.get, clusters))
+            if None in ids:
+                unk = self._unk_id()
+                ids = [unk if i is None else i for i in ids]
+            return array('i', ids)
+
+    def _cluster_spans(self, marked):
+        """(start, end) in `marked` of every grapheme cluster _marked_ids looks up."""
+        if is_fast(marked.replace(BOUND, "")):
+            return [m.span() for m in _MARKED_CLUSTER_RE.finditer(marked)]
+        spans = []
+        for chunk in _MARKED_CHUNK_RE.finditer(marked):
+            pos = chunk.start()
+            for g in graphemes(chunk.group()):
+                spans.append((pos, pos + len(g)))
+                pos += len(g)
+        return spans
+
+    def _token_spans(self, marked, ids):
+        """
+        (start, end) in `marked` of each merged id of a prefix of
+        _apply_merges(_marked_ids(marked)). A merged token's string is its
+        clusters joined, so clusters are consumed until its length is
+        covered; an unknown cluster is a single <UNK>.
+        """
+        clusters = self._cluster_spans(marked)
+        spans = []
+        k = 0
+        for i in ids:
+            start, end = clusters[k]
+            if self.vocab_re.get(marked[start:end]) is None:
+                k += 1
+            else:
+                need = len(self.id_to_token[i]) - (end - start)
+                k += 1
+                while need > 0:
+                    need -= clusters[k][1] - clusters[k][0]
+                    end = clusters[k][1]
+                    k += 1
+            spans.append((start, end))
+        return spans
+
+    # ---------------- run cache ----------------
+    def _runs(self, text):
+        """
+        Whitespace / non-whitespace runs to encode independently, and whether
+        they are already sandhi-marked. When marking is local to each run
+        (mix, en) the input runs are used, so a cache hit skips marking too;
+        otherwise the text is marked first and split afterwards.
+        """
+        if marks_runs_independently(self.lang):
+            return _RUN_RE.findall(text), False
+        return _RUN_RE.findall(self._mark(text)), True
+
+    def _encode_run(self, run, premarked):
+        """(marked run, merged ids) for one run, memoized in a bounded LRU cache."""
+        cache = self._cache
+        hit = cache.get(run)
+        if hit is not None:
+            self.cache_hits += 1
+            cache.move_to_end(run)
+            return hit
+        self.cache_misses += 1
+        marked = run if premarked else self._mark(run)
+        ids = self._marked_ids(marked)
+        with stage("sandhi_gpe.merge"):
+            result = (marked, tuple(self._apply_merges(ids)))
+        if self.cache_size > 0:
+            cache[run] = result
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return result
+
+    def cache_info(self):
+        """Hit statistics of the run cache."""
+        lookups = self.cache_hits + self.cache_misses
+        return {"hits": self.cache_hits, "misses": self.cache_misses,
+                "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+                "size": len(self._cache), "maxsize": self.cache_size}
+
+    def clear_cache(self):
+        self._cache.clear()
+        self.cache_hits = self.cache_misses = 0
+
+    # ---------------- guards ----------------
+    def _mark(self, text):
+        """sandhi_marked under rule_timeout (raises TimeoutError)."""
+        return sandhi_marked(text, self.lang, timeout=self.rule_timeout)
+
+    def _fallback(self, kind):
+        self.fallbacks[kind] += 1
+        count("sandhi_gpe.fallback." + kind)
+
+    def _encode_text(self, text):
+        """(marked text, ids) of encode(), with the guards applied."""
+        segments = self._encode_segments(text)
+        if len(segments) == 1:
+            return segments[0][1:]
+        return "".join(m for _, m, _ in segments), [i for _, _, ids in segments for i in ids]
+
+    def _encode_segments(self, text):
+        """
+        [(segment, marked, ids)] for the consecutive segments of `text` that
+        are encoded independently: one, unless max_input_chars cuts it hard.
+        """
+        if self.degraded:
+            self._fallback("degraded")
+            return [(text, text, self._marked_ids(text))]
+        limit = self.max_input_chars
+        if limit and len(text) > limit:
+            self._fallback("chunked")
+            return [(seg, *self._encode_segment(seg, limit)) for seg in self._hard_segments(text, limit)]
+        return [(text, *self._encode_segment(text))]
+
+    def _encode_segment(self, text, piece_chars=None):
+        """
+        (marked, ids) for `text`, in pieces of about `piece_chars` when
+        given; grapheme ids when a rule times out.
+        """
+        try:
+            if piece_chars:
+                return self._join_pieces([self._encode_piece(p)
+                                          for p in self._split_pieces(text, piece_chars)])
+            runs, premarked = self._runs(text)
+            parts = [self._encode_run(run, premarked) for run in runs]
+            return "".join(m for m, _ in parts), [i for _, run_ids in parts for i in run_ids]
+        except TimeoutError:
+            self._fallback("rule_timeout")
+            return text, self._marked_ids(text)
+
+    def _hard_segments(self, text, limit):
+        """
+        `text` cut only inside stretches of more than `limit` chars that hold
+        no safe cut point (_RUN_CUT_RE / _TA_CUT_RE), at their last
+        whitespace within `limit` chars, else at a grapheme boundary (_hard_cut).
+        """
+        cut_re = _RUN_CUT_RE if marks_runs_independently(self.lang) else _TA_CUT_RE
+        segments = []
+        start = 0       # start of the current segment
+        safe = 0        # last safe cut point seen
+        ends = [m.start() for m in cut_re.finditer(text)] + [len(text)]
+        for end in ends:
+            while end - safe > limit:
+                cut = self._hard_cut(text, safe, safe + limit)
+                self._fallback("hard_cut")
+                segments.append(text[start:cut])
+                start = safe = cut
+            safe = end
+        segments.append(text[start:])
+        return segments
+
+    @staticmethod
+    def _hard_cut(text, lo, hi):
+        """
+        Cut position in (lo, hi]: the last grapheme boundary before
+        whitespace that follows a non-space, else the last grapheme boundary
+        (so CR LF pairs and sign sequences stay whole), else hi.
+        """
+        cuts = [lo + b for b in boundaries(text[lo:hi + 1])[1:] if b <= hi - lo]
+        for cut in reversed(cuts):
+            if text[cut].isspace() and not text[cut - 1].isspace():
+                return cut
+        return cuts[-1] if cuts else hi
+
+    def _apply_merges(self, ids, merges=None):
+        """Greedy forward passes over `ids` until no pair in `merges` is left."""
+        merges = self.merges if merges is None else merges
         changed = True
         while changed:
             changed = False
             i = 0
             new_ids = []
             while i < len(ids):
-                if i < len(ids)-1 and (ids[i], ids[i+1]) in self.merges:
-                    new_ids.append(self.merges[(ids[i], ids[i+1])])
+                if i < len(ids)-1 and (ids[i], ids[i+1]) in merges:
+                    new_ids.append(merges[(ids[i], ids[i+1])])
                     i += 2
                     changed = True
                 else:
                     new_ids.append(ids[i])
                     i += 1
             ids = new_ids
+        return ids
+
+    @profiled("sandhi_gpe.encode")
+    def encode(self, text, return_tokens=True, out="list", max_length=None, return_offsets=False):
+        """
+        Returns (split_tokens, ids), or just ids with return_tokens=False.
+        return_offsets=True adds (starts, ends), the span in `text` of every
+        id (see _offsets and batching.to_offsets).
+        With max_length, see _encode_truncated: the result gets the offset
+        in `text` where encoding stopped as a last element.
+        """
+        count("sandhi_gpe.chars", len(text))
+        source, norm_offsets = text, None
+        if self.normalize:
+            if max_length is None and not return_offsets:
+                source = normalize(text)
+            else:
+                # positions are reported in the caller's text
+                source, norm_offsets = normalize_with_offsets(text)
+        # Steps 1-3 per run: sandhi split + graphemes -> IDs in one pass, then
+        # BPE merges (greedy forward pass until convergence); runs are cached
+        if max_length is not None:
+            marked, ids, offset = self._encode_truncated(source, max_length)
+        else:
+            segments = self._encode_segments(source)
+            marked = "".join(m for _, m, _ in segments)
+            ids = [i for _, _, seg_ids in segments for i in seg_ids]
 
         # Optionally return split tokens too (kept for compatibility)
-        split_tokens = [tok for tok, _ in text_chunks]
-        return split_tokens, ids
+        split_tokens = None
+        if return_tokens:
+            split_tokens = _MARKED_CHUNK_RE.findall(marked)
+        offsets = None
+        if return_offsets:
+            with stage("sandhi_gpe.offsets"):
+                offsets = self._offsets([(source, marked, ids)] if max_length is not None
+                                        else segments, norm_offsets)
+        result = encode_result(split_tokens, ids, return_tokens, out, offsets)
+        if max_length is None:
+            return result
+        if norm_offsets is not None:
+            offset = norm_offsets[offset]
+        return (*result, offset) if isinstance(result, tuple) else (result, offset)
+
+    def _offsets(self, segments, norm_offsets=None):
+        """
+        (starts, ends) of every id, from the (text, marked, ids) segments it
+        was encoded in (`marked` may cover a prefix of `text` only).
+        norm_offsets maps positions on to the text before normalization.
+        """
+        if len(segments) == 1:
+            starts, ends = self._segment_offsets(*segments[0])
+        else:
+            starts, ends = [], []
+            base = 0
+            for text, marked, ids in segments:
+                seg_starts, seg_ends = self._segment_offsets(text, marked, ids)
+                starts.extend(base + s for s in seg_starts)
+                ends.extend(base + e for e in seg_ends)
+                base += len(text)
+        if norm_offsets is not None:
+            starts = [norm_offsets[s] for s in starts]
+            ends = [norm_offsets[e] for e in ends]
+        return starts, ends
+
+    def _segment_offsets(self, text, marked, ids):
+        """
+        (starts, ends) in `text` of `ids`, merged from `marked`. A token
+        ends at the cut position after its last character and starts at its
+        first one, so whitespace the rules dropped before a BOUND belongs to
+        no token. Without <UNK> the token strings spell `marked` minus its
+        BOUNDs, and their running lengths are the spans in that string
+        (mapped back with marked_offsets unless it is `text` itself);
+        otherwise tokens are aligned with the clusters (_token_spans).
+        """
+        tokens = list(map(self.id_to_token.get, ids))
+        stripped = marked.replace(BOUND, "")
+        if None not in tokens and "<UNK>" not in tokens and "".join(tokens) == stripped:
+            ends = list(accumulate(map(len, tokens)))
+            starts = [0, *ends][:-1]
+            if text.startswith(stripped):
+                return starts, ends
+            pos = marked_offsets(text, marked, bounds=False)
+        else:
+            spans = self._token_spans(marked, ids)
+            starts = [s for s, _ in spans]
+            ends = [e for _, e in spans]
+            pos = marked_offsets(text, marked)
+        return [pos[s + 1] - 1 for s in starts], [pos[e] for e in ends]
+
+    def _encode_truncated(self, text, max_length):
+        """
+        encode() limited to the first `max_length` ids. Runs are encoded in
+        order and every run is final once encoded (merges never cross a run),
+        so encoding stops as soon as the budget is filled: the rest of the
+        input is never marked, segmented or merged. In ta mode the rules span
+        whitespace and the text is marked up front. Returns (marked, ids,
+        offset); text[:offset] is what the ids cover, `marked` its marked form.
+        """
+        if self.degraded:
+            self._fallback("degraded")
+            return self._truncated_graphemes(text, max_length)
+        local = marks_runs_independently(self.lang)
+        try:
+            source = text if local else self._mark(text)
+            return self._truncate_marked(text, source, local, max_length)
+        except TimeoutError:
+            self._fallback("rule_timeout")
+            return self._truncated_graphemes(text, max_length)
+
+    def _truncated_graphemes(self, text, max_length):
+        spans = self._cluster_spans(text)
+        offset = spans[max_length - 1][1] if len(spans) > max_length else len(text)
+        return text[:offset], self._marked_ids(text[:offset]), offset
+
+    def _truncate_marked(self, text, source, local, max_length):
+        ids, marked_parts = [], []
+        cut = 0  # position in `source` where encoding stopped
+        for m in _RUN_RE.finditer(source):
+            room = max_length - len(ids)
+            if room <= 0:
+                break
+            marked, run_ids = self._encode_run(m.group(), not local)
+            if len(run_ids) <= room:
+                ids.extend(run_ids)
+                marked_parts.append(marked)
+                cut = m.end()
+                continue
+            # budget ends inside this run: keep the first `room` ids
+            end = self._token_spans(marked, run_ids[:room])[-1][1]
+            ids.extend(run_ids[:room])
+            marked_parts.append(marked[:end])
+            cut = m.start() + (marked_offsets(m.group(), marked)[end] if local else end)
+            break
+        offset = cut if local else marked_offsets(text, source)[cut]
+        return "".join(marked_parts), ids, offset
+
+    # ---------------- long documents ----------------
+    def _split_pieces(self, text, piece_chars):
+        """Cut `text` into pieces of about `piece_chars` at safe points (see _RUN_CUT_RE)."""
+        local = marks_runs_independently(self.lang)
+        pieces = []
+        start = 0
+        while len(text) - start > piece_chars:
+            m = (_RUN_CUT_RE if local else _TA_CUT_RE).search(text, start + piece_chars)
+            if m is None:
+                break
+            pieces.append(text[start:m.start()])
+            # ta: the whitespace run becomes the BOUND put back in _join_pieces
+            start = m.start() if local else m.end()
+        pieces.append(text[start:])
+        return pieces
 
+    def _encode_piece(self, piece):
+        """
+        mix/en: (marked piece, ids). ta: (marked piece, first run, last run,
+        ids of the runs in between, number of runs); edge runs are merged
+        across the cut by _join_pieces.
+        """
+        if marks_runs_independently(self.lang):
+            parts = [self._encode_run(run, False) for run in _RUN_RE.findall(piece)]
+            return "".join(marked for marked, _ in parts), [i for _, ids in parts for i in ids]
+        marked = self._mark(piece)
+        runs = _RUN_RE.findall(marked)
+        inner = [i for run in runs[1:-1] for i in self._encode_run(run, True)[1]]
+        return marked, runs[0] if runs else "", runs[-1] if runs else "", inner, len(runs)
+
+    def _join_pieces(self, results):
+        if marks_runs_independently(self.lang):
+            return "".join(m for m, _ in results), [i for _, ids in results for i in ids]
+        # the cut whitespace became one BOUND, joining the last run of a piece
+        # and the first run of the next into a single run
+        ids = []
+        carry = None
+        for marked, first, last, inner, num_runs in results:
+            head = first if carry is None else carry + BOUND + first
+            if num_runs <= 1:
+                carry = head
+                continue
+            ids.extend(self._encode_run(head, True)[1])
+            ids.extend(inner)
+            carry = last
+        if carry:
+            ids.extend(self._encode_run(carry, True)[1])
+        return BOUND.join(r[0] for r in results), ids
+
+    def encode_parallel(self, text, workers=None, piece_chars=1 << 16, return_tokens=True,
+                        out="list", pool=None):
+        """
+        encode() for long documents: cut at safe points, encode the pieces
+        on a process pool (or `pool`, a multiprocessing.Pool made with
+        parallel_encode_pool) and join them. Identical to encode(text).
+        """
+        if self.normalize:
+            text = normalize(text)
+        pieces = self._split_pieces(text, piece_chars)
+        workers = os.cpu_count() if workers is None else workers
+        if pool is not None:
+            results = pool.map(_encode_piece, pieces)
+        elif workers <= 1 or len(pieces) == 1:
+            results = [self._encode_piece(p) for p in pieces]
+        else:
+            with self.parallel_encode_pool(min(workers, len(pieces))) as own_pool:
+                results = own_pool.map(_encode_piece, pieces)
+                own_pool.close()
+                own_pool.join()
+        marked, ids = self._join_pieces(results)
+        split_tokens = _MARKED_CHUNK_RE.findall(marked) if return_tokens else None
+        return encode_result(split_tokens, ids, return_tokens, out)
+
+    def parallel_encode_pool(self, workers=None):
+        """
+        A process pool whose workers hold a copy of this tokenizer, for
+        encode_parallel. An application forking it from a large parent may
+        call frozen_tables.freeze_gc() first; the library leaves the GC alone.
+        """
+        from multiprocessing import Pool
+        return Pool(workers, initializer=_init_piece_worker,
+                    initargs=(self.vocab, self.merges, self.lang))
+
+    @profiled("sandhi_gpe.count_tokens")
+    def count_tokens(self, text):
+        """len(encode(text)[1]) from the cached run lengths, without building the id list."""
+        if self.normalize:
+            text = normalize(text)
+        if self.degraded or self.rule_timeout is not None or (
+                self.max_input_chars and len(text) > self.max_input_chars):
+            return len(self._encode_text(text)[1])
+        runs, premarked = self._runs(text)
+        return sum(len(self._encode_run(run, premarked)[1]) for run in runs)
+
+    def count_tokens_batch(self, texts):
+        return [self.count_tokens(text) for text in texts]
+
+    def encode_padded(self, texts, max_length=None, pad_id=0, pad_to_multiple_of=None):
+        """Padded int32 id matrix and attention mask for `texts` (see batching.pad_batch)."""
+        return encode_padded(self, texts, max_length, pad_id, pad_to_multiple_of)
+
+    @profiled("sandhi_gpe.decode")
     def decode(self, ids):
         tokens = []
         for i in ids:
@@ -250,9 +923,40 @@ class SandhiBPETokenizer:
                 tokens.append("<UNK>")
         return ''.join(tokens)
 
-def load_tokenizer(vocab_path, merges_path, lang="mix"):
+_WORKER_TOKENIZER = None
+
+
+def _init_piece_worker(vocab, merges, lang):
+    global _WORKER_TOKENIZER
+    _WORKER_TOKENIZER = SandhiBPETokenizer(vocab, merges, lang=lang)
+
+
+def _encode_piece(piece):
+    return _WORKER_TOKENIZER._encode_piece(piece)
+
+
+def load_tokenizer(vocab_path, merges_path, lang="mix", frozen=False, **options):
+    """
+    frozen=True reads the tables from a memory-mapped file next to
+    `merges_path` (written on first use, rewritten when a pickle is newer),
+    so forked workers share them; see frozen_tables.py. `options` go to
+    SandhiBPETokenizer (normalize, max_input_chars, rule_timeout, degraded).
+    """
+    if frozen:
+        path = merges_path + ".frozen"
+        newest = max(os.path.getmtime(vocab_path), os.path.getmtime(merges_path))
+        if not os.path.exists(path) or os.path.getmtime(path) < newest:
+            tok = load_tokenizer(vocab_path, merges_path, lang)
+            write_frozen(path, tok.vocab, tok.merges)
+        return load_frozen_tokenizer(path, lang, **options)
     with open(vocab_path, "rb") as f:
         vocab = pickle.load(f)
     with open(merges_path, "rb") as f:
         merges = pickle.load(f)
-    return SandhiBPETokenizer(vocab, merges, lang)
+    return SandhiBPETokenizer(vocab, merges, lang, **options)
+
+
+def load_frozen_tokenizer(path, lang="mix", **options):
+    """Tokenizer over a table written by frozen_tables.write_frozen."""
+    tables = FrozenTables(path)
+    return SandhiBPETokenizer(tables.vocab, tables.merges, lang, vocab_re=tables.vocab_re, **options)
@@ -0,0 +1,103 @@
+# batching.py
+"""
+Array outputs and padded batches shared by BPETokenizer, GPETokenizer and
+SandhiBPETokenizer.
+
+encode(text, return_tokens=False, out="numpy") gives the ids straight as an
+int32 array; encode_padded turns a list of texts into an (n, width) id matrix
+plus attention mask, and bucket_batches groups texts of similar length so
+batches carry little padding. encode(text, return_offsets=True) adds the
+(starts, ends) character offsets of every id in the input text, as two
+int32 arrays (array('i'), or NumPy with out="numpy").
+"""
+from array import array
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+OUT_TYPES = ("list", "numpy", "array")
+
+
+def to_out(ids, out: str = "list"):
+    """ids as a list, an int32 NumPy array ("numpy") or an array('I') ("array")."""
+    if out == "list":
+        return ids if isinstance(ids, list) else list(ids)
+    if out == "numpy":
+        return np.asarray(ids, dtype=np.int32)
+    if out == "array":
+        return array('I', ids)
+    raise ValueError(f"Unknown output type: {out!r} (expected one of {OUT_TYPES})")
+
+
+def to_offsets(starts, ends, out: str = "list"):
+    """(starts, ends) as int32 NumPy arrays for out="numpy", as array('i') otherwise."""
+    if out == "numpy":
+        return np.asarray(starts, dtype=np.int32), np.asarray(ends, dtype=np.int32)
+    return array('i', starts), array('i', ends)
+
+
+def encode_result(tokens, ids, return_tokens: bool = True, out: str = "list", offsets=None):
+    """
+    What encode returns: (tokens, ids) or just ids, ids converted by `out`;
+    with `offsets` ((starts, ends)) they are added last, see to_offsets.
+    """
+    ids = to_out(ids, out)
+    if offsets is not None:
+        offsets = to_offsets(*offsets, out)
+        return (tokens, ids, offsets) if return_tokens else (ids, offsets)
+    return (tokens, ids) if return_tokens else ids
+
+
+def batch_ids(tokenizer, texts: Sequence[str]) -> List[List[int]]:
+    """
+    Id lists for `texts`, through the tokenizer's own encode_batch when it has
+    one. A SentencePiece processor encodes the list in one call.
+    """
+    if hasattr(tokenizer, "serialized_model_proto"):
+        return tokenizer.encode(list(texts))
+    if hasattr(tokenizer, "encode_batch"):
+        return [ids for _, ids in tokenizer.encode_batch(list(texts))]
+    return [tokenizer.encode(text, return_tokens=False) for text in texts]
+
+
+def pad_batch(seqs: Sequence[Sequence[int]], pad_id: int = 0, max_length: int = None,
+              pad_to_multiple_of: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Right-pad id sequences into an int32 matrix; sequences longer than
+    `max_length` are truncated. Returns (ids, attention_mask), mask 1 on real
+    tokens and 0 on padding.
+    """
+    lengths = np.fromiter((len(s) for s in seqs), dtype=np.int64, count=len(seqs))
+    if max_length is not None:
+        lengths = np.minimum(lengths, max_length)
+    width = int(lengths.max()) if len(lengths) else 0
+    if pad_to_multiple_of:
+        width = -(-width // pad_to_multiple_of) * pad_to_multiple_of
+    mask = np.arange(width) < lengths[:, None]
+    ids = np.full((len(seqs), width), pad_id, dtype=np.int32)
+    if len(seqs) and width:
+        ids[mask] = np.concatenate([np.asarray(s[:n], dtype=np.int32) for s, n in zip(seqs, lengths)])
+    return ids, mask.astype(np.int32)
+
+
+def encode_padded(tokenizer, texts: Sequence[str], max_length: int = None, pad_id: int = 0,
+                  pad_to_multiple_of: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode `texts` into a padded (ids, attention_mask) pair, see pad_batch."""
+    return pad_batch(batch_ids(tokenizer, texts), pad_id, max_length, pad_to_multiple_of)
+
+
+def bucket_batches(tokenizer, texts: Sequence[str], batch_size: int, max_length: int = None,
+                   pad_id: int = 0, pad_to_multiple_of: int = None
+                   ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Encode all `texts`, sort them by length and yield (indices, ids,
+    attention_mask) per batch of `batch_size`; `indices` are positions in
+    `texts`, so results can be put back in input order.
+    """
+    seqs = batch_ids(tokenizer, texts)
+    lengths = np.fromiter((len(s) for s in seqs), dtype=np.int64, count=len(seqs))
+    order = np.argsort(lengths, kind="stable")
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        ids, mask = pad_batch([seqs[i] for i in idx], pad_id, max_length, pad_to_multiple_of)
+        yield idx, ids, mask
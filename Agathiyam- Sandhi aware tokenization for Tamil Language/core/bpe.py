@@ -1,8 +1,15 @@
 # bpe_correct.py
 import pickle
-from collections import Counter, defaultdict
+import re
+from collections import Counter, OrderedDict, defaultdict
+import numpy as np
 from typing import List, Tuple, Dict
 
+from batching import encode_padded, encode_result
+from profiling import profiled, stage
+
+_WORD_RE = re.compile(r"\S+")
+
 
 # ---------------- utilities for BPE training ----------------
 def get_vocab(corpus: List[str]) -> Counter:
@@ -58,10 +65,22 @@ def merge_vocab(pair: Tuple[str, str], vocab: Counter) -> Counter:
     return new_vocab
 
 
-def train_bpe(corpus: List[str], num_merges: int = 100) -> Tuple[Dict[str, int], List[Tuple[str, str]]]:
+def train_bpe(corpus: List[str], num_merges: int = 100, external_dir: str = None,
+              memory_limit_mb: int = 1024, backend: str = "python") -> Tuple[Dict[str, int], List[Tuple[str, str]]]:
     """
     Train BPE on given corpus (list of lines). Returns token_to_id map and ordered merges list.
+    backend="numpy" keeps the word table as int32 symbol arrays and counts and
+    merges pairs with vectorised NumPy ops (see _train_bpe_arrays); the output
+    is identical to the pure-Python loop.
+    With `external_dir`, symbol sequences and pair counts are spilled to disk
+    there and the trainer stays under `memory_limit_mb` (see _train_bpe_external).
     """
+    if external_dir:
+        return _train_bpe_external(corpus, num_merges, external_dir, memory_limit_mb)
+    if backend == "numpy":
+        return _train_bpe_arrays(corpus, num_merges)
+    if backend != "python":
+        raise ValueError(f"Unknown BPE training backend: {backend!r}")
     vocab = get_vocab(corpus)
     merges: List[Tuple[str, str]] = []
 
@@ -78,6 +97,10 @@ def train_bpe(corpus: List[str], num_merges: int = 100) -> Tuple[Dict[str, int],
     for word_symbols in vocab:
         tokens.update(word_symbols)
 
+    return _build_token_to_id(tokens), merges
+
+
+def _build_token_to_id(tokens) -> Dict[str, int]:
     # reserve special tokens
     token_to_id = {'<UNK>': 0, '<SPACE>': 1}
     idx = max(token_to_id.values()) + 1
@@ -85,27 +108,171 @@ def train_bpe(corpus: List[str], num_merges: int = 100) -> Tuple[Dict[str, int],
         if t not in token_to_id:
             token_to_id[t] = idx
             idx += 1
+    return token_to_id
+
+
+def _train_bpe_arrays(corpus, num_merges, make_corpus=None):
+    """
+    Array-backed BPE training, see learn_merges. Ties go to the pair seen
+    first in word-table order, the same pair max() picks in train_bpe, so
+    merges and token_to_id match exactly.
+    """
+    tokens, merges = learn_merges(get_vocab(corpus), num_merges, make_corpus)
+    return _build_token_to_id(tokens), merges
+
+
+def learn_merges(word_counts: Counter, num_merges: int, make_corpus=None) -> Tuple[set, List[Tuple[str, str]]]:
+    """
+    Learn up to `num_merges` merges over a word table (tuple of symbols -> frequency).
+    Each word becomes one chunk of int32 symbol ids weighted by its frequency;
+    pairs are packed into int64 keys and counted with a weighted bincount,
+    merges are applied with array masks. Returns (symbols left in the table,
+    ordered merges).
+
+    make_corpus(chunks, weights) builds the symbol store (in-memory
+    FlatCorpus by default, ShardedCorpus for external training).
+    """
+    from flat_corpus import FlatCorpus
+
+    sym_to_id: Dict[str, int] = {}
+    id_to_sym: List[str] = []
+
+    def sym_id(s):
+        if s not in sym_to_id:
+            sym_to_id[s] = len(id_to_sym)
+            id_to_sym.append(s)
+        return sym_to_id[s]
+
+    chunks = ([sym_id(s) for s in word] for word in word_counts)
+    if make_corpus is None:
+        words = FlatCorpus.from_chunks(chunks, weights=word_counts.values())
+    else:
+        words = make_corpus(chunks, word_counts.values())
+
+    merges: List[Tuple[str, str]] = []
+    for i in range(num_merges):
+        pairs = words.pair_stats(limit=1)
+        if not pairs:
+            break
+        (a, b), _ = next(iter(pairs.items()))
+        merges.append((id_to_sym[a], id_to_sym[b]))
+        words.merge_pairs({(a, b): sym_id(id_to_sym[a] + id_to_sym[b])})
+
+    present = set()
+    for flat in (words.iter_shards() if hasattr(words, "iter_shards") else [words]):
+        present.update(np.unique(flat.data[:flat.num_symbols]).tolist())
+    return {id_to_sym[i] for i in present}, merges
+
+
+# ---------------- applying merges ----------------
+def merge_ranks(merges: List[Tuple[str, str]]):
+    """
+    pair -> first rank, plus pair -> later ranks for pairs listed more than
+    once (string collisions can bring a merged pair back).
+    """
+    ranks: Dict[Tuple[str, str], int] = {}
+    repeats: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+    for rank, pair in enumerate(merges):
+        pair = tuple(pair)
+        if pair in ranks:
+            repeats[pair].append(rank)
+        else:
+            ranks[pair] = rank
+    return ranks, dict(repeats)
+
+
+def apply_ranked_merges(tokens: List[str], merges, ranks, repeats) -> List[str]:
+    """
+    Same result as applying every merge in order to `tokens`. Instead of
+    looping over all merges, repeatedly merge the lowest-ranked pair present
+    whose rank is above the last merge applied (ranks in between would have
+    been no-ops), so cost depends on the sequence length, not on the number
+    of merges.
+    """
+    last_rank = -1
+    while len(tokens) > 1:
+        best_rank = None
+        for pair in zip(tokens, tokens[1:]):
+            rank = ranks.get(pair)
+            if rank is None:
+                continue
+            if rank <= last_rank:
+                if pair not in repeats:
+                    continue
+                rank = next((r for r in repeats[pair] if r > last_rank), None)
+                if rank is None:
+                    continue
+            if best_rank is None or rank < best_rank:
+                best_rank = rank
+        if best_rank is None:
+            break
+        left, right = merges[best_rank]
+        i = 0
+        new_tokens = []
+        while i < len(tokens):
+            if i < len(tokens) - 1 and tokens[i] == left and tokens[i + 1] == right:
+                new_tokens.append(left + right)
+                i += 2
+            else:
+                new_tokens.append(tokens[i])
+                i += 1
+        tokens = new_tokens
+        last_rank = best_rank
+    return tokens
+
 
-    return token_to_id, merges
+def _train_bpe_external(corpus, num_merges, external_dir, memory_limit_mb):
+    """
+    External-memory variant of train_bpe with identical output. Only the
+    word-type table is kept in memory; `corpus` may be any iterable of lines
+    (e.g. an open file). Word symbol sequences (as int ids, weighted by word
+    frequency) and their pair counts live in disk shards, see external_corpus.py.
+    """
+    from external_corpus import ShardedCorpus
+
+    return _train_bpe_arrays(
+        corpus, num_merges,
+        lambda chunks, weights: ShardedCorpus.from_chunks(chunks, external_dir, memory_limit_mb,
+                                                          weights=weights))
 
 
 # ---------------- tokenizer object ----------------
 class BPETokenizer:
-    def __init__(self, token_to_id: Dict[str, int], merges: List[Tuple[str, str]]):
+    def __init__(self, token_to_id: Dict[str, int], merges: List[Tuple[str, str]],
+                 cache_size: int = 50_000):
         """
         token_to_id: mapping token -> id (includes special tokens like '<UNK>' and '<SPACE>')
         merges: ordered list of merge pairs, e.g. [('a','b'), ('ab','c'), ...]
+        cache_size: max words kept in the word -> (tokens, ids) LRU cache (0 disables)
         """
         self.token_to_id = token_to_id
         self.id_to_token = {v: k for k, v in token_to_id.items()}
         self.merges = merges  # ordered list
+        # pair -> first rank; a pair listed more than once also keeps all its ranks
+        self.merge_ranks, self._repeat_ranks = merge_ranks(merges)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[Tuple[str, ...], Tuple[int, ...]]]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def _apply_merges_to_word(self, word: str) -> List[str]:
         """
-        Apply learned merges (in order) to a single word.
+        Apply learned merges to a single word, same result as applying every
+        merge in order (see apply_ranked_merges), so cost depends on the word
+        length, not on the number of merges.
         Returns list of BPE subword tokens for that word (without the '</w>' marker).
         """
         # initial token sequence: characters + end-of-word marker
+        tokens = apply_ranked_merges(list(word) + ['</w>'], self.merges,
+                                     self.merge_ranks, self._repeat_ranks)
+        # drop the end-of-word marker and return
+        return [t for t in tokens if t != '</w>']
+
+    def _apply_merges_in_order(self, word: str) -> List[str]:
+        """
+        Reference implementation: apply every learned merge, in order, to the word.
+        O(len(merges) * len(word)); kept for tests and benchmarks.
+        """
         tokens = list(word) + ['</w>']
         for pair in self.merges:
             i = 0
@@ -118,25 +285,148 @@ class BPETokenizer:
                     new_tokens.append(tokens[i])
                     i += 1
             tokens = new_tokens
-        # drop the end-of-word marker and return
         return [t for t in tokens if t != '</w>']
 
-    def encode(self, text: str) -> Tuple[List[str], List[int]]:
+    # ---------------- word cache ----------------
+    @profiled("bpe.merge")
+    def _encode_word_uncached(self, word: str) -> Tuple[Tuple[str, ...], Tuple[int, ...]]:
+        unk = self.token_to_id.get('<UNK>', 0)
+        sub_tokens = tuple(self._apply_merges_to_word(word))
+        return sub_tokens, tuple(self.token_to_id.get(t, unk) for t in sub_tokens)
+
+    def _encode_word(self, word: str) -> Tuple[Tuple[str, ...], Tuple[int, ...]]:
+        """(subword tokens, ids) for one word, memoized in a bounded LRU cache."""
+        cache = self._cache
+        hit = cache.get(word)
+        if hit is not None:
+            self.cache_hits += 1
+            cache.move_to_end(word)
+            return hit
+        self.cache_misses += 1
+        result = self._encode_word_uncached(word)
+        self._cache_put(word, result)
+        return result
+
+    def encode_word(self, word: str) -> Tuple[Tuple[str, ...], Tuple[int, ...]]:
+        """(subword tokens, ids) for one whitespace-free word, through the word cache."""
+        return self._encode_word(word)
+
+    def _cache_put(self, word, result):
+        if self.cache_size <= 0:
+            return
+        self._cache[word] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def cache_info(self) -> Dict[str, float]:
+        """Hit statistics of the word cache."""
+        lookups = self.cache_hits + self.cache_misses
+        return {"hits": self.cache_hits, "misses": self.cache_misses,
+                "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+                "size": len(self._cache), "maxsize": self.cache_size}
+
+    def clear_cache(self):
+        self._cache.clear()
+        self.cache_hits = self.cache_misses = 0
+
+    # ---------------- encode ----------------
+    def _join_words(self, encoded_words) -> Tuple[List[str], List[int]]:
+        # explicit '<SPACE>' token between words
+        space_id = self.token_to_id.get('<SPACE>', self.token_to_id.get('<UNK>', 0))
+        tokens: List[str] = []
+        ids: List[int] = []
+        for i, (sub_tokens, sub_ids) in enumerate(encoded_words):
+            if i:
+                tokens.append('<SPACE>')
+                ids.append(space_id)
+            tokens.extend(sub_tokens)
+            ids.extend(sub_ids)
+        return tokens, ids
+
+    @profiled("bpe.encode")
+    def encode(self, text: str, return_tokens: bool = True, out: str = "list",
+               return_offsets: bool = False):
         """
         Encode a full text string into BPE tokens and ids.
         Word boundaries are separated using the special token '<SPACE>' in the output token list.
+        return_tokens=False returns the ids only; out="numpy"/"array" gives them
+        as an int32 NumPy array / array('I') (see batching.py).
+        return_offsets=True adds (starts, ends) in `text` per id; a '<SPACE>'
+        spans the whitespace between its two words.
         """
-        tokens: List[str] = []
-        for i, w in enumerate(text.strip().split()):
-            sub_tokens = self._apply_merges_to_word(w)
-            tokens.extend(sub_tokens)
-            # append explicit space token between words
-            if i < len(text.strip().split()) - 1:
-                tokens.append('<SPACE>')
+        if not return_offsets:
+            # split once; repeated words come from the cache
+            tokens, ids = self._join_words([self._encode_word(w) for w in text.split()])
+            return encode_result(tokens, ids, return_tokens, out)
+        spans = [m.span() for m in _WORD_RE.finditer(text)]
+        encoded = [self._encode_word(text[s:e]) for s, e in spans]
+        tokens, ids = self._join_words(encoded)
+        with stage("bpe.offsets"):
+            offsets = self._offsets(spans, encoded)
+        return encode_result(tokens, ids, return_tokens, out, offsets)
 
-        ids = [self.token_to_id.get(t, self.token_to_id.get('<UNK>', 0)) for t in tokens]
-        return tokens, ids
+    @staticmethod
+    def _offsets(spans, encoded) -> Tuple[List[int], List[int]]:
+        """(starts, ends) of _join_words(encoded), the words being text[s:e] for `spans`."""
+        starts: List[int] = []
+        ends: List[int] = []
+        for i, ((s, e), (sub_tokens, _)) in enumerate(zip(spans, encoded)):
+            if i:
+                starts.append(ends[-1])
+                ends.append(s)
+            for t in sub_tokens:
+                starts.append(s)
+                s = min(s + len(t), e)      # a last token may end in '</w>'
+                ends.append(s)
+        return starts, ends
+
+    @profiled("bpe.encode_batch")
+    def encode_batch(self, texts: List[str]) -> List[Tuple[List[str], List[int]]]:
+        """
+        Encode many texts. Distinct words across the whole batch are merged once,
+        then every text is assembled from those results.
+        """
+        split_texts = [text.split() for text in texts]
+        encoded: Dict[str, Tuple[Tuple[str, ...], Tuple[int, ...]]] = {}
+        for words in split_texts:
+            for w in words:
+                if w in encoded:
+                    continue
+                hit = self._cache.get(w)
+                if hit is not None:
+                    self.cache_hits += 1
+                    self._cache.move_to_end(w)
+                    encoded[w] = hit
+                else:
+                    self.cache_misses += 1
+                    encoded[w] = self._encode_word_uncached(w)
+                    self._cache_put(w, encoded[w])
+        return [self._join_words([encoded[w] for w in words]) for words in split_texts]
+
+    @profiled("bpe.count_tokens")
+    def count_tokens(self, text: str) -> int:
+        """len(encode(text)[1]) without building the token and id lists."""
+        words = text.split()
+        return sum(len(self._encode_word(w)[1]) for w in words) + max(0, len(words) - 1)
+
+    @profiled("bpe.count_tokens")
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """count_tokens for many texts; each distinct word is looked up once."""
+        split_texts = [text.split() for text in texts]
+        lengths: Dict[str, int] = {}
+        for words in split_texts:
+            for w in words:
+                if w not in lengths:
+                    lengths[w] = len(self._encode_word(w)[1])
+        # one '<SPACE>' between words
+        return [sum(lengths[w] for w in words) + max(0, len(words) - 1) for words in split_texts]
+
+    def encode_padded(self, texts: List[str], max_length: int = None, pad_id: int = 0,
+                      pad_to_multiple_of: int = None):
+        """Padded int32 id matrix and attention mask for `texts` (see batching.pad_batch)."""
+        return encode_padded(self, texts, max_length, pad_id, pad_to_multiple_of)
 
+    @profiled("bpe.decode")
     def decode(self, ids: List[int]) -> str:
         """
         Decode a list of ids back to a string. '<SPACE>' id becomes a space.
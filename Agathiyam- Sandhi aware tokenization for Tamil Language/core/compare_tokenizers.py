@@ -1,4 +1,5 @@
 # compare_samanantar_local_csv.py
+import argparse
 import pickle
 import grapheme
 import regex as re
@@ -6,6 +7,7 @@ import csv
 from bpe import load_bpe
 from gpe import load_gpe
 from GPE_sandhi import load_tokenizer
+from encode_cache import EncodeCache
 
 # ------------------ Metrics ------------------
 def compression_ratio(text, num_tokens):
@@ -15,13 +17,14 @@ def fertility_score(text, num_tokens):
     return num_tokens / len(text) if len(text) > 0 else 0
 
 # ------------------ Evaluate a list of texts ------------------
-def evaluate_texts(texts, tokenizers):
+def evaluate_texts(texts, tokenizers, caches=None):
+    """caches: optional name -> EncodeCache, used instead of re-encoding."""
     results = {}
     for name, tok in tokenizers.items():
         total_cr, total_fs, total_tokens, count = 0, 0, 0, 0
-        for text in texts:
-            tokens, ids = tok.encode(text)
-            num_tokens = len(tokens)
+        counter = caches.get(name, tok) if caches else tok
+        # only len(ids) is needed; count_tokens skips building token/id lists
+        for text, num_tokens in zip(texts, counter.count_tokens_batch(texts)):
             if num_tokens == 0:
                 continue
             total_cr += compression_ratio(text, num_tokens)
@@ -36,6 +39,12 @@ def evaluate_texts(texts, tokenizers):
 
 # ------------------ Main ------------------
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cache", default=None,
+                    help="SQLite encode cache shared across runs (see encode_cache.py)")
+    ap.add_argument("--cache-max-entries", type=int, default=2_000_000)
+    args = ap.parse_args()
+
     # Load Samanantar Tamil dataset from local file
     local_file = "data/samanantar_eng_90_percent_cleaned1.txt"
     ws_pat = re.compile(r'\s+')
@@ -53,6 +62,11 @@ if __name__ == "__main__":
         "Sandhi-GPE": sandhi_tok
     }
 
+    caches = None
+    if args.cache:
+        caches = {name: EncodeCache(args.cache, tok, max_entries=args.cache_max_entries)
+                  for name, tok in tokenizers.items()}
+
     # CSV output
     csv_file = "evaluation_results.csv"
     header = ["Limit", "Tokenizer", "Avg CR", "Avg FS", "Avg Tokens"]
@@ -61,7 +75,7 @@ if __name__ == "__main__":
     # Evaluate on multiple limits
     for limit in [500, 1000, 2000, 3000]:
         subset = lines[:limit]
-        results = evaluate_texts(subset, tokenizers)
+        results = evaluate_texts(subset, tokenizers, caches)
         print(f"\n--- Evaluating {limit} lines ---")
         for name, (cr, fs, avg_tokens) in results.items():
             print(f"{name:<12} Avg CR={cr:.4f} Avg FS={fs:.4f} Avg Tokens={avg_tokens:.2f}")
@@ -0,0 +1,209 @@
+# encode_cache.py
+"""
+Persistent encode cache shared across runs.
+
+The evaluation scripts (compare_tokenizers, oov, the fertility scripts)
+re-tokenize the same Samanantar / flores lines on every run. EncodeCache
+keeps (tokenizer fingerprint, line hash) -> ids in a local SQLite file, so a
+re-run on an unchanged model only reads ids back:
+
+    cache = EncodeCache("encode_cache.sqlite", tok)
+    counts = cache.count_tokens_batch(lines)    # misses are encoded and stored
+
+The fingerprint covers vocab, merges, the sandhi rule pack, lang and the
+encode options (plus the Unicode version of the grapheme rules), so a
+changed model never gets stale ids. Lookups go to SQLite in batches, and once
+the file holds more than `max_entries` encodings the least recently used
+ones are evicted. A tokenizer with a rule_timeout is never cached: its ids
+depend on how fast the rules ran (see cacheable).
+"""
+import hashlib
+import sqlite3
+from array import array
+from typing import Callable, List, Optional, Sequence
+
+import grapheme
+
+from batching import batch_ids
+from normalize import NORMALIZATION_VERSION
+
+# bump when an encoder changes its output without any model file changing
+FINGERPRINT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS encodings (
+    fp   TEXT    NOT NULL,
+    key  BLOB    NOT NULL,
+    n    INTEGER NOT NULL,
+    ids  BLOB    NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (fp, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS encodings_used ON encodings (used);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def _feed(h, *parts):
+    for part in parts:
+        data = part if isinstance(part, bytes) else repr(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """
+    Hex digest identifying everything that decides `tokenizer`'s ids:
+    class, vocab, merges and, for SandhiBPETokenizer, lang, rule pack,
+    input normalization and the max_input_chars / degraded guards.
+    A SentencePiece processor is identified by its serialized model.
+    """
+    h = hashlib.sha256()
+    _feed(h, FINGERPRINT_VERSION, type(tokenizer).__name__, grapheme.UNICODE_VERSION)
+    if hasattr(tokenizer, "serialized_model_proto"):
+        _feed(h, tokenizer.serialized_model_proto())
+        return h.hexdigest()
+
+    if hasattr(tokenizer, "lang"):
+        from sandhi import LANG_RULES, MIX_LANGS, TA_RULES
+
+        lang = tokenizer.lang.lower()
+        rules = TA_RULES if lang in MIX_LANGS else LANG_RULES.get(lang, [])
+        _feed(h, lang, [(r.pattern.pattern, r.repl) for r in rules])
+        # input normalization and the guards change ids of the same line
+        options = tokenizer.encode_options() if hasattr(tokenizer, "encode_options") else {}
+        _feed(h, NORMALIZATION_VERSION if options.get("normalize") else 0,
+              options.get("max_input_chars"), bool(options.get("degraded")))
+        vocab = tokenizer.vocab
+        # the <UNK> SandhiBPETokenizer adds on first use is derived from the rest
+        added = getattr(tokenizer, "added_unk", None)
+        items = sorted((repr(k), repr(v)) for k, v in vocab.items() if k != added)
+    else:
+        vocab = getattr(tokenizer, "token_to_id", None)
+        if vocab is None:
+            raise TypeError(f"Don't know how to fingerprint {type(tokenizer).__name__}")
+        items = sorted((repr(k), repr(v)) for k, v in vocab.items())
+    _feed(h, items, [tuple(m) for m in tokenizer.merges])
+    return h.hexdigest()
+
+
+def cacheable(tokenizer) -> bool:
+    """False when the same line can get different ids (a rule timeout falls back on wall-clock time)."""
+    return not getattr(tokenizer, "rule_timeout", None)
+
+
+def line_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+class EncodeCache:
+    def __init__(self, path: str, tokenizer, max_entries: int = 2_000_000, batch_size: int = 500,
+                 encode_fn: Optional[Callable[[List[str]], List[Sequence[int]]]] = None,
+                 fingerprint: Optional[str] = None):
+        """
+        path: SQLite file (created if missing), may be shared by several tokenizers
+        max_entries: cap on stored encodings over all tokenizers; LRU eviction above it
+        batch_size: keys per SELECT
+        encode_fn: texts -> id lists for misses (default: batching.batch_ids, which
+                   also covers a SentencePiece processor)
+        fingerprint: overrides tokenizer_fingerprint(tokenizer)
+
+        When not cacheable(tokenizer), every call encodes and nothing is stored.
+        """
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.encode_fn = encode_fn or (lambda texts: batch_ids(tokenizer, texts))
+        self.fingerprint = fingerprint or tokenizer_fingerprint(tokenizer)
+        self.enabled = cacheable(tokenizer)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+        row = self.db.execute("SELECT value FROM meta WHERE name = 'clock'").fetchone()
+        self._clock = row[0] if row else 0
+        self._size = self.db.execute("SELECT COUNT(*) FROM encodings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, keys: List[bytes], column: str) -> dict:
+        found = {}
+        for start in range(0, len(keys), self.batch_size):
+            part = keys[start:start + self.batch_size]
+            marks = ",".join("?" * len(part))
+            found.update(self.db.execute(
+                f"SELECT key, {column} FROM encodings WHERE fp = ? AND key IN ({marks})",
+                [self.fingerprint, *part]))
+        return found
+
+    def _resolve(self, texts: Sequence[str], column: str) -> List:
+        """`column` value (ids blob or n) for every text, encoding and storing misses."""
+        if not self.enabled:
+            self.misses += len(texts)
+            return [array('I', ids).tobytes() if column == "ids" else len(ids)
+                    for ids in self.encode_fn(list(texts))]
+        keys = [line_key(t) for t in texts]
+        unique = list(dict.fromkeys(keys))
+        found = self._lookup(unique, column)
+        self._clock += 1
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.hits += len(unique) - len(missing)
+        self.misses += len(missing)
+        with self.db:
+            self.db.executemany("UPDATE encodings SET used = ? WHERE fp = ? AND key = ?",
+                                [(self._clock, self.fingerprint, k) for k in found])
+            if missing:
+                rows = []
+                for key, ids in zip(missing, self.encode_fn(list(missing.values()))):
+                    blob = array('I', ids).tobytes()
+                    rows.append((self.fingerprint, key, len(ids), blob, self._clock))
+                    found[key] = blob if column == "ids" else len(ids)
+                self.db.executemany("INSERT OR REPLACE INTO encodings VALUES (?, ?, ?, ?, ?)", rows)
+                self._size += len(rows)
+                if self._size > self.max_entries:
+                    self._evict()
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('clock', ?)", (self._clock,))
+        return [found[k] for k in keys]
+
+    def _evict(self):
+        # drop down to 90% of the cap so eviction doesn't run on every batch
+        excess = self._size - int(self.max_entries * 0.9)
+        self.db.execute("DELETE FROM encodings WHERE (fp, key) IN "
+                        "(SELECT fp, key FROM encodings ORDER BY used LIMIT ?)", (excess,))
+        self._size = self.db.execute("SELECT COUNT(*) FROM encodings").fetchone()[0]
+
+    def encode_batch(self, texts: Sequence[str]) -> List[List[int]]:
+        """Id list per text, same as batching.batch_ids(tokenizer, texts)."""
+        out = []
+        for blob in self._resolve(texts, "ids"):
+            ids = array('I')
+            ids.frombytes(blob)
+            out.append(ids.tolist())
+        return out
+
+    def count_tokens_batch(self, texts: Sequence[str]) -> List[int]:
+        """Number of ids per text; hits only read the stored length."""
+        return self._resolve(texts, "n")
+
+    def count_tokens(self, text: str) -> int:
+        return self.count_tokens_batch([text])[0]
+
+    def cache_info(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": self._size,
+                "max_entries": self.max_entries}
+
+    def clear(self):
+        """Drop this tokenizer's entries (other fingerprints are kept)."""
+        with self.db:
+            self.db.execute("DELETE FROM encodings WHERE fp = ?", (self.fingerprint,))
+        self._size = self.db.execute("SELECT COUNT(*) FROM encodings").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
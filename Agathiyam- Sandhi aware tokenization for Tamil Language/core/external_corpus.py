@@ -0,0 +1,230 @@
+# external_corpus.py
+"""
+External-memory training corpus for corpora larger than RAM.
+
+Chunks are spilled to on-disk shards (FlatCorpus buffers saved as .npy), and
+each shard keeps its partial pair counts in a key-sorted file next to it.
+The global best pairs are found with a blocked k-way merge over those sorted
+count files, so neither the corpus nor the global pair Counter is ever held
+in memory. After a merge only the shards whose count file contains the chosen
+pair are loaded, merged and recounted.
+
+Every applied merge is journalled before shards are rewritten; re-applying a
+merge to a shard that already has it is a no-op, so `replay` brings vocab and
+merges back in line with the shards after resuming from an older checkpoint.
+"""
+import json
+import os
+from array import array
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+from flat_corpus import FlatCorpus, ranked_pairs
+
+# Rough peak bytes per symbol of a loaded shard (int32 data, offsets, merge
+# scratch); counting temporaries are bounded per block (flat_corpus.BLOCK_SYMBOLS).
+# Used to size shards from the ceiling.
+BYTES_PER_SYMBOL = 16
+# Shard index goes in the high bits of the global first-occurrence position
+_SHARD_SHIFT = 40
+
+
+class ShardedCorpus:
+    def __init__(self, workdir: str, memory_limit_mb: int = 1024):
+        """
+        workdir: local directory for shard and count files
+        memory_limit_mb: ceiling used to size shards and merge blocks
+        """
+        self.workdir = workdir
+        self.memory_limit_mb = memory_limit_mb
+        self.shards = []  # [{"symbols": int, "chunks": int}]
+        os.makedirs(workdir, exist_ok=True)
+
+    @property
+    def shard_symbols(self) -> int:
+        return max(1 << 12, self.memory_limit_mb * (1 << 20) // BYTES_PER_SYMBOL)
+
+    # ---------------- construction ----------------
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Iterable[int]], workdir: str,
+                    memory_limit_mb: int = 1024, weights: Iterable[int] = None) -> "ShardedCorpus":
+        """Stream chunks (and optional per-chunk weights) into shards of bounded size."""
+        corpus = cls(workdir, memory_limit_mb)
+        for name in os.listdir(workdir):  # fresh corpus: drop old shards and journal
+            if name.startswith("shard_") or name == "merges.journal.jsonl":
+                os.remove(os.path.join(workdir, name))
+        limit = corpus.shard_symbols
+        weights = iter(weights) if weights is not None else None
+        data, offsets, w = array('i'), array('q', [0]), array('q')
+        for chunk in chunks:
+            data.extend(chunk)
+            offsets.append(len(data))
+            if weights is not None:
+                w.append(next(weights))
+            if len(data) >= limit:
+                corpus._append_shard(data, offsets, w if weights is not None else None)
+                data, offsets, w = array('i'), array('q', [0]), array('q')
+        if len(offsets) > 1:
+            corpus._append_shard(data, offsets, w if weights is not None else None)
+        return corpus
+
+    def _append_shard(self, data, offsets, weights):
+        flat = FlatCorpus(np.frombuffer(data, dtype=np.int32) if len(data) else np.zeros(0, np.int32),
+                          np.frombuffer(offsets, dtype=np.int64),
+                          None if weights is None else np.frombuffer(weights, dtype=np.int64))
+        self.shards.append({"symbols": 0, "chunks": len(flat)})
+        self._save_shard(len(self.shards) - 1, flat)
+
+    # ---------------- shard files ----------------
+    def _path(self, k, part):
+        return os.path.join(self.workdir, f"shard_{k:05d}.{part}.npy")
+
+    def _save(self, k, part, arr):
+        tmp = self._path(k, part) + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, self._path(k, part))
+
+    def _save_shard(self, k, flat: FlatCorpus):
+        flat.compact()
+        self._save(k, "data", flat.data)
+        self._save(k, "offsets", flat.offsets)
+        if flat.weights is not None:
+            self._save(k, "weights", flat.weights)
+        keys, counts, first = flat.pair_table()
+        self._save(k, "keys", keys)
+        self._save(k, "stats", np.stack([counts, first], axis=1) if len(keys) else np.zeros((0, 2), np.int64))
+        self.shards[k]["symbols"] = flat.num_symbols
+
+    def load_shard(self, k) -> FlatCorpus:
+        weights = np.load(self._path(k, "weights")) if os.path.exists(self._path(k, "weights")) else None
+        return FlatCorpus(np.load(self._path(k, "data")), np.load(self._path(k, "offsets")), weights)
+
+    def __len__(self):
+        return sum(s["chunks"] for s in self.shards)
+
+    @property
+    def num_symbols(self) -> int:
+        return sum(s["symbols"] for s in self.shards)
+
+    def iter_shards(self):
+        for k in range(len(self.shards)):
+            yield self.load_shard(k)
+
+    def to_chunks(self):
+        out = []
+        for flat in self.iter_shards():
+            out.extend(flat.to_chunks())
+        return out
+
+    # ---------------- k-way merge of partial counts ----------------
+    def pair_stats(self, limit=None) -> Dict[Tuple[int, int], int]:
+        """
+        Top pairs over all shards, ordered like FlatCorpus.pair_stats (count
+        desc, then first occurrence in shard order). Count files are merged
+        block by block from memory-mapped sorted runs.
+        """
+        limit = limit or 1
+        keys = [np.load(self._path(k, "keys"), mmap_mode="r") for k in range(len(self.shards))]
+        stats = [np.load(self._path(k, "stats"), mmap_mode="r") for k in range(len(self.shards))]
+        block = max(1 << 10, self.memory_limit_mb * (1 << 20) // (64 * max(1, len(keys))))
+        cursors = [0] * len(keys)
+
+        best_k = np.zeros(0, np.int64)
+        best_c = np.zeros(0, np.int64)
+        best_f = np.zeros(0, np.int64)
+        while True:
+            active = [s for s in range(len(keys)) if cursors[s] < len(keys[s])]
+            if not active:
+                break
+            # everything <= bound is complete in this step for every shard
+            bound = min(int(keys[s][min(cursors[s] + block, len(keys[s])) - 1]) for s in active)
+            part_k, part_c, part_f = [], [], []
+            for s in active:
+                c = cursors[s]
+                window = np.asarray(keys[s][c:c + block])
+                end = int(np.searchsorted(window, bound, side="right"))
+                if not end:
+                    continue
+                st = np.asarray(stats[s][c:c + end])
+                part_k.append(window[:end])
+                part_c.append(st[:, 0])
+                part_f.append(st[:, 1] + (s << _SHARD_SHIFT))
+                cursors[s] = c + end
+            k_all = np.concatenate(part_k)
+            order = np.argsort(k_all, kind="stable")
+            k_all = k_all[order]
+            c_all = np.concatenate(part_c)[order]
+            f_all = np.concatenate(part_f)[order]
+            starts = np.flatnonzero(np.r_[True, k_all[1:] != k_all[:-1]])
+            uk = k_all[starts]
+            uc = np.add.reduceat(c_all, starts)
+            uf = np.minimum.reduceat(f_all, starts)
+
+            # keep only the running top `limit`
+            best_k = np.concatenate([best_k, uk])
+            best_c = np.concatenate([best_c, uc])
+            best_f = np.concatenate([best_f, uf])
+            if len(best_k) > limit:
+                top = np.lexsort((best_f, -best_c))[:limit]
+                best_k, best_c, best_f = best_k[top], best_c[top], best_f[top]
+        return ranked_pairs(best_k, best_c, best_f, limit)
+
+    # ---------------- merging ----------------
+    def _journal_path(self):
+        return os.path.join(self.workdir, "merges.journal.jsonl")
+
+    def merge_pairs(self, pair_to_idx: Dict[Tuple[int, int], int]) -> int:
+        """Apply the merges to the shards that contain any of the pairs; returns chunks touched."""
+        with open(self._journal_path(), "a", encoding="utf-8") as f:
+            f.write(json.dumps([[a, b, idx] for (a, b), idx in pair_to_idx.items()]) + "\n")
+        wanted = np.array(sorted((a << 32) | b for a, b in pair_to_idx), dtype=np.int64)
+        touched = 0
+        for k in range(len(self.shards)):
+            keys = np.load(self._path(k, "keys"), mmap_mode="r")
+            if not len(keys):
+                continue
+            pos = np.searchsorted(keys, wanted)
+            hit = (pos < len(keys)) & (np.asarray(keys[np.minimum(pos, len(keys) - 1)]) == wanted)
+            if not hit.any():
+                continue
+            flat = self.load_shard(k)
+            touched += flat.merge_pairs(pair_to_idx)
+            self._save_shard(k, flat)
+        return touched
+
+    def replay(self, vocab, merges, start_iter):
+        """
+        Re-apply journalled merges past `start_iter` (e.g. after resuming from
+        a checkpoint older than the shards). Returns the new iteration count.
+        """
+        if not os.path.exists(self._journal_path()):
+            return start_iter
+        with open(self._journal_path(), "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        done = 0
+        for entry in entries:
+            if done + len(entry) <= start_iter:
+                done += len(entry)
+                continue
+            pair_to_idx = {(a, b): idx for a, b, idx in entry}
+            for (a, b), idx in pair_to_idx.items():
+                merges[(a, b)] = idx
+                vocab[idx] = vocab[a] + vocab[b]
+            self._apply_without_journal(pair_to_idx)
+            done += len(entry)
+        return max(done, start_iter)
+
+    def _apply_without_journal(self, pair_to_idx):
+        for k in range(len(self.shards)):
+            flat = self.load_shard(k)
+            if flat.merge_pairs(pair_to_idx):
+                self._save_shard(k, flat)
+
+    def __getstate__(self):
+        return {"workdir": self.workdir, "memory_limit_mb": self.memory_limit_mb,
+                "shards": self.shards}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
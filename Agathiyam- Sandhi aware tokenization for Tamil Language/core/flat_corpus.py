@@ -0,0 +1,218 @@
+# flat_corpus.py
+"""
+Flat, array-backed training corpus.
+
+All chunks live in one contiguous int32 buffer; `offsets[k]:offsets[k+1]`
+is chunk k, optionally with an int64 weight per chunk (word frequency).
+Pair counting and merging are vectorised with NumPy, merges are written into
+the buffer in place and the buffer is compacted in place, so a symbol costs
+4 bytes instead of a list slot plus a Python int.
+
+Counting, merging and compaction walk the buffer in blocks of BLOCK_SYMBOLS
+symbols: their NumPy temporaries (int64 pair keys, masks, np.unique) are
+bounded by the block, and per-block counts are added into one table of
+distinct pairs, so a merge pass needs little more than the buffer itself.
+"""
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Symbols per block for pair counting, merging and compaction (about 40 MB
+# of temporaries per block).
+BLOCK_SYMBOLS = 1 << 20
+
+
+class FlatCorpus:
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, weights: np.ndarray = None):
+        """
+        data: int32 symbol ids of all chunks back to back
+        offsets: int64 chunk start positions, len(chunks) + 1 entries
+        weights: optional int64 count per chunk (pairs are counted weight times)
+        """
+        self.data = np.ascontiguousarray(data, dtype=np.int32)
+        self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        self.weights = None if weights is None else np.ascontiguousarray(weights, dtype=np.int64)
+        self.size = int(self.offsets[-1]) if len(self.offsets) else 0
+
+    # ---------------- construction ----------------
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Iterable[int]], weights: Iterable[int] = None) -> "FlatCorpus":
+        """Build from any iterable of id sequences (a generator avoids a list-of-lists peak)."""
+        data = array('i')
+        offsets = array('q', [0])
+        for chunk in chunks:
+            data.extend(chunk)
+            offsets.append(len(data))
+        if weights is not None:
+            weights = np.fromiter(weights, dtype=np.int64, count=len(offsets) - 1)
+        return cls(np.frombuffer(data, dtype=np.int32) if len(data) else np.zeros(0, np.int32),
+                   np.frombuffer(offsets, dtype=np.int64), weights)
+
+    def to_chunks(self) -> List[List[int]]:
+        d = self.data[:self.size].tolist()
+        o = self.offsets.tolist()
+        return [d[o[k]:o[k + 1]] for k in range(len(o) - 1)]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def num_symbols(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes
+
+    # ---------------- pair statistics ----------------
+    def _blocks(self, stop, block=None):
+        block = block or BLOCK_SYMBOLS
+        return ((start, min(start + block, stop)) for start in range(0, stop, block))
+
+    def _pair_keys(self, start, stop):
+        """
+        int64 keys (left << 32 | right) and positions of the in-chunk
+        adjacent pairs whose left symbol is in [start, stop).
+        """
+        stop = min(stop, self.size - 1)
+        if stop <= start:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        d = self.data
+        keys = (d[start:stop].astype(np.int64) << 32) | d[start + 1:stop + 1]
+        valid = np.ones(stop - start, dtype=bool)
+        lo, hi = np.searchsorted(self.offsets, [start + 1, stop + 1])
+        valid[self.offsets[lo:hi] - 1 - start] = False  # pair would straddle two chunks
+        pos = np.flatnonzero(valid)
+        return keys[pos], pos + start
+
+    def pair_table(self, block=None):
+        """
+        Sorted unique pair keys with their (weighted) counts and the position of
+        their first occurrence: three int64 arrays. Counted `block` symbols
+        at a time (default BLOCK_SYMBOLS).
+        """
+        uniq = np.zeros(0, np.int64)
+        counts = np.zeros(0, np.int64)
+        first = np.zeros(0, np.int64)
+        for start, stop in self._blocks(self.size - 1, block):
+            keys, pos = self._pair_keys(start, stop)
+            if not len(keys):
+                continue
+            if self.weights is None:
+                b_uniq, b_first, b_counts = np.unique(keys, return_index=True, return_counts=True)
+            else:
+                b_uniq, b_first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+                chunk_of = np.searchsorted(self.offsets, pos, side='right') - 1
+                b_counts = np.bincount(inverse.ravel(), weights=self.weights[chunk_of],
+                                       minlength=len(b_uniq))
+            uniq, counts, first = _add_counts(uniq, counts, first, b_uniq,
+                                              b_counts.astype(np.int64), pos[b_first])
+        return uniq, counts, first
+
+    def pair_stats(self, limit=None) -> Dict[Tuple[int, int], int]:
+        """
+        Adjacent-pair counts as a dict ordered by (count desc, first occurrence),
+        i.e. the same winner and tie-breaking as `max(get_stats(...), key=...)`
+        over the equivalent list-of-lists corpus. `limit` keeps only the top pairs.
+        """
+        uniq, counts, first = self.pair_table()
+        return ranked_pairs(uniq, counts, first, limit)
+
+    # ---------------- merging ----------------
+    def merge_pairs(self, pair_to_idx: Dict[Tuple[int, int], int]) -> int:
+        """
+        Replace every occurrence of each pair with its new id, left to right,
+        then compact the buffer in place. Pairs must share no symbol (as picked
+        by `select_merge_batch`). Returns the number of chunks touched.
+        """
+        wanted = {(a << 32) | b: (a, b) for a, b in pair_to_idx}
+        wanted_keys = np.fromiter(wanted, dtype=np.int64, count=len(wanted))
+        found = {pair: [] for pair in pair_to_idx}
+        # find every occurrence before writing: a write changes the next pair's key
+        for start, stop in self._blocks(self.size - 1):
+            keys, pos = self._pair_keys(start, stop)
+            hit = np.isin(keys, wanted_keys)
+            if not hit.any():
+                continue
+            keys, pos = keys[hit], pos[hit]
+            for key, pair in wanted.items():
+                found[pair].append(pos[keys == key])
+        d = self.data
+        removed = []
+        for (a, b), idx in pair_to_idx.items():
+            if not found[(a, b)]:
+                continue
+            pos = np.concatenate(found[(a, b)])
+            if a == b:
+                # runs like a a a merge greedily from the left: keep p, p+2, ...
+                kept = []
+                last = -2
+                for p in pos.tolist():
+                    if p != last + 1:
+                        kept.append(p)
+                        last = p
+                    else:
+                        last = -2
+                pos = np.asarray(kept, dtype=np.int64)
+            d[pos] = idx
+            removed.append(pos + 1)
+        if not removed:
+            return 0
+        removed = np.sort(np.concatenate(removed))
+
+        # compact block by block; the write position never passes the read block
+        write = 0
+        for start, stop in self._blocks(self.size):
+            lo, hi = np.searchsorted(removed, [start, stop])
+            keep = np.ones(stop - start, dtype=bool)
+            keep[removed[lo:hi] - start] = False
+            kept = d[start:stop][keep]
+            d[write:write + len(kept)] = kept
+            write += len(kept)
+        new_size = write
+        touched = np.unique(np.searchsorted(self.offsets, removed, side='right') - 1)
+        self.offsets -= np.searchsorted(removed, self.offsets, side='left')
+        self.size = new_size
+        return int(len(touched))
+
+    def compact(self):
+        """Release the unused tail of the buffer (e.g. before checkpointing)."""
+        if len(self.data) != self.size:
+            self.data = self.data[:self.size].copy()
+
+    def __getstate__(self):
+        return {"data": self.data[:self.size].copy(), "offsets": self.offsets,
+                "weights": self.weights}
+
+    def __setstate__(self, state):
+        self.__init__(state["data"], state["offsets"], state.get("weights"))
+
+
+def _add_counts(keys, counts, first, b_keys, b_counts, b_first):
+    """Add the sorted unique (b_keys, b_counts, b_first) of a later block into a pair table."""
+    if not len(keys):
+        return b_keys, b_counts, b_first
+    at = np.searchsorted(keys, b_keys)
+    known = at < len(keys)
+    known[known] = keys[at[known]] == b_keys[known]
+    counts[at[known]] += b_counts[known]   # keys are unique; the first occurrence is earlier
+    new = ~known
+    if not new.any():
+        return keys, counts, first
+    at = at[new]
+    return (np.insert(keys, at, b_keys[new]), np.insert(counts, at, b_counts[new]),
+            np.insert(first, at, b_first[new]))
+
+
+def ranked_pairs(keys, counts, first, limit=None) -> Dict[Tuple[int, int], int]:
+    """{(left, right): count} ordered by count desc, then first occurrence."""
+    if not len(keys):
+        return {}
+    order = np.lexsort((first, -counts))
+    if limit is not None:
+        order = order[:limit]
+    keys, counts = keys[order], counts[order]
+    lefts = (keys >> 32).tolist()
+    rights = (keys & 0xFFFFFFFF).tolist()
+    return {(a, b): c for a, b, c in zip(lefts, rights, counts.tolist())}
@@ -0,0 +1,288 @@
+# frozen_tables.py
+"""
+Sandhi-GPE lookup tables as one read-only, memory-mapped file.
+
+Unpickled vocab / vocab_re / merges dicts are millions of small objects; in
+forked workers every refcount update and GC pass writes to their pages, so
+each worker ends up with a private copy. write_frozen() lays the three tables
+out as flat open-addressing hash tables in one file, and FrozenTables mmaps it:
+lookups read the shared page cache and create no long-lived objects, so each
+extra worker adds little more than its own interpreter.
+
+    write_frozen("models/merges.pkl.frozen", vocab, merges)
+    tok = load_frozen_tokenizer("models/merges.pkl.frozen", lang="ta")   # GPE_sandhi
+    # or just: load_tokenizer(vocab_path, merges_path, lang, frozen=True)
+
+The maps are read-only Mapping objects; the one write the tokenizer does
+(adding <UNK> on first use) goes to a small per-process overlay. Pickling a
+map reopens the file by path, so pool initializers can be passed the maps as
+they are. Lookups cost a few hundred ns instead of a dict's ~50 ns; the
+per-run encode cache hides most of that on real text.
+
+File layout: 8-byte magic, section count, then (offset, length) per section,
+every section an int64 array except the UTF-8 token blob.
+"""
+import gc
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from zlib import crc32
+
+MAGIC = b"AGFT0001"
+_EMPTY = -1
+# section order in the file
+_SECTIONS = ("blob", "token_offsets", "token_ids", "token_slots", "id_entries",
+             "pair_keys", "pair_values")
+
+
+def _table_size(n: int) -> int:
+    """Power of two with load factor <= 0.5."""
+    size = 8
+    while size < 2 * n:
+        size *= 2
+    return size
+
+
+def _pair_slot(a: int, b: int, mask: int) -> int:
+    return ((a * 0x9E3779B1) ^ (b * 0x85EBCA77)) & mask
+
+
+def write_frozen(path: str, vocab, merges):
+    """
+    Write vocab (id -> token) and merges ((id, id) -> id) to `path` in the
+    layout FrozenTables reads. Written to a temporary file and renamed, so
+    readers never see a partial table.
+    """
+    from array import array
+
+    if any(not isinstance(k, int) for k in vocab):
+        raise ValueError("vocab must map id -> token (got non-integer keys)")
+    entries = sorted(vocab.items())
+    blob = bytearray()
+    token_offsets = array('q', [0])
+    token_ids = array('q')
+    for idx, token in entries:
+        blob += token.encode("utf-8", "surrogatepass")
+        token_offsets.append(len(blob))
+        token_ids.append(idx)
+
+    token_slots = array('q', [_EMPTY]) * _table_size(len(entries))
+    mask = len(token_slots) - 1
+    for e in range(len(entries)):
+        i = crc32(blob[token_offsets[e]:token_offsets[e + 1]]) & mask
+        while token_slots[i] != _EMPTY:
+            i = (i + 1) & mask
+        token_slots[i] = e
+
+    max_id = entries[-1][0] if entries else -1
+    id_entries = array('q', [_EMPTY]) * (max_id + 1)
+    for e, (idx, _) in enumerate(entries):
+        id_entries[idx] = e
+
+    pair_keys = array('q', [_EMPTY]) * _table_size(len(merges))
+    pair_values = array('q', [0]) * len(pair_keys)
+    mask = len(pair_keys) - 1
+    for (a, b), idx in merges.items():
+        i = _pair_slot(a, b, mask)
+        while pair_keys[i] != _EMPTY:
+            i = (i + 1) & mask
+        pair_keys[i] = (a << 32) | b
+        pair_values[i] = idx
+
+    sections = [bytes(blob)] + [s.tobytes() for s in
+                                (token_offsets, token_ids, token_slots, id_entries,
+                                 pair_keys, pair_values)]
+    header_len = len(MAGIC) + 8 + 16 * len(sections)
+    offset = header_len
+    table = []
+    for data in sections:
+        offset += -offset % 8
+        table.append((offset, len(data)))
+        offset += len(data)
+
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<q", len(sections)))
+        for off, length in table:
+            f.write(struct.pack("<qq", off, length))
+        for (off, _), data in zip(table, sections):
+            f.write(b"\0" * (off - f.tell()))
+            f.write(data)
+    os.replace(tmp, path)
+
+
+class FrozenTables:
+    """The three maps of a file written by write_frozen, sharing one mmap."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        if bytes(view[:8]) != MAGIC:
+            raise ValueError(f"{path} is not a frozen tokenizer table")
+        (count,) = struct.unpack_from("<q", self._mm, 8)
+        parts = {}
+        for name, k in zip(_SECTIONS, range(count)):
+            off, length = struct.unpack_from("<qq", self._mm, 16 + 16 * k)
+            section = view[off:off + length]
+            parts[name] = section if name == "blob" else section.cast("q")
+        self.vocab = FrozenIdTokens(path, parts)
+        self.vocab_re = FrozenTokenIds(path, parts)
+        self.merges = FrozenPairs(path, parts)
+
+
+def _reopen(path: str, attr: str):
+    return getattr(FrozenTables(path), attr)
+
+
+class _FrozenMap(Mapping):
+    _attr = None
+
+    def __init__(self, path, parts):
+        self._path = path
+        self._parts = parts
+        self._blob = parts["blob"]
+        self._offsets = parts["token_offsets"]
+        self._ids = parts["token_ids"]
+        self._extra = {}     # per-process additions, e.g. a lazily added <UNK>
+
+    def __setitem__(self, key, value):
+        self._extra[key] = value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __reduce__(self):
+        # workers reopen the same file instead of receiving a copy
+        return _reopen, (self._path, self._attr)
+
+    def _token(self, e):
+        return bytes(self._blob[self._offsets[e]:self._offsets[e + 1]]).decode("utf-8", "surrogatepass")
+
+
+_MISSING = object()
+
+
+class FrozenIdTokens(_FrozenMap):
+    """id -> token."""
+    _attr = "vocab"
+
+    def __init__(self, path, parts):
+        super().__init__(path, parts)
+        self._entries = parts["id_entries"]
+
+    def get(self, key, default=None):
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        if not isinstance(key, int) or not 0 <= key < len(self._entries):
+            return default
+        e = self._entries[key]
+        return default if e == _EMPTY else self._token(e)
+
+    def inverse(self):
+        """The token -> id map of the same file (with this map's additions)."""
+        inverse = FrozenTokenIds(self._path, self._parts)
+        inverse._extra = {token: idx for idx, token in self._extra.items()}
+        return inverse
+
+    def __iter__(self):
+        yield from self._ids
+        yield from self._extra
+
+    def __len__(self):
+        return len(self._ids) + len(self._extra)
+
+
+class FrozenTokenIds(_FrozenMap):
+    """token -> id."""
+    _attr = "vocab_re"
+
+    def __init__(self, path, parts):
+        super().__init__(path, parts)
+        self._slots = parts["token_slots"]
+        self._mask = len(self._slots) - 1
+
+    def get(self, key, default=None):
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        try:
+            kb = key.encode("utf-8", "surrogatepass")
+        except AttributeError:
+            return default
+        slots, offsets, blob, mask = self._slots, self._offsets, self._blob, self._mask
+        i = crc32(kb) & mask
+        while True:
+            e = slots[i]
+            if e == _EMPTY:
+                return default
+            if blob[offsets[e]:offsets[e + 1]] == kb:
+                return self._ids[e]
+            i = (i + 1) & mask
+
+    def __iter__(self):
+        for e in range(len(self._ids)):
+            yield self._token(e)
+        yield from self._extra
+
+    def __len__(self):
+        return len(self._ids) + len(self._extra)
+
+
+class FrozenPairs(_FrozenMap):
+    """(id, id) -> merged id."""
+    _attr = "merges"
+
+    def __init__(self, path, parts):
+        super().__init__(path, parts)
+        self._keys = parts["pair_keys"]
+        self._values = parts["pair_values"]
+        self._mask = len(self._keys) - 1
+        self._len = sum(1 for k in self._keys if k != _EMPTY)
+
+    def get(self, key, default=None):
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        try:
+            a, b = key
+            packed = (a << 32) | b
+        except (TypeError, ValueError):
+            return default
+        keys, mask = self._keys, self._mask
+        i = _pair_slot(a, b, mask)
+        while True:
+            k = keys[i]
+            if k == packed:
+                return self._values[i]
+            if k == _EMPTY:
+                return default
+            i = (i + 1) & mask
+
+    def __iter__(self):
+        for k in self._keys:
+            if k != _EMPTY:
+                yield (k >> 32, k & 0xFFFFFFFF)
+        yield from self._extra
+
+    def __len__(self):
+        return self._len + len(self._extra)
+
+
+def freeze_gc():
+    """
+    Collect, then move every object alive now to the GC's permanent
+    generation (gc.freeze): call in the parent right before forking workers
+    so collections in the children don't touch the inherited objects' pages.
+    The freeze is process-wide and permanent, so only entry points call it:
+    tokenize_cli before forking its pool and measure_worker_memory.py
+    (tokenize_service spawns its workers instead).
+    """
+    gc.collect()
+    gc.freeze()
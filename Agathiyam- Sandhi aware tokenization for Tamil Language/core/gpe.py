@@ -1,39 +1,194 @@
+import argparse
+import os
 import pickle
+import re
 from collections import Counter
-import grapheme  # make sure you have installed it via pip
+from itertools import accumulate, islice
+from multiprocessing import Pool
+from typing import Dict, Iterable, List, Tuple
+
+from batching import encode_padded, encode_result
+from bpe import apply_ranked_merges, learn_merges, merge_ranks
+from profiling import profiled, stage
+from tamil_graphemes import graphemes
+
+# Merges never cross a whitespace/non-whitespace boundary; no sandhi
+# splitting, so GPE stays a plain grapheme-pair baseline.
+CHUNK_RE = re.compile(r"\S+|\s+")
+
 
 class GPETokenizer:
     def __init__(self, vocab, merges=None):
+        """
+        vocab: mapping token -> id (graphemes and merged tokens)
+        merges: ordered list of grapheme-pair merges, e.g. [('க', 'ள்'), ('கள்', 'ை'), ...]
+        """
         self.vocab = vocab
-        self.merges = merges if merges else {}
-        self.token_to_id = {tok: idx for idx, tok in enumerate(vocab.keys())}
+        self.merges = list(merges) if merges else []
+        self.token_to_id = dict(vocab)
         self.id_to_token = {idx: tok for tok, idx in self.token_to_id.items()}
+        self.unk_id = self.token_to_id.get("<UNK>", 0)
+        self.merge_ranks, self._repeat_ranks = merge_ranks(self.merges)
+
+    def _apply_merges(self, pieces: List[str]) -> List[str]:
+        if not self.merges:
+            return pieces
+        return apply_ranked_merges(pieces, self.merges, self.merge_ranks, self._repeat_ranks)
+
+    @profiled("gpe.encode")
+    def encode(self, text, return_tokens=True, out="list", return_offsets=False):
+        """
+        (tokens, ids), or ids with return_tokens=False; return_offsets=True
+        adds (starts, ends) in `text` per id (the tokens spell `text` out, so
+        these are running sums of their lengths).
+        """
+        with stage("gpe.graphemes"):
+            pieces = [graphemes(chunk) for chunk in CHUNK_RE.findall(text)]  # <--- correct grapheme splitting
+        with stage("gpe.merge"):
+            tokens = [tok for chunk in pieces for tok in self._apply_merges(chunk)]
+        with stage("gpe.lookup"):
+            ids = [self.token_to_id.get(tok, self.unk_id) for tok in tokens]
+        offsets = None
+        if return_offsets:
+            with stage("gpe.offsets"):
+                ends = list(accumulate(map(len, tokens)))
+                offsets = [0, *ends][:-1], ends
+        return encode_result(tokens, ids, return_tokens, out, offsets)
+
+    @profiled("gpe.count_tokens")
+    def count_tokens(self, text):
+        """len(encode(text)[1]) without building the token and id lists."""
+        return sum(len(self._apply_merges(graphemes(chunk))) for chunk in CHUNK_RE.findall(text))
 
-    def encode(self, text):
-        tokens = list(grapheme.graphemes(text))  # <--- correct grapheme splitting
-        ids = [self.token_to_id.get(tok, 0) for tok in tokens]
-        return tokens, ids
+    @profiled("gpe.count_tokens")
+    def count_tokens_batch(self, texts):
+        """count_tokens for many texts; each distinct chunk is merged once."""
+        lengths = {}
+        counts = []
+        for text in texts:
+            n = 0
+            for chunk in CHUNK_RE.findall(text):
+                if chunk not in lengths:
+                    lengths[chunk] = len(self._apply_merges(graphemes(chunk)))
+                n += lengths[chunk]
+            counts.append(n)
+        return counts
 
+    def encode_padded(self, texts, max_length=None, pad_id=0, pad_to_multiple_of=None):
+        """Padded int32 id matrix and attention mask for `texts` (see batching.pad_batch)."""
+        return encode_padded(self, texts, max_length, pad_id, pad_to_multiple_of)
+
+    @profiled("gpe.decode")
     def decode(self, ids):
         tokens = [self.id_to_token.get(i, "<UNK>") for i in ids]
         return ''.join(tokens)
 
 
 # ---------------- TRAINER ----------------
-def train_gpe(corpus):
+def _count_chunks(lines) -> Counter:
+    counter = Counter()
+    for line in lines:
+        counter.update(CHUNK_RE.findall(line.rstrip("\r\n")))
+    return counter
+
+
+def _segment_chunks(chunks) -> List[Tuple[str, ...]]:
+    return [tuple(graphemes(chunk)) for chunk in chunks]
+
+
+def _batches(iterable, size):
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def count_graphemes(corpus: Iterable[str], workers: int = 1, batch_lines: int = 20000):
     """
-    corpus: list of strings
-    Returns vocab and merges (empty for now)
+    Stream `corpus` (a list or an open file) in batches of lines. Each batch is
+    counted into its own chunk Counter (in a worker process when workers > 1)
+    and merged in corpus order, then every distinct chunk is segmented into
+    graphemes once, also in parallel.
+    Returns (grapheme Counter, word table: grapheme tuple -> frequency), both
+    in first-seen order.
     """
-    # Use grapheme-aware tokenization
-    vocab_counter = Counter()
-    for line in corpus:
-        tokens = list(grapheme.graphemes(line))
-        for t in tokens:
-            vocab_counter[t] += 1
-
-    vocab = {tok: idx for idx, tok in enumerate(vocab_counter.keys())}
-    merges = {}  # can implement merges later if desired
+    chunk_counter = Counter()
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        mapper = pool.imap if pool else map
+        for counter in mapper(_count_chunks, _batches(corpus, batch_lines)):
+            chunk_counter.update(counter)
+
+        # Use grapheme-aware tokenization
+        vocab_counter = Counter()
+        word_counts = Counter()
+        freqs = iter(chunk_counter.values())
+        for segmented in mapper(_segment_chunks, _batches(chunk_counter, batch_lines)):
+            for tokens in segmented:
+                freq = next(freqs)
+                word_counts[tokens] += freq
+                for t in tokens:
+                    vocab_counter[t] += freq
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return vocab_counter, word_counts
+
+
+def _split_at_rare(word_counts: Counter, keep) -> Counter:
+    """Rare graphemes act as barriers: words are split around them for merge learning."""
+    out = Counter()
+    for tokens, freq in word_counts.items():
+        part = []
+        for t in tokens + (None,):
+            if t is not None and t in keep:
+                part.append(t)
+                continue
+            if part:
+                out[tuple(part)] += freq
+                part = []
+    return out
+
+
+def train_gpe(corpus, num_merges=0, workers=1, min_frequency=1, order="first_seen",
+              batch_lines=20000):
+    """
+    corpus: list of strings or any line iterator (e.g. an open file)
+    num_merges: grapheme-pair merges to learn (0 = grapheme unigrams only)
+    workers: processes used for grapheme counting (see count_graphemes)
+    min_frequency: graphemes seen fewer times are left out of the vocab and
+        encode to '<UNK>' (reserved as id 0 when anything is cut)
+    order: "first_seen" or "frequency" (count desc, ties by first occurrence)
+        for grapheme ids
+    Returns vocab (token -> id) and the ordered merges list.
+
+    Lines are split into whitespace / non-whitespace chunks and each distinct
+    chunk is segmented into grapheme clusters once. Merged tokens get ids
+    after the graphemes, in merge order. Merges are learned on the chunk
+    table weighted by frequency (bpe.learn_merges).
+    """
+    if order not in ("first_seen", "frequency"):
+        raise ValueError(f"Unknown grapheme id order: {order!r}")
+    vocab_counter, word_counts = count_graphemes(corpus, workers, batch_lines)
+
+    base_tokens = [t for t, c in vocab_counter.items() if c >= min_frequency]
+    if order == "frequency":
+        base_tokens.sort(key=lambda t: -vocab_counter[t])  # stable: ties keep first-seen order
+    vocab = {}
+    if len(base_tokens) < len(vocab_counter):
+        vocab["<UNK>"] = 0
+        word_counts = _split_at_rare(word_counts, set(base_tokens))
+    for tok in base_tokens:
+        vocab[tok] = len(vocab)
+
+    merges: List[Tuple[str, str]] = []
+    if num_merges:
+        _, merges = learn_merges(word_counts, num_merges)
+        for left, right in merges:
+            vocab.setdefault(left + right, len(vocab))
     return vocab, merges
 
 
@@ -50,18 +205,23 @@ def load_gpe(vocab_file="vocab_gpe.pkl", merges_file="merges_gpe.pkl"):
         token_to_id = pickle.load(f)
     with open(merges_file, "rb") as f:
         merges = pickle.load(f)
-    id_to_token = {idx: tok for tok, idx in token_to_id.items()}
-    return GPETokenizer(id_to_token, merges)
+    return GPETokenizer(token_to_id, merges)
 
 
 # ---------------- MAIN ----------------
 if __name__ == "__main__":
-    # Load corpus from a local file
-    with open(r"C:\Users\HP\Documents\vs code\tokenizers-coling2025-main\GPE\samanantar_eng_90_percent_cleaned1.txt",
-              "r", encoding="utf-8") as f:
-        corpus = [line.strip() for line in f if line.strip()][:500]  # limit to 500 lines for testing
+    ap = argparse.ArgumentParser(description="Train a GPE tokenizer")
+    ap.add_argument("--path", default=r"C:\Users\HP\Documents\vs code\tokenizers-coling2025-main\GPE\samanantar_eng_90_percent_cleaned1.txt")
+    ap.add_argument("--num-merges", type=int, default=2000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--min-frequency", type=int, default=1)
+    ap.add_argument("--order", choices=["first_seen", "frequency"], default="frequency")
+    args = ap.parse_args()
 
-    vocab, merges = train_gpe(corpus)
+    # Stream the corpus from a local file
+    with open(args.path, "r", encoding="utf-8") as f:
+        vocab, merges = train_gpe(f, num_merges=args.num_merges, workers=args.workers,
+                                  min_frequency=args.min_frequency, order=args.order)
     tokenizer = GPETokenizer(vocab, merges)
 
     save_gpe(tokenizer)
@@ -0,0 +1,84 @@
+# normalize.py
+"""
+Canonical form of Tamil text, applied before grapheme lookup in training
+(build_initial_vocab, iter_chunk_ids) and in SandhiBPETokenizer.encode.
+
+Without it the same written syllable can reach the vocab as several
+different clusters:
+
+    கொ  = க + U+0BCA                     (precomposed o sign)
+        = க + U+0BC6 + U+0BBE            (e sign + aa sign, canonically equal)
+        = க + U+0BC6 + ZWJ + U+0BBE      (joiner pasted in by an input method)
+    க + U+FE0F                           (stray emoji variation selector)
+
+normalize() is NFC followed by Tamil folding: ZWJ / ZWNJ and variation
+selectors (U+FE00-U+FE0F) right after a Tamil character are dropped (they
+never change how Tamil is read; after other characters, e.g. inside emoji
+sequences, they are kept). Folding runs first, so a sign pair split by a
+joiner still composes.
+
+Most text is already normalized: normalize() checks that first (an ASCII
+test, then unicodedata.is_normalized and one regex search) and returns the
+input object itself, so the cost on clean text is a scan without copies.
+normalize_with_offsets() also maps positions back to the input, for
+callers that report offsets into the caller's text.
+
+NORMALIZATION_VERSION changes whenever the output of normalize() can;
+encode_cache.tokenizer_fingerprint includes it.
+"""
+import regex as re
+import unicodedata
+from typing import List, Optional, Tuple
+
+from profiling import profiled
+
+NORMALIZATION_VERSION = 1
+
+TAMIL_BLOCK = "\u0B80-\u0BFF"
+# joiners and variation selectors directly after a Tamil character
+_FOLD_RE = re.compile(f"(?<=[{TAMIL_BLOCK}])[\u200C\u200D\uFE00-\uFE0F]+")
+# extended grapheme clusters: neither NFC nor folding reaches across them
+_CLUSTER_RE = re.compile(r"\X")
+
+
+def is_normalized(text: str) -> bool:
+    """True when normalize(text) == text (check only, nothing is built)."""
+    if text.isascii():
+        return True
+    return unicodedata.is_normalized("NFC", text) and _FOLD_RE.search(text) is None
+
+
+@profiled("normalize")
+def normalize(text: str) -> str:
+    """NFC plus Tamil folding (see module docstring); `text` itself when already normalized."""
+    if text.isascii():
+        return text
+    if _FOLD_RE.search(text) is not None:
+        text = _FOLD_RE.sub("", text)
+    elif unicodedata.is_normalized("NFC", text):
+        return text
+    return unicodedata.normalize("NFC", text)
+
+
+def normalize_with_offsets(text: str) -> Tuple[str, Optional[List[int]]]:
+    """
+    (normalize(text), offsets): offsets[p] is the position in `text` of
+    position p of the result, for p in 0..len(result); None when the text
+    was already normalized (positions are unchanged). Clusters are
+    normalized one by one; inside a changed cluster positions are aligned
+    from its start, so cluster boundaries map exactly.
+    """
+    normalized = normalize(text)
+    if normalized is text:
+        return text, None
+    parts = []
+    offsets = []
+    pos = 0
+    for cluster in _CLUSTER_RE.findall(text):
+        folded = unicodedata.normalize("NFC", _FOLD_RE.sub("", cluster))
+        parts.append(folded)
+        offsets.extend(range(pos, pos + len(folded)) if len(folded) <= len(cluster)
+                       else [pos + min(i, len(cluster) - 1) for i in range(len(folded))])
+        pos += len(cluster)
+    offsets.append(pos)
+    return "".join(parts), offsets
@@ -7,6 +7,8 @@ import os
 import pandas as pd
 from typing import List, Tuple
 
+from batching import batch_ids
+
 
 def load_text(filepath: str) -> List[str]:
     """Load a text file as a list of whitespace-tokenized words."""
@@ -29,21 +31,28 @@ def compute_oov_word_level(train_file: str, test_file: str) -> Tuple[float, set]
     return coverage, set(oov_tokens)
 
 
-def compute_oov_token_level(test_file: str, tokenizer) -> float:
+def compute_oov_token_level(test_file: str, tokenizer, cache=None) -> float:
     """
     Compute OOV token ratio for subword tokenizers.
     Ratio = % of produced tokens that are <unk>.
-    Assumes tokenizer implements `encode` returning token IDs,
-    and has a defined unk_id.
+    Ids come from batching.batch_ids (SentencePiece or this repo's
+    tokenizers); the tokenizer needs an unk_id (attribute or, as on a
+    SentencePieceProcessor, method).
+    cache: optional EncodeCache for `tokenizer`, ids are read from it.
     """
     with open(test_file, "r", encoding="utf-8") as f:
         test_lines = [line.strip() for line in f if line.strip()]
 
+    if cache is not None:
+        encoded = cache.encode_batch(test_lines)
+    else:
+        encoded = batch_ids(tokenizer, test_lines)
+    unk_id = tokenizer.unk_id() if callable(tokenizer.unk_id) else tokenizer.unk_id
+
     total_tokens, unk_tokens = 0, 0
-    for line in test_lines:
-        ids = tokenizer.encode(line)
+    for ids in encoded:
         total_tokens += len(ids)
-        unk_tokens += sum(1 for i in ids if i == tokenizer.unk_id)
+        unk_tokens += sum(1 for i in ids if i == unk_id)
 
     return unk_tokens / total_tokens if total_tokens > 0 else 0.0
 
@@ -63,15 +72,15 @@ def measure_throughput(tokenizer, text_file: str, repeat: int = 3) -> float:
 
 
 def run_oov_eval(train_file: str, test_file: str, tokenizer, exp_name: str,
-                 matrix_csv: str = "experiment_matrix.csv"):
+                 matrix_csv: str = "experiment_matrix.csv", cache=None):
     # Word-level OOV
     word_coverage, _ = compute_oov_word_level(train_file, test_file)
     word_oov_rate = 1 - word_coverage
 
     # Token-level OOV
-    token_oov_rate = compute_oov_token_level(test_file, tokenizer)
+    token_oov_rate = compute_oov_token_level(test_file, tokenizer, cache)
 
-    # Throughput
+    # Throughput (always encodes, never read from the cache)
     throughput = measure_throughput(tokenizer, test_file)
 
     # Merge with experiment matrix
@@ -133,5 +142,5 @@ if __name__ == "__main__":
     if not hasattr(sp, "unk_id"):
         sp.unk_id = sp.piece_to_id("<unk>")
 
-#training and testing sets
-run_oov_eval("data/samanantar_eng_90_percent_cleaned1.txt", "data/sample.txt", sp, exp_name="V0-Baseline")
+    #training and testing sets
+    run_oov_eval("data/samanantar_eng_90_percent_cleaned1.txt", "data/sample.txt", sp, exp_name="V0-Baseline")
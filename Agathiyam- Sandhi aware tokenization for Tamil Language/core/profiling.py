@@ -0,0 +1,209 @@
+# profiling.py
+"""
+Opt-in stage timers for the tokenization pipeline.
+
+sandhi.py, GPE_sandhi.py, bpe.py and gpe.py wrap their stages (sandhi
+marking, grapheme segmentation, id lookup, merging, decode, ...) in
+stage("name"). While profiling is off, stage() returns a shared no-op
+context manager, so the instrumented code pays one flag check per stage.
+
+Turn it on for a block:
+
+    with profiling.profile() as prof:
+        tok.encode_batch(lines)
+    print(prof.format_report())      # calls, total and self time per stage
+    prof.write_folded("encode.folded")
+
+or for a whole process with AGATHIYAM_PROFILE=1; AGATHIYAM_PROFILE_OUT=prefix
+then writes prefix.txt (report) and prefix.folded at exit. multiprocessing
+workers (Pool, ProcessPoolExecutor) start a fresh Profile and write theirs
+when they exit cleanly (Pool.close()/join() or executor shutdown, not
+terminate()); put "{pid}" in the prefix to give each process its own files.
+
+The .folded file has one "stage;substage;... microseconds" line per stack
+with the self time spent in it, the input format of flamegraph.pl,
+speedscope and inferno. Stacks are per thread.
+"""
+import atexit
+import os
+import threading
+import time
+from multiprocessing import util
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+_NULL = nullcontext()
+_local = threading.local()
+_enabled = False
+_current = None
+
+
+class Profile:
+    """Aggregated stage timings and counters of one profiling session."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = defaultdict(int)
+        self.total_ns = defaultdict(int)
+        self.self_ns = defaultdict(int)
+        self.stacks_ns = defaultdict(int)   # (outer, ..., inner) -> self time
+        self.counters = defaultdict(int)
+
+    def _record(self, path, elapsed, child):
+        name = path[-1]
+        with self._lock:
+            self.calls[name] += 1
+            if name not in path[:-1]:       # recursion: count the outermost only
+                self.total_ns[name] += elapsed
+            self.self_ns[name] += elapsed - child
+            self.stacks_ns[path] += elapsed - child
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def report(self) -> dict:
+        """{"stages": {name: {calls, total_s, self_s}}, "counters": {...}}"""
+        stages = {name: {"calls": self.calls[name], "total_s": self.total_ns[name] / 1e9,
+                         "self_s": self.self_ns[name] / 1e9}
+                  for name in sorted(self.calls, key=lambda n: -self.self_ns[n])}
+        return {"stages": stages, "counters": dict(self.counters)}
+
+    def format_report(self) -> str:
+        rep = self.report()
+        all_self = sum(s["self_s"] for s in rep["stages"].values()) or 1.0
+        lines = [f"{'stage':<28} {'calls':>9} {'total ms':>10} {'self ms':>10} {'self %':>7}"]
+        for name, s in rep["stages"].items():
+            lines.append(f"{name:<28} {s['calls']:>9} {s['total_s'] * 1e3:>10.2f} "
+                         f"{s['self_s'] * 1e3:>10.2f} {100 * s['self_s'] / all_self:>6.1f}%")
+        for name, value in sorted(rep["counters"].items()):
+            lines.append(f"{name:<28} {value:>9}")
+        return "\n".join(lines)
+
+    def folded(self) -> str:
+        """Folded stacks, one "a;b;c microseconds" line per stack."""
+        return "".join(f"{';'.join(path)} {ns // 1000}\n"
+                       for path, ns in sorted(self.stacks_ns.items()) if ns >= 1000)
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+
+    def write(self, prefix):
+        """prefix.txt (format_report) and prefix.folded."""
+        with open(prefix + ".txt", "w", encoding="utf-8") as f:
+            f.write(self.format_report() + "\n")
+        self.write_folded(prefix + ".folded")
+
+
+class _Stage:
+    __slots__ = ("name", "frame")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        # [name, start, time spent in child stages]
+        self.frame = [self.name, time.perf_counter_ns(), 0]
+        stack.append(self.frame)
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter_ns() - self.frame[1]
+        stack = _local.stack
+        path = tuple(f[0] for f in stack)
+        stack.pop()
+        if stack:
+            stack[-1][2] += elapsed
+        prof = _current
+        if prof is not None:
+            prof._record(path, elapsed, self.frame[2])
+        return False
+
+
+def stage(name):
+    """Context manager timing `name`; a shared no-op while profiling is off."""
+    if not _enabled:
+        return _NULL
+    return _Stage(name)
+
+
+def profiled(name):
+    """Decorator form of stage() for functions that are a stage as a whole."""
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def count(name, n=1):
+    """Add `n` to counter `name` (no-op while profiling is off)."""
+    if _enabled:
+        _current.count(name, n)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(prof: Profile = None) -> Profile:
+    """Start recording into `prof` (a new Profile by default) and return it."""
+    global _enabled, _current
+    _current = prof or Profile()
+    _enabled = True
+    return _current
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+@contextmanager
+def profile():
+    """Record the stages of the block into a fresh Profile, which it yields."""
+    global _enabled, _current
+    previous = (_enabled, _current)
+    prof = enable()
+    try:
+        yield prof
+    finally:
+        _enabled, _current = previous
+
+
+def current() -> Profile:
+    """The Profile being recorded into (None if profiling was never enabled)."""
+    return _current
+
+
+def _enable_from_env():
+    if os.environ.get("AGATHIYAM_PROFILE", "").lower() not in ("1", "true", "yes", "on"):
+        return
+    enable()
+    out = os.environ.get("AGATHIYAM_PROFILE_OUT")
+    if out:
+        atexit.register(_write_env_profile, out)
+        # workers leave through os._exit, which skips atexit; multiprocessing
+        # still runs its own finalizers, registered once the child is set up
+        util.register_after_fork(_start_worker_profile, lambda start: start(out))
+
+
+def _start_worker_profile(out):
+    enable()    # a forked worker must not report the parent's stages as its own
+    util.Finalize(None, _write_env_profile, args=(out,), exitpriority=0)
+
+
+def _write_env_profile(out):
+    _current.write(out.replace("{pid}", str(os.getpid())))
+
+
+_enable_from_env()
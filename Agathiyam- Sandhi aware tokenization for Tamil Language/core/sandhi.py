@@ -3,6 +3,8 @@ import regex as re
 from dataclasses import dataclass
 from typing import List, Tuple
 
+from profiling import profiled
+
 @dataclass
 class Rule:
     pattern: re.Pattern
@@ -190,17 +192,21 @@ TAMIL_RANGE = r"\u0B80-\u0BFF"
 RE_TAMIL = re.compile(fr"[{TAMIL_RANGE}]")
 RE_WORD_OR_SPACE_OR_PUNC = re.compile(r"\w+|\s+|[^\w\s]")
 
-def apply_rules(text: str, rules: List[Rule]) -> str:
+def apply_rules(text: str, rules: List[Rule], timeout: float = None) -> str:
+    """
+    Applies `rules` in order. `timeout` (seconds) bounds each rule's
+    substitution; a rule that runs longer raises TimeoutError.
+    """
     out = text
     for r in rules:
-        out = r.pattern.sub(r.repl, out)
+        out = r.pattern.sub(r.repl, out, timeout=timeout)
     return out
 
-def sandhi_mark(text: str, lang="ta"):
+def sandhi_mark(text: str, lang="ta", timeout: float = None):
     rules = LANG_RULES.get(lang, [])
-    return apply_rules(text, rules)
+    return apply_rules(text, rules, timeout)
 
-def _mark_mixed(text: str) -> str:
+def _mark_mixed(text: str, timeout: float = None) -> str:
     """
     Apply Tamil sandhi rules only to Tamil spans; leave non-Tamil spans as-is.
     This ensures English/Tanglish chunks don't get Tamil-specific boundaries.
@@ -209,24 +215,44 @@ def _mark_mixed(text: str) -> str:
     out_parts = []
     for ch in chunks:
         if RE_TAMIL.search(ch):
-            out_parts.append(sandhi_mark(ch, "ta"))
+            out_parts.append(sandhi_mark(ch, "ta", timeout))
         else:
             # English/Latin/digits/punct/spaces -> no sandhi rules
             out_parts.append(sandhi_mark(ch, "en"))  # pass-through
     return "".join(out_parts)
 
-def sandhi_split(text: str, lang="ta") -> List[Tuple[str, Tuple[int,int]]]:
+MIX_LANGS = ("mix", "code-mix", "codemix", "cmix")
+
+@profiled("sandhi.mark")
+def sandhi_marked(text: str, lang="ta", timeout: float = None) -> str:
     """
-    Returns [(token, (start,end))] splitting on BOUND after applying rules.
-    Keeps offsets relative to the *post-rule* string.
+    Text with BOUND inserted by the rules for `lang`.
     - lang="ta" -> Tamil rules
     - lang="en" -> pass-through
     - lang="mix" -> per-span Tamil-only marking
+    timeout: seconds allowed per rule substitution (see apply_rules)
+    """
+    if lang.lower() in MIX_LANGS:
+        return _mark_mixed(text, timeout)
+    return sandhi_mark(text, lang, timeout)
+
+def marks_runs_independently(lang="ta") -> bool:
+    """
+    True when marking a text gives the same as marking each of its
+    whitespace / non-whitespace runs on its own: "mix" marks every word,
+    space run and punctuation mark separately, "en" has no rules. Tamil
+    rules match across whitespace, so "ta" is False.
     """
-    if lang.lower() in ("mix", "code-mix", "codemix", "cmix"):
-        marked = _mark_mixed(text)
-    else:
-        marked = sandhi_mark(text, lang)
+    return lang.lower() in MIX_LANGS or not LANG_RULES.get(lang, [])
+
+@profiled("sandhi.split")
+def sandhi_split(text: str, lang="ta") -> List[Tuple[str, Tuple[int,int]]]:
+    """
+    Returns [(token, (start,end))] splitting on BOUND after applying rules.
+    Keeps offsets relative to the *post-rule* string.
+    See sandhi_marked for `lang`.
+    """
+    marked = sandhi_marked(text, lang)
 
     parts = marked.split(BOUND)
     tokens = []
@@ -237,5 +263,32 @@ def sandhi_split(text: str, lang="ta") -> List[Tuple[str, Tuple[int,int]]]:
             cursor += len(w)
     return tokens
 
+def marked_offsets(text: str, marked: str, bounds: bool = True) -> List[int]:
+    """
+    offsets[p] is the position in `text` matching cut position p of
+    `marked` (a sandhi_marked(text)), for p in 0..len(marked). The rules only
+    insert BOUND and drop whitespace, so characters are matched in order and
+    unmatched whitespace of `text` is skipped. With bounds=False the cut
+    positions are those of marked.replace(BOUND, "").
+    """
+    offsets = [0]
+    j = 0
+    for k, part in enumerate(marked.split(BOUND)):
+        if k and bounds:
+            offsets.append(j)  # the BOUND before `part`
+        if part:
+            # usual case: `part` is in `text` as it is, after skipped whitespace
+            start = text.find(part[0], j)
+            if start >= 0 and text.startswith(part, start):
+                offsets.extend(range(start + 1, start + len(part) + 1))
+                j = start + len(part)
+                continue
+        for ch in part:
+            while j < len(text) and text[j] != ch:
+                j += 1
+            j += 1
+            offsets.append(j)
+    return offsets
+
 def remove_boundaries(text: str) -> str:
     return text.replace(BOUND, "")
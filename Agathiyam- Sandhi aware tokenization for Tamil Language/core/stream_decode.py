@@ -0,0 +1,68 @@
+# stream_decode.py
+"""
+Incremental decoding for generation.
+
+StreamDecoder takes one id at a time and returns only the text that is
+complete, so a generation loop never re-decodes its prefix. Token strings
+come from an id-indexed list built once, and the last grapheme cluster is
+held back until the next token shows it can't grow (a Tamil consonant may
+still get its vowel sign or virama, CR may still get LF). Joined together,
+the pieces from push() and flush() equal tokenizer.decode(ids) for
+BPETokenizer, GPETokenizer and SandhiBPETokenizer.
+"""
+from typing import Iterable
+
+from bpe import BPETokenizer
+from tamil_graphemes import graphemes
+
+
+class StreamDecoder:
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        id_to_token = tokenizer.id_to_token
+        self.table = [None] * (max(id_to_token, default=-1) + 1)
+        for i, tok in id_to_token.items():
+            self.table[i] = tok
+        # BPETokenizer.decode turns '<SPACE>' into a separator between words,
+        # so a space is only written once another token follows it
+        self.space_id = None
+        if isinstance(tokenizer, BPETokenizer):
+            self.space_id = tokenizer.token_to_id.get('<SPACE>')
+        self.reset()
+
+    def reset(self):
+        self.pending = ""           # text whose last cluster may still grow
+        self.space_pending = False
+
+    def _piece(self, token_id) -> str:
+        if 0 <= token_id < len(self.table) and self.table[token_id] is not None:
+            return self.table[token_id]
+        # ids added after construction (e.g. Sandhi-GPE's lazy <UNK>)
+        return self.tokenizer.id_to_token.get(token_id, "<UNK>")
+
+    def push(self, token_id: int) -> str:
+        """Add one id; returns the text completed by it (possibly "")."""
+        text = self.pending
+        if self.space_pending:
+            text += " "
+            self.space_pending = False
+        if token_id == self.space_id:
+            self.space_pending = True
+        else:
+            text += self._piece(token_id)
+        if not text:
+            self.pending = ""
+            return ""
+        # `text` is one held-back cluster plus one token, so this stays O(1)
+        last = graphemes(text)[-1]
+        self.pending = last
+        return text[:len(text) - len(last)]
+
+    def push_many(self, ids: Iterable[int]) -> str:
+        return "".join(self.push(i) for i in ids)
+
+    def flush(self) -> str:
+        """Text still held back (end of generation); a trailing '<SPACE>' is dropped."""
+        text = self.pending
+        self.reset()
+        return text
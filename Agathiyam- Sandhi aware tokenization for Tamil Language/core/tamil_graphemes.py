@@ -0,0 +1,69 @@
+# tamil_graphemes.py
+"""
+Fast grapheme-cluster segmentation for Tamil, ASCII and common punctuation.
+
+Inside this closed character set the extended grapheme cluster rules the
+`grapheme` package implements (UAX #29, Unicode 13) reduce to:
+
+    cluster = CR LF | control | any other char followed by Tamil signs / ZWJ / ZWNJ
+
+(a Tamil vowel sign, anusvara or virama never starts a new cluster unless it
+follows a control character). That is one precompiled regex scan instead of
+a per-code-point property lookup. Text with any character outside the set
+(other scripts, emoji, ...) falls back to `grapheme`, so the output is always
+identical to it.
+"""
+import re
+from typing import List
+
+import grapheme
+
+# Tamil combining signs: anusvara, vowel signs, virama, AU length mark
+TAMIL_SIGNS = "\u0B82\u0BBE-\u0BC2\u0BC6-\u0BC8\u0BCA-\u0BCD\u0BD7"
+ZW_JOINERS = "\u200C\u200D"  # ZWNJ, ZWJ (Grapheme_Extend)
+CONTROLS = "\x00-\x1F\x7F"
+# Whitespace inside the fast set, as `regex` (and the \S+|\s+ chunkers) define it
+WHITESPACE = "\t\n\x0b\x0c\r \xa0"
+
+# Characters the fast path handles: ASCII, NBSP, the Tamil block, ZWNJ/ZWJ
+# and General Punctuation dashes/quotes/ellipsis (U+2010-U+2027).
+_FAST_CHARS = "\x00-\x7F\u00A0\u0B80-\u0BFF\u200C\u200D\u2010-\u2027"
+_SLOW_CHAR_RE = re.compile(f"[^{_FAST_CHARS}]")
+_CLUSTER_RE = re.compile(f"\r\n|[{CONTROLS}]|[^{CONTROLS}][{TAMIL_SIGNS}{ZW_JOINERS}]*")
+
+
+def is_fast(text: str) -> bool:
+    """True when every character of `text` is covered by the fast path."""
+    return _SLOW_CHAR_RE.search(text) is None
+
+
+def graphemes(text: str) -> List[str]:
+    """Grapheme clusters of `text`, same as list(grapheme.graphemes(text))."""
+    if _SLOW_CHAR_RE.search(text) is None:
+        return _CLUSTER_RE.findall(text)
+    return list(grapheme.graphemes(text))
+
+
+def boundaries(text: str) -> List[int]:
+    """Start offset of every cluster, followed by len(text)."""
+    offsets = [0]
+    for g in graphemes(text):
+        offsets.append(offsets[-1] + len(g))
+    return offsets
+
+
+def chunk_cluster_re(separators: str = "") -> "re.Pattern":
+    """
+    Pattern whose findall gives the clusters of every whitespace / non-whitespace chunk of a
+    fast-path text in one scan: clusters never cross a whitespace edge, and
+    `separators` characters are skipped and end a cluster.
+    """
+    return re.compile(f"[^{WHITESPACE}{CONTROLS}{separators}][{TAMIL_SIGNS}{ZW_JOINERS}]*"
+                      f"|\r\n|[{CONTROLS}{WHITESPACE}]")
+
+
+def length(text: str) -> int:
+    """Number of grapheme clusters, same as grapheme.length(text)."""
+    if _SLOW_CHAR_RE.search(text) is None:
+        return len(_CLUSTER_RE.findall(text))
+    return grapheme.length(text)
@@ -0,0 +1,88 @@
+# telemetry.py
+"""
+Structured training telemetry.
+
+One JSON record per merge is appended to a JSONL file (buffered, written in
+blocks), and a one-line summary is printed to the console at most once every
+`console_interval` seconds.
+"""
+import json
+import os
+import sys
+import time
+
+
+def rss_mb() -> float:
+    """Current resident set size in MiB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+        except ImportError:
+            return 0.0
+
+
+class TrainingTelemetry:
+    def __init__(self, path=None, console_interval=5.0, flush_every=256, stream=None):
+        """
+        path: JSONL output file (None -> console only)
+        console_interval: minimum seconds between console lines
+        flush_every: records buffered before a write
+        """
+        self.path = path
+        self.console_interval = console_interval
+        self.flush_every = flush_every
+        self.stream = stream if stream is not None else sys.stdout
+        self._buffer = []
+        self._file = open(path, "a", encoding="utf-8", buffering=1 << 20) if path else None
+        self._start = time.time()
+        self._last_console = 0.0
+        self.num_records = 0
+
+    def record(self, **fields):
+        fields.setdefault("elapsed_s", round(time.time() - self._start, 3))
+        self.num_records += 1
+        if self._file is not None:
+            self._buffer.append(json.dumps(fields, ensure_ascii=False))
+            if len(self._buffer) >= self.flush_every:
+                self.flush()
+        now = time.time()
+        if now - self._last_console >= self.console_interval:
+            self._last_console = now
+            print(self.format_console(fields), file=self.stream)
+
+    @staticmethod
+    def format_console(rec):
+        parts = [f"{k}={v}" for k, v in rec.items() if v is not None]
+        return "[train] " + " ".join(parts)
+
+    def flush(self):
+        if self._file is not None and self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._file.flush()
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def load_telemetry(path):
+    """Read a telemetry JSONL file back as a list of dicts."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
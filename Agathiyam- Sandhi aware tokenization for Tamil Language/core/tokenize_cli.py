@@ -0,0 +1,261 @@
+# tokenize_cli.py
+"""
+agathiyam-tokenize: stream a corpus through BPE, GPE or Sandhi-GPE.
+
+Lines are read from files (plain or gzip) or stdin by a reader thread, sent
+in batches to a process pool and written in input order, one output record
+per input line (empty lines give empty id lists). The queue between reader
+and pool and the number of batches in flight are bounded, so memory stays
+flat however large the corpus is.
+
+Output formats:
+    jsonl   {"ids": [...]} per line, to --output or stdout
+    bin     --output is a directory of shards: shard_00000.bin holds the ids
+            as little-endian uint32, shard_00000.idx the int64 end offset of
+            every line in it (np.fromfile(..., dtype="<u4") / "<i8")
+
+Usage:
+    python core/tokenize_cli.py corpus.txt.gz --tokenizer sandhi-gpe --lang ta \
+        --vocab models/vocab.pkl --merges models/merges.pkl --workers 4 > ids.jsonl
+    cat corpus.txt | python core/tokenize_cli.py --tokenizer bpe --vocab vocab_bpe.pkl \
+        --merges merges_bpe.pkl --format bin --output shards/
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from batching import batch_ids
+from frozen_tables import freeze_gc
+
+TOKENIZERS = ("bpe", "gpe", "sandhi-gpe")
+_DONE = object()
+
+_TOKENIZER = None
+
+
+def load(kind, vocab, merges, lang=None, frozen=False):
+    if kind == "bpe":
+        from bpe import load_bpe
+        return load_bpe(vocab, merges)
+    if kind == "gpe":
+        from gpe import load_gpe
+        return load_gpe(vocab, merges)
+    if kind == "sandhi-gpe":
+        from GPE_sandhi import load_tokenizer
+        return load_tokenizer(vocab, merges, lang=lang or "mix", frozen=frozen)
+    raise ValueError(f"Unknown tokenizer: {kind!r} (expected one of {TOKENIZERS})")
+
+
+def _init_worker(kind, vocab, merges, lang, frozen):
+    global _TOKENIZER
+    _TOKENIZER = load(kind, vocab, merges, lang, frozen)
+
+
+def encode_lines(lines, fmt, tok=None):
+    """(chars, tokens, payload) for one batch; payload is the batch's output bytes."""
+    seqs = batch_ids(tok or _TOKENIZER, lines)
+    chars = sum(len(line) for line in lines)
+    tokens = sum(len(ids) for ids in seqs)
+    if fmt == "jsonl":
+        payload = "".join('{"ids": %s}\n' % json.dumps(ids) for ids in seqs).encode("utf-8")
+        return chars, tokens, payload
+    ids = array('I')
+    ends = array('q')
+    for seq in seqs:
+        ids.extend(seq)
+        ends.append(len(ids))
+    if sys.byteorder == "big":
+        ids.byteswap()
+        ends.byteswap()
+    return chars, tokens, (ids.tobytes(), ends)
+
+
+def open_input(path):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", errors="replace")
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    if gzipped:
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def read_batches(paths, batch_lines, out_queue, stop):
+    """Reader thread: puts line batches on `out_queue` (blocks when full), then _DONE."""
+    try:
+        batch = []
+        for path in paths:
+            with open_input(path) as f:
+                for line in f:
+                    batch.append(line.rstrip("\r\n"))
+                    if len(batch) == batch_lines:
+                        out_queue.put(batch)
+                        batch = []
+                    if stop.is_set():
+                        return
+        if batch:
+            out_queue.put(batch)
+    except BaseException as e:  # surfaced by the main thread
+        out_queue.put(e)
+    finally:
+        out_queue.put(_DONE)
+
+
+class ShardWriter:
+    def __init__(self, directory, shard_tokens):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_tokens = shard_tokens
+        self.index = 0
+        self._open()
+
+    def _open(self):
+        base = os.path.join(self.directory, f"shard_{self.index:05d}")
+        self.bin = open(base + ".bin", "wb")
+        self.idx = open(base + ".idx", "wb")
+        self.tokens = 0
+
+    def write(self, payload):
+        data, ends = payload
+        if self.tokens and self.tokens + len(data) // 4 > self.shard_tokens:
+            self.close()
+            self.index += 1
+            self._open()
+        shifted = array('q', (self.tokens + e for e in ends)) if self.tokens else ends
+        self.bin.write(data)
+        self.idx.write(shifted.tobytes())
+        self.tokens += len(data) // 4
+
+    def close(self):
+        self.bin.close()
+        self.idx.close()
+
+
+class Progress:
+    def __init__(self, every, stream=sys.stderr):
+        self.every = every
+        self.stream = stream
+        self.start = self.last = time.perf_counter()
+        self.lines = self.chars = self.tokens = 0
+
+    def add(self, lines, chars, tokens):
+        self.lines += lines
+        self.chars += chars
+        self.tokens += tokens
+        now = time.perf_counter()
+        if self.every and now - self.last >= self.every:
+            self.last = now
+            self.report()
+
+    def report(self, final=False):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        label = "done" if final else "progress"
+        print(f"[{label}] {self.lines:,} lines  {self.chars / elapsed:,.0f} chars/s  "
+              f"{self.tokens / elapsed:,.0f} tokens/s  ({self.tokens:,} tokens, {elapsed:.1f}s)",
+              file=self.stream, flush=True)
+
+
+def run(args, stdout=None):
+    stdout = stdout or sys.stdout.buffer
+    if args.format == "bin" and not args.output:
+        raise SystemExit("--format bin needs --output DIR")
+    if args.tokenizer != "sandhi-gpe" and (args.lang or args.frozen):
+        raise SystemExit("--lang and --frozen apply to --tokenizer sandhi-gpe only")
+    batches = queue.Queue(maxsize=args.queue_batches)
+    stop = threading.Event()
+    reader = threading.Thread(target=read_batches, daemon=True,
+                              args=(args.inputs or ["-"], args.batch_lines, batches, stop))
+    if args.format == "bin":
+        writer = ShardWriter(args.output, args.shard_tokens)
+        write, close = writer.write, writer.close
+    else:
+        out = open(args.output, "wb") if args.output and args.output != "-" else stdout
+        write = out.write
+        close = out.close if out is not stdout else out.flush
+
+    initargs = (args.tokenizer, args.vocab, args.merges, args.lang, args.frozen)
+    pool = tok = None
+    if args.workers > 0:
+        if args.frozen:
+            load(*initargs)  # write the frozen table once, before the workers open it
+        # forked workers: keep their GC passes off the pages inherited from this process
+        freeze_gc()
+        pool = ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=initargs)
+    else:
+        tok = load(*initargs)
+    progress = Progress(args.report_every)
+    in_flight = deque()
+
+    def finish_oldest():
+        lines, fut = in_flight.popleft()
+        chars, tokens, payload = fut.result() if pool else fut
+        write(payload)
+        progress.add(lines, chars, tokens)
+
+    reader.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                break
+            if isinstance(batch, BaseException):
+                raise batch
+            if pool:
+                in_flight.append((len(batch), pool.submit(encode_lines, batch, args.format)))
+            else:
+                in_flight.append((len(batch), encode_lines(batch, args.format, tok)))
+            # results are written in submission order; waiting on the oldest
+            # batch also caps how many are in flight
+            while len(in_flight) > max(args.workers, 1) * 2:
+                finish_oldest()
+        while in_flight:
+            finish_oldest()
+    finally:
+        stop.set()
+        if pool:
+            pool.shutdown(wait=True, cancel_futures=True)
+        close()
+    progress.report(final=True)
+    return progress
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(prog="agathiyam-tokenize",
+                                 description="Tokenize a corpus with BPE, GPE or Sandhi-GPE")
+    ap.add_argument("inputs", nargs="*", help="text files, plain or gzip ('-' or none: stdin)")
+    ap.add_argument("--tokenizer", choices=TOKENIZERS, default="sandhi-gpe")
+    ap.add_argument("--vocab", required=True, help="vocab pickle")
+    ap.add_argument("--merges", required=True, help="merges pickle")
+    ap.add_argument("--lang", choices=["ta", "en", "mix"], default=None,
+                    help="sandhi-gpe only: sandhi rules (default mix)")
+    ap.add_argument("--frozen", action="store_true",
+                    help="sandhi-gpe: share memory-mapped tables between workers (frozen_tables.py)")
+    ap.add_argument("--format", choices=["jsonl", "bin"], default="jsonl")
+    ap.add_argument("--output", default=None, help="jsonl file (default stdout) or bin shard directory")
+    ap.add_argument("--shard-tokens", type=int, default=1 << 28, help="max ids per bin shard")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="pool processes (0 = encode in this process)")
+    ap.add_argument("--batch-lines", type=int, default=2000)
+    ap.add_argument("--queue-batches", type=int, default=8,
+                    help="batches the reader may run ahead of the pool")
+    ap.add_argument("--report-every", type=float, default=5.0,
+                    help="seconds between progress lines on stderr (0: final summary only)")
+    return ap
+
+
+def main(argv=None):
+    run(build_parser().parse_args(argv))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
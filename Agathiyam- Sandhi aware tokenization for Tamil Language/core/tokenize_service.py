@@ -0,0 +1,316 @@
+# tokenize_service.py
+"""
+Local Sandhi-GPE tokenization service.
+
+Loads SandhiBPETokenizer once and serves it over a Unix socket or TCP with a
+JSON-lines protocol, one request per line:
+
+    {"id": 1, "op": "encode", "text": "..."}   -> {"id": 1, "ids": [...]}
+    {"id": 2, "op": "count", "text": "..."}    -> {"id": 2, "count": 17}
+    {"id": 3, "op": "decode", "ids": [...]}    -> {"id": 3, "text": "..."}
+    {"id": 4, "op": "metrics"}                 -> {"id": 4, "metrics": {...}}
+
+Requests may be pipelined; each connection gets its responses in request
+order. Requests from all connections are gathered into micro-batches (a batch
+closes after `window_ms` or at `max_batch` requests) and run on a process pool
+whose workers each hold a copy of the tokenizer (workers=0 runs batches on one
+thread in the server process). Metrics report queue depth, a latency
+histogram and how often the tokenizer's input guards fell back (see
+SandhiBPETokenizer: --max-input-chars, --rule-timeout-ms, --degraded).
+
+Usage:
+    python core/tokenize_service.py --vocab models/vocab.pkl --merges models/merges.pkl \
+        --unix /tmp/agathiyam.sock --workers 4 --window-ms 2
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import multiprocessing
+import os
+import signal
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from GPE_sandhi import SandhiBPETokenizer, load_tokenizer
+
+# latency histogram bucket upper bounds, milliseconds
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_TOKENIZER = None
+
+
+def _init_worker(vocab, merges, lang, options=None):
+    global _TOKENIZER
+    _TOKENIZER = SandhiBPETokenizer(vocab, merges, lang=lang, **(options or {}))
+
+
+def _handle(tok, op, payload):
+    if op == "encode":
+        return {"ids": tok.encode(payload, return_tokens=False)}
+    if op == "count":
+        return {"count": tok.count_tokens(payload)}
+    if op == "decode":
+        return {"text": tok.decode(payload)}
+    return {"error": f"unknown op {op!r}"}
+
+
+def _run_batch(batch: List[Tuple[str, object]], tok=None) -> Tuple[List[dict], dict]:
+    """Results of a batch, and the guard fallbacks it caused."""
+    tok = tok or _TOKENIZER
+    before = Counter(tok.fallbacks)
+    out = []
+    for op, payload in batch:
+        try:
+            out.append(_handle(tok, op, payload))
+        except Exception as e:  # a bad request must not fail its batch
+            out.append({"error": f"{type(e).__name__}: {e}"})
+    return out, dict(tok.fallbacks - before)
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.latency_sum_ms = 0.0
+        self.fallbacks = Counter()
+
+    def observe_latency(self, ms: float):
+        self.latency_counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.latency_sum_ms += ms
+
+    def snapshot(self) -> dict:
+        buckets = {f"le_{b}": c for b, c in zip(LATENCY_BUCKETS_MS, self.latency_counts)}
+        buckets["le_inf"] = self.latency_counts[-1]
+        done = sum(self.latency_counts)
+        return {
+            "uptime_s": round(time.time() - self.started, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "latency_ms_histogram": buckets,
+            "mean_latency_ms": self.latency_sum_ms / done if done else 0.0,
+            "fallbacks": dict(self.fallbacks),
+        }
+
+
+class TokenizeService:
+    def __init__(self, tokenizer: SandhiBPETokenizer, workers: int = 1, window_ms: float = 2.0,
+                 max_batch: int = 256):
+        """
+        workers: processes in the pool (0 = one thread in this process)
+        window_ms: how long a batch stays open for more requests after its first one
+        max_batch: requests per batch at most
+        """
+        self.tokenizer = tokenizer
+        self.workers = workers
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.metrics = Metrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor = None
+        self._tasks = []
+
+    async def start(self):
+        if self.workers > 0:
+            tok = self.tokenizer
+            # spawned, not forked: a forked worker would inherit open client
+            # sockets and keep them from closing
+            self._executor = ProcessPoolExecutor(self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker,
+                                                 initargs=(tok.vocab, tok.merges, tok.lang,
+                                                           tok.encode_options()))
+            # load the tokenizer in every worker before the first request
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self._executor, _run_batch, [])
+                                   for _ in range(self.workers)))
+        else:
+            self._executor = ThreadPoolExecutor(1)
+        self._queue = asyncio.Queue()
+        # one batch in flight per worker, the next one fills meanwhile
+        self._slots = asyncio.Semaphore(max(self.workers, 1))
+        self._tasks.append(asyncio.create_task(self._batcher()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def submit(self, op: str, payload) -> dict:
+        """Queue one request and wait for its result."""
+        fut = asyncio.get_running_loop().create_future()
+        self.metrics.requests += 1
+        self.metrics.queue_depth += 1
+        self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, self.metrics.queue_depth)
+        await self._queue.put((op, payload, fut, time.perf_counter()))
+        return await fut
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._slots.acquire()
+            self.metrics.queue_depth -= len(batch)
+            self._tasks.append(asyncio.create_task(self._dispatch(batch)))
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        work = [(op, payload) for op, payload, _, _ in batch]
+        try:
+            if self.workers > 0:
+                results, fallbacks = await loop.run_in_executor(self._executor, _run_batch, work)
+            else:
+                results, fallbacks = await loop.run_in_executor(self._executor, _run_batch, work,
+                                                                self.tokenizer)
+        except Exception as e:
+            results, fallbacks = [{"error": f"{type(e).__name__}: {e}"}] * len(batch), {}
+        finally:
+            self._slots.release()
+            self._tasks.remove(asyncio.current_task())
+        self.metrics.batches += 1
+        self.metrics.batched_requests += len(batch)
+        self.metrics.fallbacks.update(fallbacks)
+        now = time.perf_counter()
+        for (_, _, fut, queued), result in zip(batch, results):
+            self.metrics.observe_latency((now - queued) * 1000)
+            self.metrics.errors += "error" in result
+            if not fut.done():
+                fut.set_result(result)
+
+    async def _request(self, line: bytes) -> dict:
+        try:
+            req = json.loads(line)
+            op = req.get("op", "encode")
+        except (ValueError, AttributeError) as e:
+            self.metrics.errors += 1
+            return {"error": f"bad request: {e}"}
+        if op == "metrics":
+            result = {"metrics": self.metrics.snapshot()}
+        else:
+            result = await self.submit(op, req.get("ids") if op == "decode" else req.get("text", ""))
+        if "id" in req:
+            result = {"id": req["id"], **result}
+        return result
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        pending: asyncio.Queue = asyncio.Queue()
+
+        async def respond():
+            # answers go out in request order, whatever order batches finish in
+            while True:
+                task = await pending.get()
+                if task is None:
+                    break
+                writer.write(json.dumps(await task, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+
+        responder = asyncio.create_task(respond())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    await pending.put(asyncio.create_task(self._request(line)))
+            await pending.put(None)
+            await responder
+        except ConnectionError:
+            pass
+        finally:
+            responder.cancel()
+            writer.close()
+
+    async def serve(self, unix_path: str = None, host: str = "127.0.0.1", port: int = 8765,
+                    ready: asyncio.Event = None):
+        """Run until cancelled; listens on `unix_path` when given, else on host:port."""
+        await self.start()
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_path,
+                                                     limit=1 << 24)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port, limit=1 << 24)
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.stop()
+            if unix_path and os.path.exists(unix_path):
+                os.unlink(unix_path)
+
+
+async def _serve_until_signalled(service, args):
+    # SIGTERM/SIGINT cancel serve(), which shuts the worker pool down cleanly
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, task.cancel)
+        except NotImplementedError:  # Windows
+            pass
+    try:
+        await service.serve(args.unix, args.host, args.port)
+    except asyncio.CancelledError:
+        pass
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sandhi-GPE tokenization service (JSON lines)")
+    ap.add_argument("--vocab", required=True)
+    ap.add_argument("--merges", required=True)
+    ap.add_argument("--lang", default="mix", choices=["mix", "ta", "en"])
+    ap.add_argument("--unix", default=None, help="Unix socket path (default: TCP)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--workers", type=int, default=1, help="pool processes (0 = in-process thread)")
+    ap.add_argument("--frozen", action="store_true",
+                    help="share memory-mapped tables between workers (frozen_tables.py)")
+    ap.add_argument("--window-ms", type=float, default=2.0)
+    ap.add_argument("--max-batch", type=int, default=256)
+    ap.add_argument("--max-input-chars", type=int, default=None,
+                    help="encode longer texts in pieces of about this size")
+    ap.add_argument("--rule-timeout-ms", type=float, default=None,
+                    help="time allowed per sandhi rule before a text is encoded grapheme-only")
+    ap.add_argument("--degraded", action="store_true",
+                    help="skip sandhi marking and merges: grapheme ids only")
+    args = ap.parse_args()
+
+    rule_timeout = args.rule_timeout_ms / 1000 if args.rule_timeout_ms else None
+    tok = load_tokenizer(args.vocab, args.merges, lang=args.lang, frozen=args.frozen,
+                         max_input_chars=args.max_input_chars, rule_timeout=rule_timeout,
+                         degraded=args.degraded)
+    service = TokenizeService(tok, workers=args.workers, window_ms=args.window_ms,
+                              max_batch=args.max_batch)
+    where = args.unix or f"{args.host}:{args.port}"
+    print(f"Serving Sandhi-GPE ({args.lang}) on {where}, {args.workers} workers")
+    asyncio.run(_serve_until_signalled(service, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# vocab_sweep.py
+"""
+Vocabulary-size sweep from a single training run.
+
+Merges are learned in rank order, so the tokenizer for any smaller vocab
+size is the same model truncated to a prefix of its merges. This script
+derives those tokenizers from one vocab/merges pair and evaluates all of
+them (compression, fertility, token OOV) in a single pass over the eval
+corpus: the shared pre-tokenization of each line is computed once and only
+the merge stage is repeated per size. Rows are merged into
+results/evaluation_results.csv.
+
+Usage:
+    python vocab_sweep.py --tokenizer sandhi-gpe --vocab models/vocab.pkl \
+        --merges models/merges.pkl --sizes 1000 2000 4000 6000
+"""
+import argparse
+import csv
+import os
+import pickle
+from typing import Dict, List, Tuple
+
+from bpe import BPETokenizer
+from GPE_sandhi import SandhiBPETokenizer
+from compare_tokenizers import compression_ratio, fertility_score
+
+
+# ---------------- deriving smaller tokenizers ----------------
+def sandhi_prefix(vocab: Dict[int, str], merges: Dict[Tuple[int, int], int], vocab_size: int):
+    """
+    Sandhi-GPE tokenizer parts for `vocab_size`: all base graphemes plus the
+    lowest-ranked merges (merge ids grow with rank). Returns (vocab, merges).
+    """
+    merged_ids = set(merges.values())
+    base = {i: t for i, t in vocab.items() if i not in merged_ids}
+    ranked = sorted(merges.items(), key=lambda kv: kv[1])[:max(0, vocab_size - len(base))]
+    sub_vocab = dict(base)
+    for _, idx in ranked:
+        sub_vocab[idx] = vocab[idx]
+    return sub_vocab, dict(ranked)
+
+
+def bpe_prefix(token_to_id: Dict[str, int], merges: List[Tuple[str, str]], vocab_size: int):
+    """
+    BPE tokenizer parts for `vocab_size`: special tokens, base symbols
+    (single characters and the '</w>' end-of-word marker) and the first
+    merges; ids are reassigned the way train_bpe does.
+    Returns (token_to_id, merges).
+    """
+    specials = {'<UNK>': 0, '<SPACE>': 1}
+    base = {t for t in token_to_id if t not in specials and len(t) == 1}
+    for a, b in merges:
+        base.update(x for x in (a, b) if len(x) == 1)
+    if base:
+        base.add('</w>')  # ends every word, whether or not it survives unmerged
+    num_merges = max(0, vocab_size - len(specials) - len(base))
+    prefix = list(merges[:num_merges])
+    tokens = base | {a + b for a, b in prefix}
+    sub = dict(specials)
+    for t in sorted(tokens):
+        if t not in sub:
+            sub[t] = len(sub)
+    return sub, prefix
+
+
+# ---------------- single-pass evaluation ----------------
+class _Totals:
+    def __init__(self):
+        self.cr = self.fs = 0.0
+        self.tokens = self.unk = self.count = 0
+
+    def add(self, text, num_tokens, num_unk):
+        if num_tokens == 0:
+            return
+        self.cr += compression_ratio(text, num_tokens)
+        self.fs += fertility_score(text, num_tokens)
+        self.tokens += num_tokens
+        self.unk += num_unk
+        self.count += 1
+
+    def row(self):
+        n = self.count or 1
+        return (self.cr / n, self.fs / n, self.tokens / n,
+                self.unk / self.tokens if self.tokens else 0.0)
+
+
+def sweep_sandhi(texts, vocab, merges, sizes, lang="mix"):
+    """Evaluate Sandhi-GPE at every size in `sizes`; returns {size: (cr, fs, avg_tokens, oov)}."""
+    full = SandhiBPETokenizer(dict(vocab), merges, lang=lang)
+    subs = {size: sandhi_prefix(vocab, merges, size)[1] for size in sizes}
+    totals = {size: _Totals() for size in sizes}
+    for text in texts:
+        _, base_ids = full.pretokenize(text)
+        unk_id = full.vocab_re.get("<UNK>")
+        for size, sub_merges in subs.items():
+            ids = full.merge_ids(base_ids, sub_merges)
+            totals[size].add(text, len(ids), sum(1 for i in ids if i == unk_id))
+    return {size: t.row() for size, t in totals.items()}
+
+
+def sweep_bpe(texts, token_to_id, merges, sizes):
+    """Evaluate BPE at every size in `sizes`; returns {size: (cr, fs, avg_tokens, oov)}."""
+    toks = {size: BPETokenizer(*bpe_prefix(token_to_id, merges, size)) for size in sizes}
+    totals = {size: _Totals() for size in sizes}
+    for text in texts:
+        words = text.strip().split()  # split once, shared by every size
+        for size, tok in toks.items():
+            n, unk = max(0, len(words) - 1), 0  # '<SPACE>' between words
+            for w in words:
+                sub, _ = tok.encode_word(w)
+                n += len(sub)
+                unk += sum(1 for t in sub if t not in tok.token_to_id)
+            totals[size].add(text, n, unk)
+    return {size: t.row() for size, t in totals.items()}
+
+
+# ---------------- CSV ----------------
+def write_results(csv_file, name, limit, results):
+    """Merge sweep rows into the evaluation CSV, replacing earlier rows for the same tokenizer/limit."""
+    header = ["Limit", "Tokenizer", "Avg CR", "Avg FS", "Avg Tokens"]
+    rows = []
+    if os.path.exists(csv_file):
+        with open(csv_file, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            header = list(reader.fieldnames or header)
+            rows = list(reader)
+    for col in ("Vocab Size", "Token OOV Ratio"):
+        if col not in header:
+            header.append(col)
+
+    names = {f"{name}@{size}" for size in results}
+    rows = [r for r in rows if not (r["Tokenizer"] in names and str(r["Limit"]) == str(limit))]
+    for size, (cr, fs, avg_tokens, oov) in sorted(results.items()):
+        rows.append({"Limit": limit, "Tokenizer": f"{name}@{size}", "Avg CR": cr, "Avg FS": fs,
+                     "Avg Tokens": avg_tokens, "Vocab Size": size, "Token OOV Ratio": oov})
+
+    with open(csv_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=header, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# ------------------ Main ------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Evaluate several vocab sizes from one merges file")
+    ap.add_argument("--tokenizer", choices=["sandhi-gpe", "bpe"], default="sandhi-gpe")
+    ap.add_argument("--vocab", default="models/vocab.pkl", help="Sandhi-GPE: id->token; BPE: token->id")
+    ap.add_argument("--merges", default="models/merges.pkl")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 3000, 4000, 5000, 6000])
+    ap.add_argument("--path", default="data/samanantar_eng_90_percent_cleaned1.txt")
+    ap.add_argument("--limit", type=int, default=3000)
+    ap.add_argument("--lang", default="mix")
+    ap.add_argument("--csv", default="results/evaluation_results.csv")
+    args = ap.parse_args()
+
+    with open(args.path, "r", encoding="utf-8") as f:
+        lines = [" ".join(line.split()) for line in f if line.strip()][:args.limit]
+    with open(args.vocab, "rb") as f:
+        vocab = pickle.load(f)
+    with open(args.merges, "rb") as f:
+        merges = pickle.load(f)
+
+    if args.tokenizer == "sandhi-gpe":
+        name = "Sandhi-GPE"
+        results = sweep_sandhi(lines, vocab, merges, args.sizes, lang=args.lang)
+    else:
+        name = "BPE"
+        results = sweep_bpe(lines, vocab, merges, args.sizes)
+
+    for size, (cr, fs, avg_tokens, oov) in sorted(results.items()):
+        print(f"{name}@{size:<6} Avg CR={cr:.4f} Avg FS={fs:.4f} Avg Tokens={avg_tokens:.2f} OOV={oov:.4f}")
+    write_results(args.csv, name, args.limit, results)
+    print(f"\n✅ Results saved to {args.csv}")
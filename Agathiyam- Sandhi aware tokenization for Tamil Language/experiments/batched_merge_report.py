@@ -0,0 +1,108 @@
+"""
+Exact vs batched merge training for Sandhi-GPE.
+
+Trains the sandhi-aware grapheme BPE once with exact (one pair per pass)
+merging and once per batch tolerance, then compares training time, corpus
+passes, vocab overlap with the exact run and fertility on held-out lines.
+
+Usage:
+    python experiments/batched_merge_report.py --merges 1000 --tolerances 0.02 0.05 0.1
+"""
+import os
+import sys
+import csv
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+from GPE_sandhi import (SandhiBPETokenizer, build_initial_vocab,
+                        covert_to_ids_train, train_merges)
+from telemetry import TrainingTelemetry, load_telemetry
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+DEFAULT_FILES = [os.path.join(ROOT, "data", "flores", "flores.tam_Taml"),
+                 os.path.join(ROOT, "data", "flores", "flores.eng_Latn")]
+
+
+def load_lines(paths, limit=None):
+    lines = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            file_lines = [" " + " ".join(line.split()) for line in f if line.strip()]
+        lines.extend(file_lines[:limit] if limit else file_lines)
+    return lines
+
+
+def run(train_lines, num_merges, lang, tolerance=None, max_pairs=1, min_frequency=1):
+    vocab, vocab_re = build_initial_vocab(train_lines, lang=lang)
+    ids = covert_to_ids_train(train_lines, vocab_re, lang=lang)
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "telemetry.jsonl")
+        start = time.time()
+        with TrainingTelemetry(log_path, console_interval=30.0) as telemetry:
+            vocab, merges, _ = train_merges(ids, vocab, num_merges, vocab_re=vocab_re,
+                                            batch_tolerance=tolerance, max_batch_pairs=max_pairs,
+                                            min_frequency=min_frequency, telemetry=telemetry)
+        elapsed = time.time() - start
+        records = load_telemetry(log_path)
+    passes = max((r["corpus_pass"] for r in records), default=0)
+    return vocab, merges, elapsed, passes
+
+
+def avg_fertility(tokenizer, lines):
+    total, count = 0.0, 0
+    for text in lines:
+        _, ids = tokenizer.encode(text)
+        if text:
+            total += len(ids) / len(text)
+            count += 1
+    return total / count if count else 0.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--path", nargs="+", default=DEFAULT_FILES, help="training/eval text files")
+    ap.add_argument("--limit", type=int, default=None, help="lines per file")
+    ap.add_argument("--merges", type=int, default=1000)
+    ap.add_argument("--tolerances", type=float, nargs="+", default=[0.02, 0.05, 0.1])
+    ap.add_argument("--max-pairs", type=int, default=8)
+    ap.add_argument("--min-frequency", type=int, default=1)
+    ap.add_argument("--lang", default="mix")
+    ap.add_argument("--out", default=os.path.join(ROOT, "results", "batched_merge_report.csv"))
+    args = ap.parse_args()
+
+    lines = load_lines(args.path, args.limit)
+    # every 10th line is held out for fertility
+    eval_lines = lines[::10]
+    train_lines = [ln for i, ln in enumerate(lines) if i % 10]
+
+    configs = [("exact", None, 1)] + [(f"batched@{t}", t, args.max_pairs) for t in args.tolerances]
+    rows = []
+    exact_tokens = None
+    exact_order = None
+    for name, tol, max_pairs in configs:
+        vocab, merges, elapsed, passes = run(train_lines, args.merges, args.lang,
+                                             tol, max_pairs, args.min_frequency)
+        learned = [vocab[idx] for idx in sorted(merges.values())]
+        if exact_tokens is None:
+            exact_tokens, exact_order = set(learned), learned
+        overlap = len(set(learned) & exact_tokens) / len(exact_tokens) if exact_tokens else 1.0
+        same_prefix = next((k for k, (a, b) in enumerate(zip(learned, exact_order)) if a != b),
+                           min(len(learned), len(exact_order)))
+        fert = avg_fertility(SandhiBPETokenizer(dict(vocab), merges, lang=args.lang), eval_lines)
+        rows.append([name, len(merges), passes, round(elapsed, 2), round(overlap, 4), same_prefix, fert])
+        print(f"{name:<14} merges={len(merges)} passes={passes} time={elapsed:.1f}s "
+              f"overlap={overlap:.4f} same_prefix={same_prefix} fertility={fert:.4f}")
+
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Mode", "Merges", "Passes", "Train Seconds", "Vocab Overlap vs Exact",
+                         "Identical Merge Prefix", "Avg FS"])
+        writer.writerows(rows)
+    print(f"\n✅ Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
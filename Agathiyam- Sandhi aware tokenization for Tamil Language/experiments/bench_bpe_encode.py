@@ -0,0 +1,79 @@
+"""
+Per-word BPE encode latency vs number of merges.
+
+Compares the ordered merge loop (every merge tried on every word) with the
+rank-indexed encoder in BPETokenizer, using prefixes of one merge list so
+each size is the same model truncated.
+
+Usage:
+    python experiments/bench_bpe_encode.py --sizes 200 1000 5000 10000 30000
+    python experiments/bench_bpe_encode.py --vocab models/vocab_bpe.pkl --merges models/merges_bpe.pkl
+"""
+import os
+import sys
+import time
+import pickle
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+from bpe import BPETokenizer, train_bpe
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+DEFAULT_FILES = [os.path.join(ROOT, "data", "flores", "flores.eng_Latn"),
+                 os.path.join(ROOT, "data", "flores", "flores.tam_Taml")]
+
+
+def per_word_us(fn, words, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for w in words:
+            fn(w)
+    return (time.perf_counter() - start) / (repeat * len(words)) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--path", nargs="+", default=DEFAULT_FILES)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[200, 1000, 5000, 10000, 30000])
+    ap.add_argument("--vocab", help="trained BPE token_to_id pickle (otherwise train on --path)")
+    ap.add_argument("--merges", help="trained BPE merges pickle")
+    ap.add_argument("--words", type=int, default=2000, help="distinct eval words")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--skip-ordered-above", type=int, default=10000,
+                    help="don't time the ordered loop past this many merges (it gets slow)")
+    args = ap.parse_args()
+
+    lines = []
+    for path in args.path:
+        with open(path, "r", encoding="utf-8") as f:
+            lines.extend(line.strip() for line in f if line.strip())
+
+    if args.vocab and args.merges:
+        with open(args.vocab, "rb") as f:
+            token_to_id = pickle.load(f)
+        with open(args.merges, "rb") as f:
+            merges = pickle.load(f)
+    else:
+        print(f"Training {max(args.sizes)} merges on {len(lines)} lines...")
+        token_to_id, merges = train_bpe(lines, num_merges=max(args.sizes))
+    print(f"{len(merges)} merges available")
+
+    words = list(dict.fromkeys(w for line in lines for w in line.split()))[:args.words]
+
+    print(f"\n{'merges':>8} {'ordered us/word':>16} {'ranked us/word':>15} {'speedup':>8}")
+    for size in args.sizes:
+        if size > len(merges):
+            print(f"{size:>8}  (only {len(merges)} merges learned)")
+            continue
+        tok = BPETokenizer(token_to_id, merges[:size])
+        ranked = per_word_us(tok._apply_merges_to_word, words, args.repeat)
+        if size <= args.skip_ordered_above:
+            ordered = per_word_us(tok._apply_merges_in_order, words, 1)
+            print(f"{size:>8} {ordered:>16.1f} {ranked:>15.1f} {ordered / ranked:>7.1f}x")
+        else:
+            print(f"{size:>8} {'-':>16} {ranked:>15.1f} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+BPE training time: pure-Python loop vs the NumPy array backend.
+
+Lines are drawn (cycling) from the input files up to each size, both
+backends learn the same number of merges, and the outputs are checked to be
+identical before timings are reported.
+
+Usage:
+    python experiments/bench_bpe_train.py --lines 500 50000 1000000 --merges 2000
+    python experiments/bench_bpe_train.py --skip-python-above 50000
+"""
+import os
+import sys
+import time
+import argparse
+from itertools import cycle, islice
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+from bpe import train_bpe
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+DEFAULT_FILES = [os.path.join(ROOT, "data", "flores", "flores.eng_Latn"),
+                 os.path.join(ROOT, "data", "flores", "flores.tam_Taml")]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--path", nargs="+", default=DEFAULT_FILES)
+    ap.add_argument("--lines", type=int, nargs="+", default=[500, 50000, 1000000])
+    ap.add_argument("--merges", type=int, default=2000)
+    ap.add_argument("--skip-python-above", type=int, default=None,
+                    help="don't time the pure-Python trainer past this many lines")
+    args = ap.parse_args()
+
+    source = []
+    for path in args.path:
+        with open(path, "r", encoding="utf-8") as f:
+            source.extend(line.strip() for line in f if line.strip())
+
+    print(f"{'lines':>9} {'python s':>10} {'numpy s':>10} {'speedup':>8}  same")
+    for n in args.lines:
+        lines = list(islice(cycle(source), n))
+        fast, t_numpy = timed(lambda: train_bpe(lines, args.merges, backend="numpy"))
+        if args.skip_python_above is not None and n > args.skip_python_above:
+            print(f"{n:>9} {'-':>10} {t_numpy:>10.2f} {'-':>8}  -")
+            continue
+        slow, t_python = timed(lambda: train_bpe(lines, args.merges))
+        print(f"{n:>9} {t_python:>10.2f} {t_numpy:>10.2f} {t_python / t_numpy:>7.1f}x  {fast == slow}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Latency of encoding one very long document: SandhiBPETokenizer.encode vs
+encode_parallel on a process pool.
+
+The flores files are concatenated (and repeated) into a single document of
+the requested size, a small tokenizer is trained on them unless --vocab and
+--merges are given, and every parallel result is checked to be identical to
+the serial one. Pool start-up is timed separately from encoding, since a
+long-running caller keeps its pool (see parallel_encode_pool).
+
+Usage:
+    python experiments/bench_parallel_encode.py --chars 1000000 --workers 1 2 4 8
+    python experiments/bench_parallel_encode.py --vocab v.pkl --merges m.pkl --lang ta
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+from GPE_sandhi import (SandhiBPETokenizer, build_initial_vocab, covert_to_ids_train,
+                        load_tokenizer, train_merges)
+from telemetry import TrainingTelemetry
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+DEFAULT_FILES = [os.path.join(ROOT, "data", "flores", "flores.tam_Taml"),
+                 os.path.join(ROOT, "data", "flores", "flores.eng_Latn")]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--path", nargs="+", default=DEFAULT_FILES)
+    ap.add_argument("--chars", type=int, nargs="+", default=[100_000, 1_000_000])
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--piece-chars", type=int, default=1 << 16)
+    ap.add_argument("--lang", default="mix", choices=["mix", "ta", "en"])
+    ap.add_argument("--vocab", default=None)
+    ap.add_argument("--merges", default=None)
+    ap.add_argument("--train-merges", type=int, default=500)
+    args = ap.parse_args()
+
+    lines = []
+    for path in args.path:
+        with open(path, "r", encoding="utf-8") as f:
+            lines.extend(line.strip() for line in f if line.strip())
+    source = " ".join(lines)
+
+    if args.vocab and args.merges:
+        tok = load_tokenizer(args.vocab, args.merges, lang=args.lang)
+    else:
+        vocab, vocab_re = build_initial_vocab(lines, args.lang)
+        ids = covert_to_ids_train(lines, vocab_re, args.lang, flat=True)
+        quiet = TrainingTelemetry(console_interval=float("inf"))
+        vocab, merges, _ = train_merges(ids, vocab, args.train_merges, telemetry=quiet)
+        tok = SandhiBPETokenizer(vocab, merges, lang=args.lang)
+
+    print(f"{'chars':>9} {'workers':>7} {'pool s':>7} {'encode s':>9} {'speedup':>8}  same")
+    for n in args.chars:
+        doc = (source * (n // len(source) + 1))[:n]
+        tok.clear_cache()
+        serial, t_serial = timed(lambda: tok.encode(doc, return_tokens=False))
+        print(f"{n:>9} {'serial':>7} {'-':>7} {t_serial:>9.3f} {'1.0x':>8}  -")
+        for w in args.workers:
+            pool, t_pool = timed(lambda: tok.parallel_encode_pool(w))
+            with pool:
+                ids, t_enc = timed(lambda: tok.encode_parallel(
+                    doc, piece_chars=args.piece_chars, return_tokens=False, pool=pool))
+            print(f"{n:>9} {w:>7} {t_pool:>7.2f} {t_enc:>9.3f} {t_serial / t_enc:>7.1f}x  {ids == serial}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Load generator for core/tokenize_service.py.
+
+Starts the service in a subprocess on a temporary Unix socket, then for each
+client count opens that many connections, each sending flores lines as
+"encode" requests with up to --pipeline requests in flight. Reports
+throughput, client-side latency percentiles and the server's batching and
+queue-depth metrics, and checks every response against encoding locally.
+
+A small tokenizer is trained on the flores lines unless --vocab and --merges
+are given.
+
+Usage:
+    python experiments/bench_tokenize_service.py --clients 1 8 32 --workers 2 --window-ms 2
+    python experiments/bench_tokenize_service.py --vocab v.pkl --merges m.pkl --requests 2000
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+from GPE_sandhi import (build_initial_vocab, covert_to_ids_train, load_tokenizer,
+                        save_dict_to_pickle, train_merges)
+from telemetry import TrainingTelemetry
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+SERVICE = os.path.join(ROOT, "core", "tokenize_service.py")
+DEFAULT_FILES = [os.path.join(ROOT, "data", "flores", "flores.tam_Taml"),
+                 os.path.join(ROOT, "data", "flores", "flores.eng_Latn")]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def client(path, lines, pipeline, latencies):
+    reader, writer = await asyncio.open_unix_connection(path, limit=1 << 24)
+    window = asyncio.Semaphore(pipeline)
+    sent = {}
+
+    async def send():
+        for i, line in enumerate(lines):
+            await window.acquire()
+            sent[i] = time.perf_counter()
+            writer.write(json.dumps({"id": i, "text": line}, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+
+    sender = asyncio.create_task(send())
+    results = []
+    for _ in lines:
+        resp = json.loads(await reader.readline())
+        latencies.append((time.perf_counter() - sent[resp["id"]]) * 1000)
+        results.append(resp["ids"])
+        window.release()
+    await sender
+    writer.close()
+    return results
+
+
+async def metrics(path):
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(b'{"op": "metrics"}\n')
+    await writer.drain()
+    out = json.loads(await reader.readline())["metrics"]
+    writer.close()
+    return out
+
+
+async def run_level(path, lines, clients, per_client, pipeline):
+    latencies = []
+    jobs = [[lines[(c * per_client + i) % len(lines)] for i in range(per_client)] for c in range(clients)]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client(path, job, pipeline, latencies) for job in jobs))
+    elapsed = time.perf_counter() - start
+    return jobs, results, elapsed, sorted(latencies), await metrics(path)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--path", nargs="+", default=DEFAULT_FILES)
+    ap.add_argument("--vocab", default=None)
+    ap.add_argument("--merges", default=None)
+    ap.add_argument("--lang", default="mix", choices=["mix", "ta", "en"])
+    ap.add_argument("--train-merges", type=int, default=500)
+    ap.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--requests", type=int, default=500, help="requests per client")
+    ap.add_argument("--pipeline", type=int, default=8, help="requests in flight per client")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--window-ms", type=float, default=2.0)
+    ap.add_argument("--max-batch", type=int, default=256)
+    args = ap.parse_args()
+
+    lines = []
+    for path in args.path:
+        with open(path, "r", encoding="utf-8") as f:
+            lines.extend(line.strip() for line in f if line.strip())
+
+    tmp = tempfile.mkdtemp()
+    vocab_path, merges_path = args.vocab, args.merges
+    if not (vocab_path and merges_path):
+        vocab, vocab_re = build_initial_vocab(lines, args.lang)
+        ids = covert_to_ids_train(lines, vocab_re, args.lang, flat=True)
+        quiet = TrainingTelemetry(console_interval=float("inf"))
+        vocab, merges, _ = train_merges(ids, vocab, args.train_merges, telemetry=quiet)
+        vocab_path, merges_path = os.path.join(tmp, "vocab.pkl"), os.path.join(tmp, "merges.pkl")
+        save_dict_to_pickle(vocab, vocab_path)
+        save_dict_to_pickle(merges, merges_path)
+    local = load_tokenizer(vocab_path, merges_path, lang=args.lang)
+
+    sock = os.path.join(tmp, "tokenize.sock")
+    server = subprocess.Popen([sys.executable, SERVICE, "--vocab", vocab_path, "--merges", merges_path,
+                               "--lang", args.lang, "--unix", sock, "--workers", str(args.workers),
+                               "--window-ms", str(args.window_ms), "--max-batch", str(args.max_batch)])
+    try:
+        while not os.path.exists(sock):
+            if server.poll() is not None:
+                sys.exit("service exited before listening")
+            time.sleep(0.05)
+
+        print(f"{'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'batch':>6} {'max q':>6}  same")
+        for clients in args.clients:
+            jobs, results, elapsed, lat, m = asyncio.run(
+                run_level(sock, lines, clients, args.requests, args.pipeline))
+            same = all(local.encode(t, return_tokens=False) == ids
+                       for job, res in zip(jobs, results) for t, ids in zip(job, res))
+            total = clients * args.requests
+            print(f"{clients:>7} {total / elapsed:>9.0f} {percentile(lat, 0.5):>8.2f} "
+                  f"{percentile(lat, 0.95):>8.2f} {percentile(lat, 0.99):>8.2f} "
+                  f"{m['mean_batch_size']:>6.1f} {m['max_queue_depth']:>6}  {same}")
+        print("server latency histogram (ms, cumulative over all levels):")
+        print("  " + json.dumps(m["latency_ms_histogram"]))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
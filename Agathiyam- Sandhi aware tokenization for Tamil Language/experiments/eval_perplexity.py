@@ -69,12 +69,12 @@ class CustomTokenizerWrapper:
         self.total_tokens = 0
 
     def __call__(self, text, return_tensors=None):
-        # Custom tokenizer segmentation
-        tokens, ids = self.tok.encode(text)
+        # Custom tokenizer segmentation (only the count is needed)
+        num_tokens = self.tok.count_tokens(text)
 
         # Track fertility/compression stats
         self.total_chars += len(text)
-        self.total_tokens += len(ids)
+        self.total_tokens += num_tokens
 
         # Use Gemma tokenizer output for the model
         return self.base(text, return_tensors=return_tensors)
@@ -0,0 +1,149 @@
+"""
+Memory of N forked Sandhi-GPE workers: plain dicts vs frozen (mmap) tables.
+
+For each mode and worker count the parent loads the tokenizer, forks N
+workers that each encode the same lines and run a full GC pass, and then
+reads every worker's /proc/<pid>/smaps_rollup while all of them are alive.
+USS (private pages) is what each worker really costs; PSS shares pages
+between the processes mapping them.
+
+Modes:
+    dict         unpickled dicts, forked as they are
+    dict+freeze  the same after gc.freeze() in the parent
+    frozen       tables from frozen_tables (mmap), after gc.freeze()
+
+Without --vocab/--merges a small model is trained on flores and padded with
+--pad-merges synthetic merges so the tables have a realistic size. Linux only.
+
+Usage:
+    python experiments/measure_worker_memory.py --workers 1 2 4 8 16
+    python experiments/measure_worker_memory.py --vocab models/vocab.pkl --merges models/merges.pkl
+"""
+import os
+import sys
+import gc
+import random
+import tempfile
+import argparse
+import multiprocessing as mp
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+from GPE_sandhi import (SandhiBPETokenizer, build_initial_vocab, covert_to_ids_train,
+                        load_frozen_tokenizer, load_tokenizer, train_merges)
+from frozen_tables import freeze_gc, write_frozen
+from telemetry import TrainingTelemetry
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+DEFAULT_FILES = [os.path.join(ROOT, "data", "flores", "flores.tam_Taml"),
+                 os.path.join(ROOT, "data", "flores", "flores.eng_Latn")]
+MODES = ("dict", "dict+freeze", "frozen")
+
+
+def smaps_rollup(pid):
+    """(pss, uss) in MiB from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return fields.get("Pss", 0) / 1024, uss / 1024
+
+
+def worker(tok, lines, ready, done):
+    for line in lines:
+        tok.encode(line, return_tokens=False)
+    gc.collect()
+    ready.wait()
+    done.wait()
+
+
+def padded_model(lines, lang, train_merges_n, pad_merges, seed=0):
+    vocab, vocab_re = build_initial_vocab(lines, lang)
+    ids = covert_to_ids_train(lines, vocab_re, lang, flat=True)
+    quiet = TrainingTelemetry(console_interval=float("inf"))
+    vocab, merges, _ = train_merges(ids, vocab, train_merges_n, telemetry=quiet)
+    rng = random.Random(seed)
+    known = list(vocab)
+    next_id = max(vocab) + 1
+    while pad_merges > 0:
+        a, b = rng.choice(known), rng.choice(known)
+        token = vocab[a] + vocab[b]
+        if (a, b) in merges or len(token) > 24:
+            continue
+        merges[(a, b)] = next_id
+        vocab[next_id] = token
+        known.append(next_id)
+        next_id += 1
+        pad_merges -= 1
+    return vocab, merges
+
+
+def measure(make_tok, mode, n, lines):
+    tok = make_tok(mode)
+    if mode != "dict":
+        freeze_gc()
+    ctx = mp.get_context("fork")
+    ready, done = ctx.Barrier(n + 1), ctx.Barrier(n + 1)
+    procs = [ctx.Process(target=worker, args=(tok, lines, ready, done)) for _ in range(n)]
+    for p in procs:
+        p.start()
+    ready.wait()
+    usage = [smaps_rollup(p.pid) for p in procs]
+    done.wait()
+    for p in procs:
+        p.join()
+    gc.unfreeze()
+    del tok
+    gc.collect()
+    return sum(p for p, _ in usage), sum(u for _, u in usage)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--path", nargs="+", default=DEFAULT_FILES)
+    ap.add_argument("--vocab", default=None)
+    ap.add_argument("--merges", default=None)
+    ap.add_argument("--lang", default="mix", choices=["mix", "ta", "en"])
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--lines", type=int, default=200, help="lines each worker encodes")
+    ap.add_argument("--train-merges", type=int, default=200)
+    ap.add_argument("--pad-merges", type=int, default=100_000)
+    ap.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    args = ap.parse_args()
+
+    lines = []
+    for path in args.path:
+        with open(path, "r", encoding="utf-8") as f:
+            lines.extend(line.strip() for line in f if line.strip())
+
+    if args.vocab and args.merges:
+        base = load_tokenizer(args.vocab, args.merges, lang=args.lang)
+        vocab, merges = base.vocab, base.merges
+    else:
+        vocab, merges = padded_model(lines, args.lang, args.train_merges, args.pad_merges)
+    frozen_path = os.path.join(tempfile.mkdtemp(), "model.frozen")
+    write_frozen(frozen_path, vocab, merges)
+    print(f"vocab {len(vocab):,}  merges {len(merges):,}  frozen file "
+          f"{os.path.getsize(frozen_path) / 2**20:.1f} MiB")
+
+    def make_tok(mode):
+        if mode == "frozen":
+            tok = load_frozen_tokenizer(frozen_path, args.lang)
+        else:
+            tok = SandhiBPETokenizer(dict(vocab), dict(merges), lang=args.lang)
+        tok.cache_size = 0  # measure the tables, not each worker's run cache
+        return tok
+
+    sample = lines[:args.lines]
+    print(f"{'mode':<12} {'workers':>7} {'PSS MiB':>9} {'USS MiB':>9} {'USS/worker':>11}")
+    for mode in args.modes:
+        for n in args.workers:
+            pss, uss = measure(make_tok, mode, n, sample)
+            print(f"{mode:<12} {n:>7} {pss:>9.1f} {uss:>9.1f} {uss / n:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+What input normalization (core/normalize.py) changes on a corpus.
+
+Reports, for the corpus as it is and for a copy with typical input noise
+(--perturb: o/oo/au signs decomposed, ZWJ inside sign pairs, VS16 after
+Tamil letters):
+
+    - lines already normalized (the check-only fast path) and lines changed
+    - normalize() throughput
+    - <UNK> rate and run-cache hit rate of SandhiBPETokenizer with
+      normalize=False vs normalize=True
+
+A small tokenizer is trained on the corpus unless --vocab and --merges are
+given (training always normalizes, so the vocab holds canonical forms).
+
+Usage:
+    python experiments/normalization_report.py
+    python experiments/normalization_report.py --path corpus.txt --vocab v.pkl --merges m.pkl --lang ta
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+from GPE_sandhi import (SandhiBPETokenizer, build_initial_vocab, covert_to_ids_train,
+                        load_tokenizer, train_merges)
+from normalize import is_normalized, normalize
+from telemetry import TrainingTelemetry
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+DEFAULT_FILES = [os.path.join(ROOT, "data", "flores", "flores.tam_Taml"),
+                 os.path.join(ROOT, "data", "flores", "flores.eng_Latn")]
+# precomposed sign -> spellings seen in the wild
+DECOMPOSED = {"\u0BCA": ["\u0BC6\u0BBE", "\u0BC6\u200D\u0BBE"],
+              "\u0BCB": ["\u0BC7\u0BBE", "\u0BC7\u200D\u0BBE"],
+              "\u0BCC": ["\u0BC6\u0BD7"]}
+
+
+def perturb(line, rate, rng):
+    out = []
+    for ch in line:
+        if ch in DECOMPOSED and rng.random() < rate:
+            out.append(rng.choice(DECOMPOSED[ch]))
+        elif "\u0B95" <= ch <= "\u0BB9" and rng.random() < rate / 10:
+            out.append(ch + "\uFE0F")
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def encode_stats(tok, lines):
+    unk = total = 0
+    for line in lines:
+        ids = tok.encode(line, return_tokens=False)
+        total += len(ids)
+        unk += ids.count(tok.vocab_re.get("<UNK>"))
+    return unk / max(total, 1), tok.cache_info()["hit_rate"], total
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--path", nargs="+", default=DEFAULT_FILES)
+    ap.add_argument("--vocab", default=None)
+    ap.add_argument("--merges", default=None)
+    ap.add_argument("--lang", default="mix", choices=["mix", "ta", "en"])
+    ap.add_argument("--train-merges", type=int, default=500)
+    ap.add_argument("--perturb", type=float, default=0.3,
+                    help="share of o/oo/au signs respelled in the noisy copy")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    lines = []
+    for path in args.path:
+        with open(path, "r", encoding="utf-8") as f:
+            lines.extend(line.strip() for line in f if line.strip())
+
+    if args.vocab and args.merges:
+        base = load_tokenizer(args.vocab, args.merges, lang=args.lang)
+        vocab, merges = base.vocab, base.merges
+    else:
+        vocab, vocab_re = build_initial_vocab(lines, args.lang)
+        ids = covert_to_ids_train(lines, vocab_re, args.lang, flat=True)
+        quiet = TrainingTelemetry(console_interval=float("inf"))
+        vocab, merges, _ = train_merges(ids, vocab, args.train_merges, telemetry=quiet)
+
+    rng = random.Random(args.seed)
+    corpora = {"corpus": lines, f"perturbed({args.perturb})": [perturb(l, args.perturb, rng) for l in lines]}
+    chars = sum(len(l) for l in lines)
+    print(f"{len(lines):,} lines, {chars:,} chars, vocab {len(vocab):,}, merges {len(merges):,}")
+    print(f"{'input':<16} {'normalized':>10} {'changed':>8} {'MB/s':>7}  "
+          f"{'UNK% raw':>9} {'UNK% norm':>9}  {'hit% raw':>8} {'hit% norm':>9}  {'ids raw':>9} {'ids norm':>9}")
+    for name, texts in corpora.items():
+        already = sum(map(is_normalized, texts))
+        changed = sum(normalize(t) != t for t in texts)
+        start = time.perf_counter()
+        for t in texts:
+            normalize(t)
+        mbps = sum(len(t.encode("utf-8")) for t in texts) / 2**20 / (time.perf_counter() - start)
+        stats = {}
+        for flag in (False, True):
+            tok = SandhiBPETokenizer(dict(vocab), merges, lang=args.lang, normalize=flag)
+            stats[flag] = encode_stats(tok, texts)
+        (u0, h0, n0), (u1, h1, n1) = stats[False], stats[True]
+        print(f"{name:<16} {already:>10,} {changed:>8,} {mbps:>7.1f}  "
+              f"{100 * u0:>9.3f} {100 * u1:>9.3f}  {100 * h0:>8.2f} {100 * h1:>9.2f}  {n0:>9,} {n1:>9,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,10 @@ BEFORE and AFTER Sandhi boundary removal.
 """
 
 import numpy as np
-import grapheme
+from GPE.tamil_graphemes import length as grapheme_length
 from GPE.sandhi import sandhi_mark, remove_boundaries
 from GPE.GPE_sandhi import load_tokenizer
+from GPE.encode_cache import EncodeCache
 
 
 # -------------------------------------------------
@@ -14,7 +15,7 @@ from GPE.GPE_sandhi import load_tokenizer
 # -------------------------------------------------
 
 def fertility(text, num_tokens):
-    L = grapheme.length(text)
+    L = grapheme_length(text)
     return num_tokens / L if L > 0 else 0.0
 
 
@@ -36,6 +37,15 @@ def sandhi_gpe_encode(text, tokenizer, apply_sandhi=False):
     return tokens
 
 
+def sandhi_gpe_count(text, tokenizer, apply_sandhi=False):
+    """Number of Sandhi-GPE ids for `text`, same guidance as sandhi_gpe_encode."""
+    if apply_sandhi:
+        text = sandhi_mark(text, lang="ta")
+        text = remove_boundaries(text)
+
+    return tokenizer.count_tokens(text)
+
+
 # -------------------------------------------------
 # Compute average fertility on a corpus
 # -------------------------------------------------
@@ -44,9 +54,11 @@ def compute_avg_fertility(
     file_path,
     tokenizer,
     apply_sandhi=False,
-    max_lines=None
+    max_lines=None,
+    cache=None
 ):
-    fertilities = []
+    """cache: optional EncodeCache for `tokenizer`, counts are read from it."""
+    texts = []
 
     with open(file_path, encoding="utf-8") as f:
         for i, line in enumerate(f):
@@ -57,13 +69,21 @@ def compute_avg_fertility(
             if not text:
                 continue
 
-            tokens = sandhi_gpe_encode(
-                text,
-                tokenizer,
-                apply_sandhi=apply_sandhi
-            )
+            texts.append(text)
 
-            fertilities.append(fertility(text, len(tokens)))
+    if cache is not None:
+        guided = [
+            remove_boundaries(sandhi_mark(t, lang="ta")) if apply_sandhi else t
+            for t in texts
+        ]
+        counts = cache.count_tokens_batch(guided)
+    else:
+        counts = [
+            sandhi_gpe_count(t, tokenizer, apply_sandhi=apply_sandhi)
+            for t in texts
+        ]
+
+    fertilities = [fertility(t, n) for t, n in zip(texts, counts)]
 
     avg_fertility = np.mean(fertilities) if fertilities else 0.0
 
@@ -90,18 +110,23 @@ if __name__ == "__main__":
         "tokenizers-coling2025-main/merges.pkl"
     )
 
+    # re-runs on an unchanged model read token counts back from disk
+    cache = EncodeCache("encode_cache.sqlite", sandhi_tok)
+
     print("\nComputing fertility on 3M-word corpus...\n")
 
     # 1️⃣ Fertility BEFORE Sandhi boundary guidance
     compute_avg_fertility(
         file_path=file_path,
         tokenizer=sandhi_tok,
-        apply_sandhi=False
+        apply_sandhi=False,
+        cache=cache
     )
 
     # 2️⃣ Fertility AFTER Sandhi boundary guidance
     compute_avg_fertility(
         file_path=file_path,
         tokenizer=sandhi_tok,
-        apply_sandhi=True
+        apply_sandhi=True,
+        cache=cache
     )
\ No newline at end of file
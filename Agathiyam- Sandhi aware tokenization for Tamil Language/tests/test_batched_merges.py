@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Batched Merges
+==============
+
+select_merge_batch must pick disjoint pairs above the tolerance floor and
+under the max_batch_pairs cap, merge_many and FlatCorpus.merge_pairs must
+apply a batch like one merge per pair, and batched train_merges must honour
+the cap and min_frequency on every corpus backend.
+"""
+
+import os
+import random
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from flat_corpus import FlatCorpus
+from GPE_sandhi import get_stats, merge, merge_many, select_merge_batch, train_merges
+from telemetry import TrainingTelemetry, load_telemetry
+
+
+def random_chunks(rng, n, alphabet=8):
+    return [[rng.randrange(alphabet) for _ in range(rng.randrange(12))] for _ in range(n)]
+
+
+def test_select_merge_batch():
+    stats = {(0, 1): 10, (1, 2): 9, (3, 4): 9, (5, 6): 8, (7, 8): 7}
+    assert select_merge_batch(stats) == [(0, 1)]
+    # (1, 2) shares 1 with the top pair; (7, 8) is below the floor of 8
+    assert select_merge_batch(stats, 0.2, max_pairs=8) == [(0, 1), (3, 4), (5, 6)]
+    assert select_merge_batch(stats, 0.2, max_pairs=2) == [(0, 1), (3, 4)]
+    assert select_merge_batch(stats, 0.5, max_pairs=8, min_frequency=9) == [(0, 1), (3, 4)]
+    assert select_merge_batch(stats, 0.5, max_pairs=8, min_frequency=11) == []
+    assert select_merge_batch(stats, min_frequency=11) == []
+
+    rng = random.Random(0)
+    for _ in range(300):
+        stats = {(rng.randrange(10), rng.randrange(10)): rng.randrange(1, 50) for _ in range(30)}
+        tolerance, max_pairs = rng.choice([0.1, 0.3, 0.9]), rng.randrange(1, 6)
+        min_frequency = rng.randrange(1, 30)
+        picked = select_merge_batch(stats, tolerance, max_pairs, min_frequency)
+        top = max(stats, key=stats.get)
+        if stats[top] < min_frequency:
+            assert picked == []
+            continue
+        assert picked[0] == top
+        assert len(picked) <= max_pairs
+        for k, pair in enumerate(picked):
+            assert not set(pair) & {s for other in picked[:k] for s in other}
+        floor = max(min_frequency, stats[top] * (1 - tolerance))
+        assert all(stats[pair] >= floor for pair in picked)
+
+
+def test_merge_many_and_flat_merge_pairs_match_single_merges(monkeypatch):
+    import flat_corpus
+
+    rng = random.Random(1)
+    for n in range(200):
+        monkeypatch.setattr(flat_corpus, "BLOCK_SYMBOLS", 1 + n % 5 if n % 2 else 1 << 20)
+        chunks = random_chunks(rng, rng.randrange(1, 8), alphabet=4)
+        stats = {}
+        for c in chunks:
+            get_stats(c, stats)
+        batch = select_merge_batch(stats, 1.0, max_pairs=4)
+        if not batch:
+            continue
+        pair_to_idx = {pair: 100 + k for k, pair in enumerate(batch)}
+        expected = []
+        for c in chunks:
+            for pair, idx in pair_to_idx.items():
+                c = merge(c, pair, idx)
+            expected.append(c)
+        assert [merge_many(c, pair_to_idx) for c in chunks] == expected
+        flat = FlatCorpus.from_chunks(chunks)
+        touched = flat.merge_pairs(pair_to_idx)
+        assert flat.to_chunks() == expected
+        assert touched == sum(a != b for a, b in zip(chunks, expected))
+
+
+def _train(ids, num_merges, path, **options):
+    vocab = {i: chr(ord('a') + i) for i in range(8)}
+    with TrainingTelemetry(path, console_interval=float("inf")) as telemetry:
+        _, merges, ids = train_merges(ids, vocab, num_merges, telemetry=telemetry, **options)
+    return merges, ids, load_telemetry(path)
+
+
+def test_train_merges_batched(tmp_path):
+    rng = random.Random(2)
+    chunks = random_chunks(rng, 300)
+    options = dict(batch_tolerance=0.5, max_batch_pairs=3)
+    merges, ids, records = _train([list(c) for c in chunks], 40, str(tmp_path / "lists.jsonl"),
+                                  **options)
+    assert len(merges) == 40
+    passes = Counter(r["corpus_pass"] for r in records)
+    assert max(passes.values()) <= 3
+    assert len(passes) < 40                 # several merges shared a pass
+    merges_flat, ids_flat, _ = _train(FlatCorpus.from_chunks(chunks), 40,
+                                      str(tmp_path / "flat.jsonl"), **options)
+    assert list(merges_flat.items()) == list(merges.items())
+    assert ids_flat.to_chunks() == ids
+
+    # exact mode: one merge per pass
+    _, _, records = _train(FlatCorpus.from_chunks(chunks), 10, str(tmp_path / "exact.jsonl"))
+    assert [r["corpus_pass"] for r in records] == list(range(1, 11))
+
+
+def test_train_merges_stops_below_min_frequency(tmp_path, capsys):
+    rng = random.Random(3)
+    chunks = random_chunks(rng, 200)
+    for options in ({}, {"batch_tolerance": 0.3, "max_batch_pairs": 4}):
+        merges, _, records = _train(FlatCorpus.from_chunks(chunks), 500,
+                                    str(tmp_path / f"min_{len(options)}.jsonl"),
+                                    min_frequency=20, **options)
+        assert 0 < len(merges) < 500
+        assert all(r["freq"] >= 20 for r in records)
+        assert "below min_frequency=20" in capsys.readouterr().out
+    # exact mode: the threshold only cuts the run short
+    merges, _, _ = _train(FlatCorpus.from_chunks(chunks), 500, str(tmp_path / "min.jsonl"),
+                          min_frequency=20)
+    unbounded, _, _ = _train(FlatCorpus.from_chunks(chunks), len(merges), str(tmp_path / "all.jsonl"))
+    assert list(unbounded.items()) == list(merges.items())
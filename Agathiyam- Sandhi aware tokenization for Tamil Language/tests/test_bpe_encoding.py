@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+BPE Encoding Equivalence
+========================
+
+The rank-indexed encoder in BPETokenizer must give exactly what applying
+every merge in order gives.
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from bpe import BPETokenizer, train_bpe
+
+SAMPLE = [
+    "நான் இன்று பள்ளிக்கு செல்கிறேன்.",
+    "அவள் புத்தகம் படிக்கிறாள்.",
+    "The quick brown fox jumps over the lazy dog",
+    "தமிழ் ஒரு செழுமையான மொழி",
+]
+
+
+def test_ranked_matches_ordered_on_trained_merges():
+    token_to_id, merges = train_bpe(SAMPLE * 3, num_merges=60)
+    tok = BPETokenizer(token_to_id, merges)
+    for line in SAMPLE:
+        for word in line.split():
+            assert tok._apply_merges_to_word(word) == tok._apply_merges_in_order(word)
+
+
+def test_ranked_matches_ordered_on_arbitrary_merges():
+    # hand-made lists may repeat pairs or produce one string two ways
+    rng = random.Random(0)
+    for _ in range(500):
+        merges = [("".join(rng.choice("abc") for _ in range(rng.randint(1, 2))),
+                   "".join(rng.choice("abc") for _ in range(rng.randint(1, 2))))
+                  for _ in range(10)]
+        tok = BPETokenizer({}, merges)
+        for _ in range(10):
+            word = "".join(rng.choice("abc") for _ in range(rng.randint(1, 9)))
+            assert tok._apply_merges_to_word(word) == tok._apply_merges_in_order(word)
+
+
+def test_word_cache_and_batch_match_uncached():
+    token_to_id, merges = train_bpe(SAMPLE * 3, num_merges=60)
+    plain = BPETokenizer(token_to_id, merges, cache_size=0)
+    cached = BPETokenizer(token_to_id, merges, cache_size=8)
+    texts = SAMPLE + ["  padded   text  ", "", "the the the"] + SAMPLE
+    expected = [plain.encode(t) for t in texts]
+    assert [cached.encode(t) for t in texts] == expected
+    assert cached.encode_batch(texts) == expected
+    info = cached.cache_info()
+    assert info["hits"] > 0 and info["size"] == 8
+    assert plain.cache_info()["size"] == 0
+
+
+def test_count_tokens_matches_encode():
+    from gpe import GPETokenizer, train_gpe
+
+    token_to_id, merges = train_bpe(SAMPLE * 3, num_merges=60)
+    gpe_vocab, gpe_merges = train_gpe(SAMPLE, num_merges=30)
+    texts = SAMPLE + ["  padded   text  ", "", "the the the"]
+    for tok in (BPETokenizer(token_to_id, merges), GPETokenizer(gpe_vocab, gpe_merges)):
+        expected = [len(tok.encode(t)[1]) for t in texts]
+        assert [tok.count_tokens(t) for t in texts] == expected
+        assert tok.count_tokens_batch(texts) == expected
+
+
+def test_offsets_cover_words_and_spaces():
+    from gpe import GPETokenizer, train_gpe
+
+    token_to_id, merges = train_bpe(SAMPLE * 3, num_merges=60)
+    gpe_vocab, gpe_merges = train_gpe(SAMPLE, num_merges=30)
+    texts = SAMPLE + ["  padded   text  ", "", "the\tthe\nthe"]
+    for tok in (BPETokenizer(token_to_id, merges), GPETokenizer(gpe_vocab, gpe_merges)):
+        for text in texts:
+            tokens, ids, (starts, ends) = tok.encode(text, return_offsets=True)
+            assert ids == tok.encode(text)[1] and len(starts) == len(ends) == len(ids)
+            for token, s, e in zip(tokens, starts, ends):
+                if token == "<SPACE>":
+                    assert text[s:e].isspace()
+                else:
+                    assert text[s:e] == token.replace("</w>", "")
+        ids, (starts, ends) = tok.encode(SAMPLE[0], return_tokens=False, out="numpy", return_offsets=True)
+        assert starts.dtype == ends.dtype == "int32" and ends[-1] == len(SAMPLE[0].rstrip())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Persistent Encode Cache
+=======================
+
+EncodeCache must give the tokenizer's own ids, serve a second run from disk,
+never mix up tokenizers and keep its size under the cap.
+"""
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from bpe import BPETokenizer, train_bpe
+from encode_cache import EncodeCache, tokenizer_fingerprint
+from gpe import GPETokenizer, train_gpe
+from test_sandhi_encoding import make_tokenizer, sample_texts
+
+SAMPLE = [
+    "நான் இன்று பள்ளிக்கு செல்கிறேன்.",
+    "அவள் புத்தகம் படிக்கிறாள்.",
+    "The quick brown fox jumps over the lazy dog",
+    "தமிழ் ஒரு செழுமையான மொழி",
+]
+
+
+def test_cache_matches_encode_across_runs(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    token_to_id, merges = train_bpe(SAMPLE * 3, num_merges=60)
+    gpe_vocab, gpe_merges = train_gpe(SAMPLE, num_merges=30)
+    texts = sample_texts(n=120) + SAMPLE + SAMPLE + [""]
+    for tok in (BPETokenizer(token_to_id, merges), GPETokenizer(gpe_vocab, gpe_merges),
+                make_tokenizer("mix"), make_tokenizer("ta")):
+        expected = [tok.encode(t, return_tokens=False) for t in texts]
+        with EncodeCache(path, tok, batch_size=7) as cache:
+            assert cache.encode_batch(texts) == expected
+            assert cache.cache_info()["misses"] == len(set(texts))
+        with EncodeCache(path, tok, batch_size=7) as cache:
+            assert cache.count_tokens_batch(texts) == [len(ids) for ids in expected]
+            assert cache.encode_batch(texts) == expected
+            assert cache.cache_info()["misses"] == 0
+
+
+def test_fingerprint_tracks_model_and_rules():
+    tok = make_tokenizer("ta")
+    fp = tokenizer_fingerprint(tok)
+    tok.encode("\U0001F600")                       # adds <UNK> on first use
+    assert tokenizer_fingerprint(tok) == fp
+    assert tokenizer_fingerprint(make_tokenizer("mix")) != fp
+    assert tokenizer_fingerprint(make_tokenizer("ta", num_merges=20)) != fp
+
+
+def test_size_cap_evicts_least_recently_used(tmp_path):
+    tok = make_tokenizer("mix")
+    texts = sample_texts(n=200, seed=4)
+    with EncodeCache(str(tmp_path / "cache.sqlite"), tok, max_entries=50) as cache:
+        for start in range(0, len(texts), 10):
+            cache.encode_batch(texts[:5] + texts[start:start + 10])
+        assert cache.cache_info()["size"] <= 50
+        hits = cache.hits
+        cache.encode_batch(texts[:5])              # used by every batch, so still stored
+        assert cache.hits == hits + len(set(texts[:5]))
+
+
+def test_guarded_tokenizers_do_not_share_entries(tmp_path):
+    from GPE_sandhi import SandhiBPETokenizer
+
+    path = str(tmp_path / "cache.sqlite")
+    tok = make_tokenizer("mix")
+    texts = sample_texts(n=40, seed=5) + [" ".join(SAMPLE) * 3]
+    with EncodeCache(path, tok) as cache:
+        cache.encode_batch(texts)
+    for options in ({"degraded": True}, {"max_input_chars": 3}, {"rule_timeout": 1e-9}):
+        guarded = SandhiBPETokenizer(dict(tok.vocab), tok.merges, lang="mix", **options)
+        assert tokenizer_fingerprint(guarded) != tokenizer_fingerprint(tok)
+        expected = [guarded.encode(t, return_tokens=False) for t in texts]
+        for _ in range(2):
+            with EncodeCache(path, guarded) as cache:
+                assert cache.encode_batch(texts) == expected
+                hits = cache.cache_info()["hits"]
+        # a rule timeout depends on wall-clock time: nothing is stored or reused
+        assert hits == (0 if "rule_timeout" in options else len(set(texts)))
+
+
+def _assert_oov_same_with_cache(tmp_path, tok):
+    pytest.importorskip("pandas")
+    from oov import compute_oov_token_level
+
+    test_file = tmp_path / "test.txt"
+    test_file.write_text("\n".join(sample_texts(n=60, seed=6) + SAMPLE), encoding="utf-8")
+    uncached = compute_oov_token_level(str(test_file), tok)
+    for _ in range(2):                      # cold, then served from disk
+        with EncodeCache(str(tmp_path / "cache.sqlite"), tok) as cache:
+            assert compute_oov_token_level(str(test_file), tok, cache) == uncached
+    return uncached
+
+
+def test_oov_ratio_same_with_cache(tmp_path):
+    tok = make_tokenizer("mix")
+    tok.unk_id = tok.encode(SAMPLE[0], return_tokens=False)[0]    # any id that occurs
+    assert _assert_oov_same_with_cache(tmp_path, tok) > 0
+
+
+def test_sentencepiece_oov_ratio_same_with_cache(tmp_path):
+    spm = pytest.importorskip("sentencepiece")
+    model = io.BytesIO()
+    spm.SentencePieceTrainer.train(sentence_iterator=iter(sample_texts(n=200, seed=7)),
+                                   model_writer=model, vocab_size=80, character_coverage=0.98)
+    sp = spm.SentencePieceProcessor(model_proto=model.getvalue())
+    texts = sample_texts(n=20, seed=8)
+    with EncodeCache(str(tmp_path / "ids.sqlite"), sp) as cache:
+        assert cache.encode_batch(texts) == [sp.encode(t) for t in texts]
+    _assert_oov_same_with_cache(tmp_path, sp)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Flat Corpus Equivalence
+=======================
+
+Checks that the array-backed FlatCorpus and the on-disk ShardedCorpus count
+and merge pairs exactly like the list-of-lists training paths.
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from bpe import train_bpe
+from external_corpus import ShardedCorpus
+from flat_corpus import FlatCorpus
+from GPE_sandhi import get_stats, merge, train_merges
+from telemetry import TrainingTelemetry
+
+
+def random_chunks(rng, alphabet=4):
+    return [[rng.randrange(alphabet) for _ in range(rng.randrange(9))]
+            for _ in range(rng.randrange(7))]
+
+
+def test_pair_stats_and_merge_match_lists(monkeypatch):
+    import flat_corpus
+
+    rng = random.Random(0)
+    for n in range(300):
+        # tiny blocks: pairs, runs and chunk edges fall on block boundaries
+        monkeypatch.setattr(flat_corpus, "BLOCK_SYMBOLS", 1 + n % 4 if n % 2 else 1 << 20)
+        chunks = random_chunks(rng)
+        flat = FlatCorpus.from_chunks(chunks)
+        stats = {}
+        for c in chunks:
+            get_stats(c, stats)
+        flat_stats = flat.pair_stats()
+        assert flat_stats == stats
+        if not stats:
+            continue
+        # same winner, same tie-breaking
+        pair = max(stats, key=stats.get)
+        assert next(iter(flat_stats)) == pair
+        flat.merge_pairs({pair: 99})
+        assert flat.to_chunks() == [merge(c, pair, 99) for c in chunks]
+
+
+def test_train_merges_flat_equals_lists(monkeypatch):
+    import flat_corpus
+
+    rng = random.Random(1)
+    chunks = [random_chunks(rng, alphabet=6) for _ in range(40)]
+    chunks = [c for group in chunks for c in group]
+    vocab = {i: chr(ord('a') + i) for i in range(6)}
+    quiet = TrainingTelemetry(console_interval=float("inf"))
+    _, merges_list, ids_list = train_merges([list(c) for c in chunks], dict(vocab), 30,
+                                            telemetry=quiet)
+    for block in (1 << 20, 7):
+        monkeypatch.setattr(flat_corpus, "BLOCK_SYMBOLS", block)
+        _, merges_flat, ids_flat = train_merges(FlatCorpus.from_chunks(chunks), dict(vocab), 30,
+                                                telemetry=quiet)
+        assert list(merges_flat.items()) == list(merges_list.items())
+        assert ids_flat.to_chunks() == ids_list
+
+
+def test_sharded_corpus_matches_flat():
+    rng = random.Random(2)
+    chunks = [c for _ in range(400) for c in random_chunks(rng, alphabet=6)]
+    vocab = {i: chr(ord('a') + i) for i in range(6)}
+    quiet = TrainingTelemetry(console_interval=float("inf"))
+    _, merges_flat, ids_flat = train_merges(FlatCorpus.from_chunks(chunks), dict(vocab), 25,
+                                            telemetry=quiet)
+    with tempfile.TemporaryDirectory() as workdir:
+        # memory_limit_mb=0 forces the smallest shards, i.e. several of them
+        sharded = ShardedCorpus.from_chunks(chunks, workdir, memory_limit_mb=0)
+        assert len(sharded.shards) > 1
+        _, merges_ext, ids_ext = train_merges(sharded, dict(vocab), 25, telemetry=quiet)
+        assert list(merges_ext.items()) == list(merges_flat.items())
+        assert ids_ext.to_chunks() == ids_flat.to_chunks()
+
+
+def test_train_bpe_external_matches_in_memory():
+    rng = random.Random(3)
+    words = ["".join(rng.choice("abcde") for _ in range(rng.randrange(1, 7))) for _ in range(3000)]
+    corpus = [" ".join(words[i:i + 10]) for i in range(0, len(words), 10)]
+    expected = train_bpe(corpus, num_merges=40)
+    with tempfile.TemporaryDirectory() as workdir:
+        assert train_bpe(corpus, num_merges=40, external_dir=workdir, memory_limit_mb=0) == expected
+
+
+def test_train_bpe_numpy_backend_matches_python(monkeypatch):
+    import flat_corpus
+
+    rng = random.Random(4)
+    for n in range(5):
+        # weighted counts must add up across blocks too
+        monkeypatch.setattr(flat_corpus, "BLOCK_SYMBOLS", 1 << 20 if n % 2 else 11)
+        words = ["".join(rng.choice("abcab") for _ in range(rng.randrange(1, 8))) for _ in range(800)]
+        corpus = [" ".join(words[i:i + 8]) for i in range(0, len(words), 8)]
+        assert train_bpe(corpus, num_merges=50, backend="numpy") == train_bpe(corpus, num_merges=50)
+
+
+def test_sharded_resume_replays_journal():
+    import pickle
+
+    rng = random.Random(5)
+    chunks = [c for _ in range(300) for c in random_chunks(rng, alphabet=6)]
+    vocab = {i: chr(ord('a') + i) for i in range(6)}
+    quiet = TrainingTelemetry(console_interval=float("inf"))
+    with tempfile.TemporaryDirectory() as straight_dir, tempfile.TemporaryDirectory() as workdir:
+        sharded = ShardedCorpus.from_chunks(chunks, straight_dir, memory_limit_mb=0)
+        _, merges_ref, ids_ref = train_merges(sharded, dict(vocab), 30, telemetry=quiet)
+
+        # crash after 25 merges: the last checkpoint (20) is older than the shards
+        checkpoint = os.path.join(workdir, "checkpoint.pkl")
+        sharded = ShardedCorpus.from_chunks(chunks, os.path.join(workdir, "corpus"), memory_limit_mb=0)
+        train_merges(sharded, dict(vocab), 25, checkpoint_path=checkpoint, checkpoint_every=10,
+                     telemetry=quiet)
+        with open(checkpoint, "rb") as f:
+            state = pickle.load(f)
+        assert state["iteration"] == 20 and len(state["merges"]) == 20
+        start = state["ids"].replay(state["vocab"], state["merges"], state["iteration"])
+        assert start == 25 and len(state["merges"]) == 25
+        _, merges_res, ids_res = train_merges(state["ids"], state["vocab"], 30, merges=state["merges"],
+                                              start_iter=start, telemetry=quiet)
+        assert list(merges_res.items()) == list(merges_ref.items())
+        assert ids_res.to_chunks() == ids_ref.to_chunks()
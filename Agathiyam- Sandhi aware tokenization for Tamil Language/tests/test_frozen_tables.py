@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Frozen Tables
+=============
+
+The memory-mapped tables must behave like the dicts they replace, and a
+tokenizer over them must encode and decode exactly like the plain one.
+"""
+
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from frozen_tables import FrozenTables, write_frozen
+from GPE_sandhi import load_frozen_tokenizer, load_tokenizer
+from test_sandhi_encoding import make_tokenizer, sample_texts
+
+
+def test_maps_match_dicts(tmp_path):
+    tok = make_tokenizer("mix")
+    path = str(tmp_path / "model.frozen")
+    write_frozen(path, tok.vocab, tok.merges)
+    tables = FrozenTables(path)
+    vocab_re = {t: i for i, t in tok.vocab.items()}
+    assert dict(tables.vocab) == tok.vocab and len(tables.vocab) == len(tok.vocab)
+    assert dict(tables.vocab_re) == vocab_re
+    assert dict(tables.merges) == tok.merges
+    for missing in (-1, 10 ** 9, "x"):
+        assert tables.vocab.get(missing) is None and missing not in tables.vocab
+    assert tables.vocab_re.get("\U0001F600", "unk") == "unk" and 3 not in tables.vocab_re
+    assert (10 ** 6, 1) not in tables.merges
+    assert dict(pickle.loads(pickle.dumps(tables.merges))) == tok.merges
+
+
+def test_frozen_tokenizer_matches_plain(tmp_path):
+    for lang in ("mix", "ta"):
+        tok = make_tokenizer(lang)
+        vocab_path, merges_path = tmp_path / f"vocab_{lang}.pkl", tmp_path / f"merges_{lang}.pkl"
+        vocab_path.write_bytes(pickle.dumps(tok.vocab))
+        merges_path.write_bytes(pickle.dumps(tok.merges))
+        frozen = load_tokenizer(str(vocab_path), str(merges_path), lang=lang, frozen=True)
+        assert os.path.exists(f"{merges_path}.frozen")
+        texts = sample_texts(n=80, seed=8) + ["x \U0001F600 y"]
+        for text in texts:
+            tokens, ids = tok.encode(text)
+            assert frozen.encode(text) == (tokens, ids)
+            assert frozen.decode(ids) == tok.decode(ids)
+        doc = " ".join(texts)
+        assert frozen.encode_parallel(doc, workers=2, piece_chars=300) == tok.encode(doc)
+        again = load_frozen_tokenizer(f"{merges_path}.frozen", lang)
+        assert again.count_tokens_batch(texts) == tok.count_tokens_batch(texts)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+GPE Grapheme-Pair Merges
+========================
+
+Trained merges must compress, round-trip, and reproduce the training
+segmentation; save/load keeps the same ids.
+"""
+
+import os
+import sys
+import tempfile
+
+import grapheme
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from gpe import GPETokenizer, load_gpe, save_gpe, train_gpe
+
+SAMPLE = [
+    "நான் இன்று பள்ளிக்கு செல்கிறேன்.",
+    "அவள் புத்தகம் படிக்கிறாள்.",
+    "The quick brown fox jumps over the lazy dog",
+    "தமிழ் ஒரு செழுமையான மொழி",
+    "பள்ளிக்கு செல்கிறேன்  புத்தகம் படிக்கிறாள்",
+]
+
+
+def test_merges_compress_and_round_trip():
+    vocab, _ = train_gpe(SAMPLE)
+    unigram = GPETokenizer(vocab)
+    vocab, merges = train_gpe(SAMPLE, num_merges=40)
+    tok = GPETokenizer(vocab, merges)
+    assert len(merges) == 40
+    for line in SAMPLE:
+        tokens, ids = tok.encode(line)
+        assert tok.decode(ids) == line
+        assert len(ids) <= len(unigram.encode(line)[1])
+        assert all(t.strip() == t or not t.strip() for t in tokens)  # no token mixes space and text
+    assert (sum(len(tok.encode(line)[1]) for line in SAMPLE)
+            < sum(len(unigram.encode(line)[1]) for line in SAMPLE))
+
+
+def test_encoder_matches_in_order_merging():
+    vocab, merges = train_gpe(SAMPLE, num_merges=60)
+    tok = GPETokenizer(vocab, merges)
+    for line in SAMPLE + ["செல்கிறாள் பள்ளி"]:
+        expected = []
+        for chunk in line.split(" "):
+            pieces = list(grapheme.graphemes(chunk))
+            for left, right in merges:
+                i, out = 0, []
+                while i < len(pieces):
+                    if i + 1 < len(pieces) and pieces[i] == left and pieces[i + 1] == right:
+                        out.append(left + right)
+                        i += 2
+                    else:
+                        out.append(pieces[i])
+                        i += 1
+                pieces = out
+            expected.append(pieces)
+        assert [tok.encode(chunk)[0] for chunk in line.split(" ")] == expected
+
+
+def test_save_load_keeps_ids():
+    vocab, merges = train_gpe(SAMPLE, num_merges=20)
+    tok = GPETokenizer(vocab, merges)
+    with tempfile.TemporaryDirectory() as d:
+        vocab_file, merges_file = os.path.join(d, "vocab.pkl"), os.path.join(d, "merges.pkl")
+        save_gpe(tok, vocab_file, merges_file)
+        loaded = load_gpe(vocab_file, merges_file)
+    for line in SAMPLE:
+        assert loaded.encode(line) == tok.encode(line)
+
+
+def test_streaming_parallel_counting_matches_serial():
+    expected = train_gpe(SAMPLE * 7, num_merges=30)
+    assert train_gpe(SAMPLE * 7, num_merges=30, workers=2, batch_lines=3) == expected
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "corpus.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(SAMPLE * 7) + "\n")
+        with open(path, "r", encoding="utf-8") as f:
+            assert train_gpe(f, num_merges=30, batch_lines=4) == expected
+
+
+def test_frequency_order_and_cutoff():
+    vocab, _ = train_gpe(SAMPLE, order="frequency")
+    seen = [g for line in SAMPLE for g in grapheme.graphemes(line)]
+    counts = [seen.count(t) for t in vocab]
+    assert counts == sorted(counts, reverse=True)
+
+    vocab, merges = train_gpe(SAMPLE, num_merges=10, min_frequency=3)
+    assert vocab["<UNK>"] == 0
+    assert "x" not in vocab  # seen once
+    tok = GPETokenizer(vocab, merges)
+    assert tok.encode("fox")[1][-1] == 0
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tamil Normalization
+===================
+
+normalize() must give one form for canonically equal Tamil spellings, leave
+normalized text untouched (and uncopied), and normalize_with_offsets must
+agree with it while mapping positions back into the input. The tokenizer
+must encode every spelling of a word alike.
+"""
+
+import os
+import random
+import sys
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from GPE_sandhi import SandhiBPETokenizer
+from normalize import is_normalized, normalize, normalize_with_offsets
+from test_sandhi_encoding import NOISE, make_tokenizer
+
+EXTRA = ["\u0BC6", "\u0BC7", "\u0BBE", "\u0BD7", "\u0B92", "\uFE0F", "\uFE00", "\u200D", "\u200C",
+         "e", "\u0301", "\U0001F468", "\u1100", "\u1161"]
+
+
+def test_spellings_fold_to_one_form():
+    ko = "க\u0BCA"
+    for spelling in (ko, "க\u0BC6\u0BBE", "க\u0BC6\u200D\u0BBE", "க\u0BCA\uFE0F"):
+        assert normalize(spelling) == ko
+    assert normalize("\u0B92\u0BD7") == "\u0B94"
+    emoji = "\U0001F468\u200D\U0001F469\u2764\uFE0F"
+    for text in ("plain ascii", "தமிழ் ஒரு மொழி", emoji):
+        assert normalize(text) is text and is_normalized(text)
+
+
+def test_offsets_match_normalize_on_random_text():
+    rng = random.Random(0)
+    for _ in range(5000):
+        text = "".join(rng.choice(NOISE + EXTRA) for _ in range(rng.randrange(30)))
+        normalized, offsets = normalize_with_offsets(text)
+        assert normalized == normalize(text) == normalize(normalized)
+        assert unicodedata.is_normalized("NFC", normalized) and is_normalized(normalized)
+        assert is_normalized(text) == (offsets is None)
+        if offsets is not None:
+            assert offsets[0] == 0 and offsets[-1] == len(text) and len(offsets) == len(normalized) + 1
+            assert offsets == sorted(offsets)
+
+
+def test_tokenizer_encodes_spellings_alike():
+    for lang in ("mix", "ta"):
+        tok = make_tokenizer(lang)
+        clean = "அவள் புத்தகம் படிக்கிறாள். பொருள் இல்லை"
+        noisy = clean.replace("\u0BCA", "\u0BC6\u200D\u0BBE").replace("ம்", "ம்\uFE0F")
+        assert tok.encode(noisy) == tok.encode(clean)
+        assert tok.count_tokens(noisy) == len(tok.encode(clean)[1])
+        ids, offset = tok.encode(noisy, return_tokens=False, max_length=6)
+        expected, clean_offset = tok.encode(clean, return_tokens=False, max_length=6)
+        assert ids == expected and normalize(noisy[:offset]) == clean[:clean_offset]
+        raw = SandhiBPETokenizer(dict(tok.vocab), tok.merges, lang=lang, normalize=False)
+        assert raw.encode(noisy) != tok.encode(noisy)
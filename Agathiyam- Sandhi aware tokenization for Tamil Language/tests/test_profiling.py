@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Profiling Stages
+================
+
+Under profiling.profile() every tokenizer records its stages (with self
+time never above total time) and valid folded stacks; with profiling off
+nothing is recorded, and encoding is the same either way. With
+AGATHIYAM_PROFILE_OUT every pool worker writes its own report.
+"""
+
+import os
+import subprocess
+import sys
+import textwrap
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+import profiling
+from bpe import BPETokenizer, train_bpe
+from gpe import GPETokenizer, train_gpe
+from test_sandhi_encoding import make_tokenizer, sample_texts
+
+SAMPLE = [
+    "நான் இன்று பள்ளிக்கு செல்கிறேன்.",
+    "The quick brown fox jumps over the lazy dog",
+    "தமிழ் ஒரு செழுமையான மொழி",
+]
+
+
+def _tokenizers():
+    token_to_id, merges = train_bpe(SAMPLE * 3, num_merges=40)
+    vocab, gpe_merges = train_gpe(SAMPLE, num_merges=20)
+    return {
+        "bpe": (BPETokenizer(token_to_id, merges), ["bpe.encode", "bpe.merge", "bpe.decode"]),
+        "gpe": (GPETokenizer(vocab, gpe_merges),
+                ["gpe.encode", "gpe.graphemes", "gpe.merge", "gpe.lookup", "gpe.decode"]),
+        "sandhi_gpe": (make_tokenizer("mix"),
+                       ["sandhi_gpe.encode", "sandhi.mark", "sandhi_gpe.graphemes",
+                        "sandhi_gpe.lookup", "sandhi_gpe.merge", "sandhi_gpe.decode"]),
+    }
+
+
+def test_stages_recorded_when_on():
+    reference = _tokenizers()
+    # fresh tokenizers, so the word/run caches are cold under profiling
+    for name, (tok, stages) in _tokenizers().items():
+        texts = SAMPLE + (sample_texts() if name == "sandhi_gpe" else [])
+        plain = [reference[name][0].encode(t) for t in texts]
+        with profiling.profile() as prof:
+            profiled_out = [tok.encode(t) for t in texts]
+            for _, ids in profiled_out:
+                tok.decode(ids)
+        assert profiled_out == plain
+        assert not profiling.enabled()
+        report = prof.report()
+        for stage in stages:
+            assert report["stages"][stage]["calls"] > 0, (name, stage)
+        for s in report["stages"].values():
+            assert 0 <= s["self_s"] <= s["total_s"] + 1e-9
+        for line in prof.folded().splitlines():
+            path, us = line.rsplit(" ", 1)
+            assert path and int(us) >= 1
+        assert prof.format_report().startswith("stage")
+    assert report["counters"]["sandhi_gpe.chars"] == sum(len(t) for t in texts)
+
+
+def test_nothing_recorded_when_off():
+    with profiling.profile() as prof:
+        pass
+    tok, _ = _tokenizers()["sandhi_gpe"]
+    tok.encode(SAMPLE[0])
+    assert prof.report() == {"stages": {}, "counters": {}}
+    assert profiling.stage("x") is profiling.stage("y")
+
+
+def test_env_profile_written_per_worker(tmp_path):
+    script = tmp_path / "run_pool.py"
+    script.write_text(textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {os.path.join(os.path.dirname(__file__), '..', 'core')!r})
+        from multiprocessing import Pool, active_children
+        from gpe import GPETokenizer, train_gpe
+
+        def encode(text):
+            return TOK.encode(text)
+
+        if __name__ == "__main__":
+            TOK = GPETokenizer(*train_gpe({SAMPLE!r}, num_merges=20))
+            pool = Pool(2)
+            pool.map(encode, {SAMPLE!r} * 20, chunksize=1)
+            print(" ".join(str(p.pid) for p in active_children()))
+            pool.close()
+            pool.join()
+            print(os.getpid())
+    """), encoding="utf-8")
+    env = dict(os.environ, AGATHIYAM_PROFILE="1",
+               AGATHIYAM_PROFILE_OUT=str(tmp_path / "prof.{pid}"))
+    run = subprocess.run([sys.executable, str(script)], env=env, capture_output=True,
+                         text=True, check=True)
+    workers, parent = run.stdout.splitlines()
+    pids = workers.split() + [parent]
+    assert len(pids) == 3
+    written = sorted(p.name for p in tmp_path.glob("prof.*"))
+    assert written == sorted(f"prof.{pid}.{ext}" for pid in pids for ext in ("folded", "txt"))
+    reports = [(tmp_path / f"prof.{pid}.txt").read_text(encoding="utf-8") for pid in pids]
+    # the encoding happened in the workers only
+    assert any("gpe.encode" in r for r in reports[:2])
+    assert "gpe.encode" not in reports[2]
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Sandhi-GPE Encoding
+===================
+
+The fused pre-tokenizer and later encode paths must give the same split
+tokens and ids as sandhi_split + per-chunk grapheme lookup + merges.
+"""
+
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from GPE_sandhi import SandhiBPETokenizer, build_initial_vocab, covert_to_ids_train, train_merges
+from normalize import normalize, normalize_with_offsets
+from tamil_graphemes import graphemes
+from telemetry import TrainingTelemetry
+
+SAMPLE = [
+    "நான் இன்று பள்ளிக்கு செல்கிறேன்.",
+    "அவள் புத்தகம் படிக்கிறாள்.",
+    "The quick brown fox jumps over the lazy dog",
+    "தமிழ் ஒரு செழுமையான மொழி",
+    "அவன் பள்ளிக்கு சென்றான், then he went home.",
+    "பொருள் இல்லாதவர்க்கு இவ்வுலகம் இல்லை",
+]
+NOISE = list("அஆஇகசடதநமனளலரய்ாிீுூெேைொோ \t\r\n\xa0‍‌ab.,") + ["க்", "ம் ", "  ", "é", "क"]
+
+
+def make_tokenizer(lang="mix", num_merges=80):
+    vocab, vocab_re = build_initial_vocab(SAMPLE, lang)
+    ids = covert_to_ids_train(SAMPLE, vocab_re, lang, flat=True)
+    quiet = TrainingTelemetry(console_interval=float("inf"))
+    vocab, merges, _ = train_merges(ids, vocab, num_merges, telemetry=quiet)
+    return SandhiBPETokenizer(vocab, merges, lang=lang)
+
+
+def reference_encode(tok, text):
+    text_chunks, ids = tok._grapheme_ids(text)
+    return [t for t, _ in text_chunks], tok._apply_merges(ids)
+
+
+def sample_texts(n=400, seed=0):
+    rng = random.Random(seed)
+    noise = ["".join(rng.choice(NOISE) for _ in range(rng.randrange(20))) for _ in range(n)]
+    return SAMPLE + [" ".join(SAMPLE)] + noise
+
+
+def test_fused_pretokenizer_matches_reference():
+    for lang in ("mix", "ta", "en"):
+        tok = make_tokenizer(lang)
+        for text in sample_texts():
+            assert tok.encode(text) == reference_encode(tok, text)
+
+
+def test_initial_vocab_streams_lines():
+    vocab, vocab_re = build_initial_vocab(iter(SAMPLE), "mix")  # no len() on a generator
+    assert set(vocab_re) == set(build_initial_vocab(SAMPLE, "mix")[1])
+    assert all(vocab_re[token] == idx for idx, token in vocab.items())
+
+
+def test_array_outputs_and_padded_batch():
+    import numpy as np
+    from array import array
+    from batching import bucket_batches
+
+    tok = make_tokenizer()
+    texts = sample_texts(n=30)
+    expected = [tok.encode(t)[1] for t in texts]
+    assert [tok.encode(t, return_tokens=False) for t in texts] == expected
+    arr = tok.encode(texts[0], return_tokens=False, out="numpy")
+    assert arr.dtype == np.int32 and arr.tolist() == expected[0]
+    assert tok.encode(texts[0], out="array")[1] == array('I', expected[0])
+
+    ids, mask = tok.encode_padded(texts, max_length=12, pad_to_multiple_of=8)
+    assert ids.shape == mask.shape == (len(texts), 16)
+    for row, m, exp in zip(ids, mask, expected):
+        assert row[m.astype(bool)].tolist() == exp[:12]
+
+    seen = []
+    for idx, ids, mask in bucket_batches(tok, texts, batch_size=8):
+        for i, row, m in zip(idx, ids, mask):
+            assert row[m.astype(bool)].tolist() == expected[i]
+            seen.append(int(i))
+    assert sorted(seen) == list(range(len(texts)))
+
+
+def test_count_tokens_and_run_cache():
+    for lang in ("mix", "ta"):
+        tok = make_tokenizer(lang)
+        texts = sample_texts(n=200, seed=1)
+        expected = [len(reference_encode(tok, t)[1]) for t in texts]
+        assert tok.count_tokens_batch(texts) == expected
+        assert [tok.count_tokens(t) for t in texts] == expected
+        assert tok.cache_info()["hits"] > 0
+        uncached = SandhiBPETokenizer(tok.vocab, tok.merges, lang=lang, cache_size=0)
+        assert [uncached.encode(t) for t in texts] == [reference_encode(tok, t) for t in texts]
+
+
+def test_max_length_truncation():
+    for lang in ("mix", "ta"):
+        tok = make_tokenizer(lang)
+        for text in sample_texts(n=100, seed=2):
+            tokens, full = tok.encode(text)
+            for n in {0, 1, len(full) // 2, len(full), len(full) + 3}:
+                _, ids, offset = tok.encode(text, max_length=n)
+                assert ids == full[:n]
+                assert 0 <= offset <= len(text)
+                if n >= len(full):
+                    assert offset == len(text)
+                elif lang == "mix":
+                    # the covered prefix encodes to the same ids
+                    assert tok.encode(text[:offset])[1][:len(ids)] == ids
+            ids, offset = tok.encode(text, return_tokens=False, max_length=2)
+            assert ids == full[:2]
+
+
+def test_parallel_encode_matches_serial():
+    for lang in ("mix", "ta"):
+        tok = make_tokenizer(lang)
+        texts = sample_texts(n=60, seed=3)
+        for text in texts:
+            expected = tok.encode(text)
+            for piece_chars in (1, 7, 40):
+                assert tok.encode_parallel(text, workers=1, piece_chars=piece_chars) == expected
+        doc = " ".join(texts)
+        assert tok.encode_parallel(doc, workers=2, piece_chars=200) == tok.encode(doc)
+
+
+def test_input_guards_and_fallbacks():
+    # ta only cuts safely after punctuation: the sample has gaps up to ~360 chars
+    for lang, limit in (("mix", 50), ("ta", 400)):
+        tok = make_tokenizer(lang)
+        doc = " ".join(sample_texts(n=60, seed=3))
+        guarded = SandhiBPETokenizer(dict(tok.vocab), tok.merges, lang=lang, max_input_chars=limit)
+        assert guarded.encode(doc) == tok.encode(doc)
+        assert guarded.count_tokens(doc) == len(tok.encode(doc)[1])
+        assert guarded.fallbacks["chunked"] == 2 and not guarded.fallbacks["hard_cut"]
+        flood = "பள்ளிக்கு" * 100 + "." * 300
+        ids = guarded.encode(flood, return_tokens=False)
+        assert guarded.decode(ids) == flood and guarded.fallbacks["hard_cut"] > 0
+        doc = normalize(doc)
+        clusters = [g for chunk in re.findall(r"\S+|\s+", doc) for g in graphemes(chunk)]
+        for options, kind in (({"rule_timeout": 1e-9}, "rule_timeout"), ({"degraded": True}, "degraded")):
+            fallback = SandhiBPETokenizer(dict(tok.vocab), tok.merges, lang=lang, **options)
+            ids = fallback.encode(doc, return_tokens=False)
+            assert ids == [fallback.vocab_re.get(g, fallback._unk_id()) for g in clusters]
+            assert fallback.encode(doc, return_tokens=False, max_length=5) == (ids[:5], len("".join(clusters[:5])))
+            assert fallback.fallbacks[kind] == 2
+
+
+def test_offsets_map_ids_to_text():
+    from array import array
+
+    noisy = [t.replace("ொ", "ெ\u200dா").replace("க", "க\ufe0f") for t in sample_texts(n=100, seed=4)]
+    for lang in ("mix", "ta"):
+        tok = make_tokenizer(lang)
+        for options in ({}, {"max_input_chars": 7}, {"degraded": True}):
+            guarded = SandhiBPETokenizer(dict(tok.vocab), tok.merges, lang=lang, **options)
+            changed = 0
+            for text in noisy:
+                full = guarded.encode(text, return_tokens=False)
+                ids, (starts, ends) = guarded.encode(text, return_tokens=False, return_offsets=True)
+                assert ids == full and isinstance(starts, array) and len(starts) == len(ends) == len(ids)
+                prev = 0
+                for i, s, e in zip(ids, starts, ends):
+                    assert prev <= s < e <= len(text)
+                    prev = e
+                    # the span spells the token, up to whitespace the rules turned into BOUND
+                    token = guarded.vocab[i]
+                    if token != "<UNK>":
+                        assert re.sub(r"\s", "", normalize(text[s:e])) == re.sub(r"\s", "", token)
+                # spans in the normalized text, carried back to the input by the normalization offsets
+                normalized, positions = normalize_with_offsets(text)
+                if positions is not None:
+                    changed += 1
+                    _, (n_starts, n_ends) = guarded.encode(normalized, return_tokens=False, return_offsets=True)
+                    assert list(starts) == [positions[s] for s in n_starts]
+                    assert list(ends) == [positions[e] for e in n_ends]
+                ids, (starts, ends), offset = guarded.encode(text, return_tokens=False, max_length=3,
+                                                             return_offsets=True)
+                assert (ids, offset) == guarded.encode(text, return_tokens=False, max_length=3)
+                assert len(starts) == len(ids) and all(e <= offset for e in ends)
+            assert changed > len(noisy) // 2
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Streaming Decode
+================
+
+StreamDecoder pieces must join to tokenizer.decode(ids) and never end in
+the middle of a grapheme cluster.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from bpe import BPETokenizer, train_bpe
+from gpe import GPETokenizer, train_gpe
+from stream_decode import StreamDecoder
+from tamil_graphemes import graphemes
+
+SAMPLE = [
+    "நான் இன்று பள்ளிக்கு செல்கிறேன்.",
+    "அவள் புத்தகம் படிக்கிறாள்.",
+    "The quick brown fox jumps over the lazy dog",
+    "தமிழ் ஒரு செழுமையான மொழி\r\n",
+]
+
+
+def check_stream(tok, ids):
+    decoder = StreamDecoder(tok)
+    pieces = [decoder.push(i) for i in ids]
+    text = "".join(pieces) + decoder.flush()
+    assert text == tok.decode(ids)
+    emitted = ""
+    for piece in pieces:
+        emitted += piece
+        # everything emitted so far ends on a cluster boundary of the full text
+        assert text.startswith(emitted)
+        assert len(graphemes(emitted)) == 0 or graphemes(text)[:len(graphemes(emitted))] == graphemes(emitted)
+
+
+def test_stream_matches_decode():
+    token_to_id, merges = train_bpe(SAMPLE * 2, num_merges=30)
+    bpe_tok = BPETokenizer(token_to_id, merges)
+    vocab, gpe_merges = train_gpe(SAMPLE, num_merges=30)
+    gpe_tok = GPETokenizer(vocab, gpe_merges)
+    for tok in (bpe_tok, gpe_tok):
+        for line in SAMPLE + [" ".join(SAMPLE)]:
+            check_stream(tok, tok.encode(line)[1])
+    # unknown ids and '<SPACE>' runs, including trailing ones
+    space = token_to_id['<SPACE>']
+    check_stream(bpe_tok, [space, 5, space, space, 999, space])
+    check_stream(bpe_tok, [space, space])
+
+
+def test_holds_back_open_cluster():
+    vocab = {"க": 0, "ி": 1, " ": 2}
+    decoder = StreamDecoder(GPETokenizer(vocab))
+    assert decoder.push(0) == ""       # consonant may still take a vowel sign
+    assert decoder.push(1) == ""
+    assert decoder.push(2) == "கி"
+    assert decoder.flush() == " "
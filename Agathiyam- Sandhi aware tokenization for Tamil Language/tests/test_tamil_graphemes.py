@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tamil Grapheme Segmenter
+========================
+
+tamil_graphemes must agree with the `grapheme` package everywhere: on the
+flores files, on every pair of fast-path characters, and on random strings.
+"""
+
+import glob
+import os
+import random
+import sys
+
+import grapheme
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+import tamil_graphemes as tg
+
+DATA = os.path.join(os.path.dirname(__file__), '..', 'data')
+FAST_CHARS = [chr(c) for c in list(range(0x80)) + [0xA0] + list(range(0xB80, 0xC00))
+              + [0x200C, 0x200D] + list(range(0x2010, 0x2028))]
+
+
+def test_matches_grapheme_on_corpus_files():
+    paths = glob.glob(os.path.join(DATA, 'flores', 'flores.*')) + glob.glob(os.path.join(DATA, '*.txt'))
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                assert tg.graphemes(line) == list(grapheme.graphemes(line))
+                assert tg.length(line) == grapheme.length(line)
+
+
+def test_matches_grapheme_on_fast_characters():
+    for a in FAST_CHARS:
+        for b in FAST_CHARS:
+            assert tg.graphemes(a + b) == list(grapheme.graphemes(a + b))
+    rng = random.Random(0)
+    for _ in range(20000):
+        s = "".join(rng.choice(FAST_CHARS + ["é", "क", "्", "😀"]) for _ in range(rng.randrange(1, 7)))
+        assert tg.graphemes(s) == list(grapheme.graphemes(s))
+
+
+def test_boundaries():
+    text = "தமிழ் ok\r\n"
+    offsets = tg.boundaries(text)
+    assert offsets[0] == 0 and offsets[-1] == len(text)
+    assert [text[a:b] for a, b in zip(offsets, offsets[1:])] == tg.graphemes(text)
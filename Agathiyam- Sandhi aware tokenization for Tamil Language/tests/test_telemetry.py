@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Training Telemetry
+==================
+
+train_merges must write one complete JSON record per merge, and the console
+summary must stay rate-limited.
+"""
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from flat_corpus import FlatCorpus
+from GPE_sandhi import build_initial_vocab, covert_to_ids_train, train_merges
+from telemetry import TrainingTelemetry, load_telemetry
+from test_sandhi_encoding import sample_texts
+
+KEYS = {"merge", "num_merges", "corpus_pass", "pair", "new_id", "token", "freq", "count_s",
+        "merge_s", "chunks_touched", "corpus_symbols", "rss_mb", "checkpoint_s", "elapsed_s"}
+
+
+def test_one_record_per_merge(tmp_path):
+    texts = sample_texts(n=100, seed=11)
+    vocab, vocab_re = build_initial_vocab(texts)
+    for flat in (False, True):
+        ids = covert_to_ids_train(texts, vocab_re, flat=flat)
+        symbols = ids.num_symbols if flat else sum(map(len, ids))
+        path = str(tmp_path / f"telemetry_{flat}.jsonl")
+        console = io.StringIO()
+        with TrainingTelemetry(path, console_interval=3600, flush_every=7, stream=console) as telemetry:
+            vocab_out, merges, _ = train_merges(
+                ids, dict(vocab), 30, checkpoint_path=str(tmp_path / "checkpoint.pkl"),
+                checkpoint_every=10, telemetry=telemetry)
+        assert telemetry.num_records == 30
+        records = load_telemetry(path)
+        assert [r["merge"] for r in records] == list(range(1, 31))
+        for r in records:
+            assert set(r) == KEYS
+            assert r["num_merges"] == 30 and r["corpus_pass"] == r["merge"]
+            assert merges[tuple(r["pair"])] == r["new_id"] and vocab_out[r["new_id"]] == r["token"]
+            assert r["freq"] >= 1 and r["count_s"] >= 0 and r["merge_s"] >= 0 and r["rss_mb"] > 0
+            assert r["chunks_touched"] >= 1
+            # each merged occurrence saves a symbol; overlapping "a a a" counts twice, merges once
+            assert symbols - r["freq"] <= r["corpus_symbols"] < symbols
+            symbols = r["corpus_symbols"]
+            assert (r["checkpoint_s"] is not None) == (r["merge"] % 10 == 0)
+        # the first record is printed, the rest fall inside the interval
+        lines = console.getvalue().splitlines()
+        assert len(lines) == 1 and lines[0].startswith("[train] merge=1 ")
+
+
+def test_console_rate_limit():
+    for interval, expected in ((0, 5), (3600, 1), (float("inf"), 0)):
+        console = io.StringIO()
+        telemetry = TrainingTelemetry(console_interval=interval, stream=console)
+        for n in range(5):
+            telemetry.record(merge=n + 1, checkpoint_s=None)
+        telemetry.close()
+        lines = console.getvalue().splitlines()
+        assert len(lines) == expected
+        assert all("checkpoint_s" not in line for line in lines)
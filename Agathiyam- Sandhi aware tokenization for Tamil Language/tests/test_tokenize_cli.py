@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Corpus Tokenization CLI
+=======================
+
+agathiyam-tokenize must write one record per input line, in input order,
+with the ids the tokenizer gives directly, for JSONL and binary shards.
+"""
+
+import gzip
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from test_sandhi_encoding import make_tokenizer, sample_texts
+from tokenize_cli import main
+
+
+def _model(tmp_path, lang):
+    tok = make_tokenizer(lang)
+    vocab, merges = tmp_path / "vocab.pkl", tmp_path / "merges.pkl"
+    vocab.write_bytes(pickle.dumps(tok.vocab))
+    merges.write_bytes(pickle.dumps(tok.merges))
+    return tok, ["--vocab", str(vocab), "--merges", str(merges), "--lang", lang]
+
+
+def test_jsonl_output_is_ordered_and_exact(tmp_path):
+    tok, model = _model(tmp_path, "ta")
+    lines = [t.replace("\n", " ").replace("\r", " ") for t in sample_texts(n=150, seed=6)] + [""]
+    corpus = tmp_path / "corpus.txt.gz"
+    with gzip.open(corpus, "wt", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    expected = [tok.encode(line, return_tokens=False) for line in lines]
+    for workers in ("0", "2"):
+        out = tmp_path / f"ids{workers}.jsonl"
+        main([str(corpus), *model, "--workers", workers, "--batch-lines", "7",
+              "--queue-batches", "2", "--output", str(out), "--report-every", "0"])
+        with open(out, encoding="utf-8") as f:
+            assert [json.loads(line)["ids"] for line in f] == expected
+
+
+def test_binary_shards(tmp_path):
+    tok, model = _model(tmp_path, "mix")
+    lines = [t.replace("\n", " ").replace("\r", " ") for t in sample_texts(n=80, seed=7)]
+    corpus = tmp_path / "corpus.txt"
+    corpus.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    shards = tmp_path / "shards"
+    main([str(corpus), *model, "--workers", "1", "--batch-lines", "5", "--format", "bin",
+          "--output", str(shards), "--shard-tokens", "200", "--report-every", "0"])
+    got = []
+    names = sorted(n[:-4] for n in os.listdir(shards) if n.endswith(".bin"))
+    assert len(names) > 1
+    for name in names:
+        ids = np.fromfile(shards / f"{name}.bin", dtype="<u4")
+        ends = np.fromfile(shards / f"{name}.idx", dtype="<i8")
+        assert len(ids) <= 200 or len(ends) <= 5
+        starts = np.concatenate([[0], ends[:-1]])
+        got.extend(ids[s:e].tolist() for s, e in zip(starts, ends))
+    assert got == [tok.encode(line, return_tokens=False) for line in lines]
+
+
+def test_sandhi_options_rejected_for_other_tokenizers(tmp_path):
+    for kind in ("bpe", "gpe"):
+        for option in (["--lang", "ta"], ["--frozen"]):
+            with pytest.raises(SystemExit, match="sandhi-gpe only"):
+                main(["--tokenizer", kind, "--vocab", "v.pkl", "--merges", "m.pkl", *option,
+                      "--output", str(tmp_path / "ids.jsonl")])
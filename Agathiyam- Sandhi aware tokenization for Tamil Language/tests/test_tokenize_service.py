@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tokenization Service
+====================
+
+Concurrent, pipelined requests to TokenizeService must come back in request
+order with exactly what the tokenizer gives directly.
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from test_sandhi_encoding import make_tokenizer, sample_texts
+from tokenize_service import TokenizeService
+
+
+async def _client(path, requests):
+    reader, writer = await asyncio.open_unix_connection(path, limit=1 << 24)
+    for req in requests:
+        writer.write(json.dumps(req).encode("utf-8") + b"\n")
+    await writer.drain()
+    writer.write_eof()
+    responses = [json.loads(line) async for line in reader]
+    writer.close()
+    return responses
+
+
+async def _exercise(tok, path, workers):
+    service = TokenizeService(tok, workers=workers, window_ms=5, max_batch=16)
+    ready = asyncio.Event()
+    server = asyncio.create_task(service.serve(unix_path=path, ready=ready))
+    await ready.wait()
+    texts = sample_texts(n=40, seed=5)
+    ids = [tok.encode(t, return_tokens=False) for t in texts]
+    per_client = [
+        [{"id": i, "op": "encode", "text": t} for i, t in enumerate(texts)],
+        [{"id": i, "op": "count", "text": t} for i, t in enumerate(reversed(texts))],
+        [{"id": i, "op": "decode", "ids": x} for i, x in enumerate(ids)] + [{"op": "nope"}, {"id": "m", "op": "metrics"}],
+    ]
+    try:
+        got = await asyncio.gather(*(_client(path, reqs) for reqs in per_client))
+    finally:
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+    return texts, ids, got, service.metrics.snapshot()
+
+
+def test_service_returns_results_in_order(tmp_path):
+    tok = make_tokenizer("mix")
+    for workers in (0, 1):
+        path = str(tmp_path / f"tok{workers}.sock")
+        texts, ids, (enc, cnt, dec), metrics = asyncio.run(_exercise(tok, path, workers))
+        assert enc == [{"id": i, "ids": x} for i, x in enumerate(ids)]
+        assert cnt == [{"id": i, "count": len(x)} for i, x in enumerate(reversed(ids))]
+        assert [r["text"] for r in dec[:-2]] == [tok.decode(x) for x in ids]
+        assert "error" in dec[-2]
+        assert dec[-1]["id"] == "m" and dec[-1]["metrics"]["requests"] >= 2 * len(texts)
+        assert metrics["batches"] < metrics["requests"]
+        assert sum(metrics["latency_ms_histogram"].values()) == metrics["requests"]
+        assert metrics["queue_depth"] == 0 and metrics["fallbacks"] == {}
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Vocabulary Sweep
+================
+
+Every size in a vocab_sweep run must count the same tokens as encode() of
+a tokenizer holding that prefix of the merges, and the full size the same
+as the tokenizer that was trained.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from bpe import BPETokenizer, train_bpe
+from GPE_sandhi import SandhiBPETokenizer
+from test_sandhi_encoding import make_tokenizer, sample_texts
+from vocab_sweep import bpe_prefix, sandhi_prefix, sweep_bpe, sweep_sandhi
+
+
+def avg_tokens(tok, texts):
+    return sum(len(tok.encode(t, return_tokens=False)) for t in texts) / len(texts)
+
+
+def test_sandhi_sweep_matches_encode():
+    trained = make_tokenizer("mix")
+    vocab, merges = dict(trained.vocab), dict(trained.merges)
+    texts = [t for t in sample_texts(n=60, seed=9) if t.strip()]
+    sizes = [len(vocab) - len(merges) + 10, len(vocab) - 30, len(vocab)]
+    results = sweep_sandhi(texts, vocab, merges, sizes, lang="mix")
+    assert results[len(vocab)][2] == avg_tokens(trained, texts)
+    for size in sizes:
+        sub_vocab, sub_merges = sandhi_prefix(vocab, merges, size)
+        assert len(sub_vocab) == size
+        assert list(sub_merges.items()) == list(merges.items())[:len(sub_merges)]
+        truncated = SandhiBPETokenizer(sub_vocab, sub_merges, lang="mix")
+        assert results[size][2] == avg_tokens(truncated, texts)
+
+
+def test_bpe_sweep_matches_encode():
+    corpus = [" ".join(t.split()) for t in sample_texts(n=150, seed=10) if t.strip()]
+    token_to_id, merges = train_bpe(corpus, num_merges=80)
+    trained = BPETokenizer(token_to_id, merges)
+    texts = corpus[:50]
+    num_base = len(bpe_prefix(token_to_id, merges, 0)[0])
+    assert '</w>' in bpe_prefix(token_to_id, merges, 0)[0]
+    full = num_base + len(merges)
+    sizes = [num_base + 10, num_base + 40, full]
+    results = sweep_bpe(texts, token_to_id, merges, sizes)
+    assert results[full][2] == avg_tokens(trained, texts)
+    for size in sizes:
+        sub, prefix = bpe_prefix(token_to_id, merges, size)
+        assert len(sub) == size and prefix == merges[:size - num_base]
+        # the same merges on the trained ids give the same tokens
+        derived, truncated = BPETokenizer(sub, prefix), BPETokenizer(token_to_id, prefix)
+        for text in texts:
+            assert derived.encode(text)[0] == truncated.encode(text)[0]
+        assert results[size][2] == avg_tokens(truncated, texts)